@@ -18,6 +18,15 @@ def create_app(config_class: type = Config):
         app.config["OPENAI_API_KEY"] = _k
     print(f"[Orquestrix] OPENAI_API_KEY {'geladen (len='+str(len(_k))+')' if _k else 'FEHLT'}")
 
+    # Retry/Breaker Parameter für alle OpenAI Clients dieses Prozesses
+    from .services.resilience import configure_from_app
+    configure_from_app(app.config)
+    # Call Ledger (openai_call Tabelle) schreibt gebündelt im Hintergrund
+    from .services.call_ledger import ledger
+    ledger.init_app(app)
+    from .services.response_cache import response_cache
+    response_cache.init_app(app)
+
     # Init Extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -55,6 +64,7 @@ def create_app(config_class: type = Config):
     # Simple health route
     @app.get("/health")
     def health():
-        return {"status": "ok"}
+        from .services.resilience import policy
+        return {"status": "ok", "openai": "degraded" if policy.degraded() else "ok"}
 
     return app
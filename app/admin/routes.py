@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
-from ..models import Assistant, File, ChatRole, Chat
+import os
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, current_app, jsonify, stream_with_context
+from ..models import Assistant, File, ChatRole, Chat, ChatBatch
 from ..extensions import db
 from ..services.assistant_service import AssistantService, AssistantSyncError
 from ..services.vector_store_service import VectorStoreService, VectorStoreSyncError
 from ..services.file_service import FileService, FileSyncError
 from ..services.chat_role_service import ChatRoleService, ChatRoleServiceError
+from ..services.job_service import JobService
+from ..services.batch_service import BatchService, BatchServiceError
+from ..services.openai_call_service import OpenAICallService
+from ..services.response_cache import response_cache
 from ..models import VectorStore
 
 bp = Blueprint("admin", __name__)
@@ -12,7 +17,14 @@ bp = Blueprint("admin", __name__)
 
 @bp.route("/")
 def index():
-    return render_template("admin.html")
+    return render_template("admin.html", cache_stats=response_cache.stats(), job_stats=JobService.stats())
+
+
+@bp.route("/response-cache/clear", methods=["POST"])
+def response_cache_clear():
+    removed = response_cache.clear()
+    flash(f"Antwort-Cache dieses Prozesses (PID {os.getpid()}) geleert ({removed} Einträge)", "info")
+    return redirect(url_for("admin.index"))
 
 
 # ---------------- Assistants Verwaltung ----------------
@@ -112,27 +124,36 @@ def files_list():
         ~File.vector_stores.any()
     ).order_by(File.created_at.desc()).all()
     vectors = VectorStore.query.order_by(VectorStore.name.asc()).all()
-    return render_template("admin_files.html", files=files, vectors=vectors)
+    return render_template("admin_files.html", files=files, vectors=vectors, batch_id=request.args.get("batch"))
 
 
 @bp.route("/files/upload", methods=["POST"])
 def files_upload():
-    up = request.files.get("file")
-    if not up or up.filename == "":
+    uploads = [up for up in request.files.getlist("file") if up and up.filename]
+    if not uploads:
         flash("Keine Datei gewählt", "error")
         return redirect(url_for("admin.files_list"))
-    # Temporär speichern in instance/uploads
+    # Temporär speichern in instance/uploads/<token> (gleichnamige Dateien paralleler Uploads kollidieren nicht)
     from pathlib import Path
-    upload_dir = Path(current_app.instance_path) / "uploads"
+    import uuid
+    upload_dir = Path(current_app.instance_path) / "uploads" / uuid.uuid4().hex[:12]
     upload_dir.mkdir(parents=True, exist_ok=True)
-    tmp_path = upload_dir / up.filename
-    up.save(tmp_path)
-    try:
-        FileService.upload_and_create(str(tmp_path))
-        flash("Datei hochgeladen", "success")
-    except FileSyncError as e:
-        flash(f"Upload Fehler: {e}", "error")
-    return redirect(url_for("admin.files_list"))
+    paths = []
+    for up in uploads:
+        tmp_path = upload_dir / Path(up.filename).name
+        up.save(tmp_path)
+        paths.append(str(tmp_path))
+    batch_id = FileService.start_upload_batch(paths)
+    flash(f"{len(paths)} Datei(en) werden hochgeladen", "info")
+    return redirect(url_for("admin.files_list", batch=batch_id))
+
+
+@bp.route("/files/upload/<batch_id>/status", methods=["GET"])
+def files_upload_status(batch_id: str):
+    items = FileService.upload_batch_status(batch_id)
+    if items is None:
+        return jsonify({"error": "Batch unbekannt"}), 404
+    return jsonify({"files": items, "done": all(i["status"] in ("done", "error") for i in items)})
 
 
 @bp.route("/files/sync", methods=["POST"])
@@ -191,10 +212,14 @@ def files_detach():
 
 
 # ---------------- Chat Roles ----------------
+def _prompt_cache_by_role() -> dict:
+    return {r['id']: r for r in OpenAICallService.prompt_cache_by_role(hours=24 * 7)}
+
+
 @bp.route("/chat-roles", methods=["GET"])
 def chat_roles_list():
     roles = ChatRole.query.order_by(ChatRole.name.asc()).all()
-    return render_template("admin_chat_roles.html", roles=roles, edit_role=None)
+    return render_template("admin_chat_roles.html", roles=roles, edit_role=None, prompt_cache=_prompt_cache_by_role())
 
 
 @bp.route("/chat-roles/create", methods=["POST"])
@@ -203,6 +228,9 @@ def chat_roles_create():
     instructions = request.form.get('instructions')
     model = request.form.get('model')
     temperature = request.form.get('temperature', type=float)
+    cache_enabled = request.form.get('cache_enabled') == 'on'
+    cache_ttl_sec = request.form.get('cache_ttl_sec', type=int)
+    context_budget_tokens = request.form.get('context_budget_tokens', type=int)
     allowed_models = {'o3-pro','o4-mini','o3-mini'}
     if model and model not in allowed_models:
         flash('Ungültiges Modell', 'error')
@@ -213,6 +241,9 @@ def chat_roles_create():
             instructions=instructions,
             model=model,
             temperature=temperature,
+            cache_enabled=cache_enabled,
+            cache_ttl_sec=cache_ttl_sec,
+            context_budget_tokens=context_budget_tokens,
         )
         flash("Chat Rolle erstellt", "success")
     except ChatRoleServiceError as e:
@@ -223,7 +254,7 @@ def chat_roles_create():
 def chat_roles_edit(role_id: int):
     roles = ChatRole.query.order_by(ChatRole.name.asc()).all()
     edit_role = ChatRole.query.get_or_404(role_id)
-    return render_template('admin_chat_roles.html', roles=roles, edit_role=edit_role)
+    return render_template('admin_chat_roles.html', roles=roles, edit_role=edit_role, prompt_cache=_prompt_cache_by_role())
 
 @bp.route('/chat-roles/<int:role_id>/update', methods=['POST'])
 def chat_roles_update(role_id: int):
@@ -232,6 +263,9 @@ def chat_roles_update(role_id: int):
     model = request.form.get('model')
     instructions = request.form.get('instructions')
     temperature = request.form.get('temperature', type=float)
+    cache_enabled = request.form.get('cache_enabled') == 'on'
+    cache_ttl_sec = request.form.get('cache_ttl_sec', type=int)
+    context_budget_tokens = request.form.get('context_budget_tokens', type=int)
     if not name or not instructions:
         flash('Name und Instructions sind Pflicht', 'error')
         return redirect(url_for('admin.chat_roles_edit', role_id=role.id))
@@ -246,6 +280,9 @@ def chat_roles_update(role_id: int):
             model=model or role.model,
             instructions=instructions,
             temperature=temperature,
+            cache_enabled=cache_enabled,
+            cache_ttl_sec=cache_ttl_sec,
+            context_budget_tokens=context_budget_tokens,
         )
         flash('Rolle aktualisiert', 'success')
     except ChatRoleServiceError as e:  # type: ignore
@@ -277,3 +314,86 @@ def chat_roles_assign(chat_id: int):
     flash("Rolle zugewiesen", "success")
     return redirect(url_for('chats.view', chat_id=chat.id))
 
+
+# ---------------- Fragebögen (Batch API) ----------------
+@bp.route("/batches", methods=["GET"])
+def batches_list():
+    batches = ChatBatch.query.order_by(ChatBatch.id.desc()).limit(200).all()
+    roles = ChatRole.query.order_by(ChatRole.name.asc()).all()
+    chats = Chat.query.order_by(Chat.updated_at.desc()).limit(200).all()
+    vectors = VectorStore.query.order_by(VectorStore.name.asc()).all()
+    return render_template("admin_batches.html", batches=batches, roles=roles, chats=chats, vectors=vectors)
+
+
+@bp.route("/batches/create", methods=["POST"])
+def batches_create():
+    up = request.files.get("file")
+    role = ChatRole.query.get(request.form.get("role_id", type=int) or 0)
+    if not up or not up.filename or not role:
+        flash("Datei und Chat Rolle sind Pflicht", "error")
+        return redirect(url_for("admin.batches_list"))
+    chat_id = request.form.get("chat_id", type=int)
+    chat = Chat.query.get_or_404(chat_id) if chat_id else None
+    try:
+        prompts = BatchService.parse_prompts(up.filename, up.read())
+        batch = BatchService.create(
+            name=(request.form.get("name") or "").strip() or up.filename,
+            role=role,
+            prompts=prompts,
+            chat=chat,
+            vector_store_ids=request.form.getlist("vector_store_ids", type=int),
+        )
+        BatchService.submit(batch)
+    except BatchServiceError as e:
+        flash(str(e), "error")
+        return redirect(url_for("admin.batches_list"))
+    JobService.enqueue('chat_batch_poll', {'batch_id': batch.id}, delay_sec=current_app.config.get('BATCH_POLL_INTERVAL', 60))
+    flash(f"Batch mit {batch.total} Prompts eingereicht", "success")
+    return redirect(url_for("admin.batches_view", batch_id=batch.id))
+
+
+@bp.route("/batches/<int:batch_id>", methods=["GET"])
+def batches_view(batch_id: int):
+    batch = ChatBatch.query.get_or_404(batch_id)
+    items = batch.items.limit(200).all()
+    return render_template("admin_batch.html", batch=batch, items=items)
+
+
+@bp.route("/batches/<int:batch_id>/refresh", methods=["POST"])
+def batches_refresh(batch_id: int):
+    batch = ChatBatch.query.get_or_404(batch_id)
+    try:
+        BatchService.refresh(batch)
+        flash(f"Status: {batch.status}", "info")
+    except Exception as e:  # noqa: BLE001
+        flash(f"Abfrage Fehler: {e}", "error")
+    return redirect(url_for("admin.batches_view", batch_id=batch.id))
+
+
+@bp.route("/batches/<int:batch_id>/cancel", methods=["POST"])
+def batches_cancel(batch_id: int):
+    batch = ChatBatch.query.get_or_404(batch_id)
+    try:
+        BatchService.cancel(batch)
+        flash("Batch wird abgebrochen", "info")
+    except BatchServiceError as e:
+        flash(str(e), "error")
+    return redirect(url_for("admin.batches_view", batch_id=batch.id))
+
+
+@bp.route("/batches/<int:batch_id>/results.csv", methods=["GET"])
+def batches_results(batch_id: int):
+    batch = ChatBatch.query.get_or_404(batch_id)
+    return Response(
+        stream_with_context(BatchService.results_csv(batch)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=batch_{batch.id}_ergebnisse.csv"},
+    )
+
+
+# ---------------- OpenAI Call Ledger ----------------
+@bp.route("/openai-calls", methods=["GET"])
+def openai_calls():
+    hours = request.args.get('hours', 24, type=int)
+    stats = OpenAICallService.summary(hours=max(1, hours))
+    return render_template("admin_openai_calls.html", stats=stats)
@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import json
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, stream_with_context, jsonify
 from ..models import Chat, VectorStore, ChatRole, Project
 from ..services.vector_store_service import VectorStoreService
 from ..extensions import db
 from ..services.chat_service import ChatService
+from ..services.job_service import JobService
 
 bp = Blueprint("chats", __name__)
 
@@ -34,6 +36,15 @@ def view(chat_id: int):
             user_message = request.form.get("message")
             if user_message:
                 ChatService.add_message(chat.id, "user", user_message)
+                if current_app.config.get('CHAT_REPLY_JOBS'):
+                    # Antwort erzeugt `manage.py run-jobs`; Seite pollt chats.reply_status
+                    active = JobService.active_for_chat(chat.id)
+                    if not active or active.status != 'queued':
+                        JobService.enqueue('chat_reply', {'chat_id': chat.id}, chat_id=chat.id)
+                    return redirect(url_for("chats.view", chat_id=chat.id))
+                if current_app.config.get('OPENAI_CHAT_STREAMING'):
+                    # Antwort wird von der Seite per SSE (chats.stream) abgeholt
+                    return redirect(url_for("chats.view", chat_id=chat.id, stream=1))
                 ChatService.generate_assistant_reply(chat)
                 return redirect(url_for("chats.view", chat_id=chat.id))
         elif 'vector_update' in request.form:
@@ -45,17 +56,142 @@ def view(chat_id: int):
     all_vectors = VectorStore.query.order_by(VectorStore.name.asc()).all()
     all_projects = Project.query.order_by(Project.created_at.desc()).all()
     chat_roles = ChatRole.query.order_by(ChatRole.name.asc()).all()
-    from ..models import Message as _Msg
+    # Nur die neuesten Nachrichten rendern, ältere lädt die Seite über chats.messages nach
+    messages, older_cursor = ChatService.message_page(chat, limit=current_app.config.get('CHAT_MESSAGES_PAGE_SIZE', 50))
+    # Offene User-Nachricht ohne Antwort -> Seite startet den SSE Stream
+    stream_pending = bool(request.args.get('stream')) and bool(messages) and messages[-1].role == 'user'
+    reply_job = JobService.latest_for_chat(chat.id)
+    if reply_job and reply_job.status not in ('queued', 'running') and not (messages and messages[-1].role == 'user'):
+        reply_job = None
     return render_template(
         "chat.html",
         chat=chat,
-        messages=chat.messages.order_by(_Msg.created_at.asc()).all(),
+        messages=messages,
+        rows=_message_rows(messages),
         all_vectors=all_vectors,
         all_projects=all_projects,
         chat_roles=chat_roles,
+        stream_pending=stream_pending,
+        reply_job=reply_job,
+        older_cursor=older_cursor,
     )
 
 
+@bp.get("/<int:chat_id>/messages")
+def messages(chat_id: int):
+    """JSON: Nachrichten vor ``before`` (Cursor), aufsteigend sortiert, plus Cursor für die nächstälteren."""
+    chat = Chat.query.get_or_404(chat_id)
+    limit = max(1, min(request.args.get('limit', current_app.config.get('CHAT_MESSAGES_PAGE_SIZE', 50), type=int), 200))
+    try:
+        rows, cursor = ChatService.message_page(chat, before=request.args.get('before'), limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'messages': [
+            {'id': m.id, 'role': m.role, 'content': m.content, 'created_at': m.created_at.isoformat(),
+             'chat_role': m.chat_role.name if m.chat_role else None, 'fanout_group': m.fanout_group}
+            for m in rows
+        ],
+        'before': cursor,
+    })
+
+
+@bp.get("/<int:chat_id>/reply-status")
+def reply_status(chat_id: int):
+    """Status des Antwort-Jobs (Polling der Chat Seite bei CHAT_REPLY_JOBS)."""
+    chat = Chat.query.get_or_404(chat_id)
+    job = JobService.latest_for_chat(chat.id)
+    if not job:
+        return jsonify({'status': None})
+    return jsonify({'status': job.status, 'attempts': job.attempts, 'error': job.error})
+
+
+def _message_rows(messages):
+    """Aufeinanderfolgende Fan-out Antworten einer Gruppe zu einer Zeile (nebeneinander) zusammenfassen."""
+    rows = []
+    for m in messages:
+        prev = rows[-1][-1] if rows else None
+        if (m.role == 'assistant' and m.fanout_group and prev is not None and prev.role == 'assistant'
+                and prev.fanout_group == m.fanout_group):
+            rows[-1].append(m)
+        else:
+            rows.append([m])
+    return rows
+
+
+@bp.route("/<int:chat_id>/fanout", methods=["POST"])
+def fanout(chat_id: int):
+    """Eine Frage parallel an mehrere Chat Rollen stellen."""
+    chat = Chat.query.get_or_404(chat_id)
+    content = (request.form.get('message') or '').strip()
+    role_ids = [int(x) for x in request.form.getlist('role_ids') if x.isdigit()]
+    if not content or not role_ids:
+        flash("Frage und mindestens eine Rolle wählen", "error")
+        return redirect(url_for("chats.view", chat_id=chat.id))
+    if current_app.config.get('CHAT_REPLY_JOBS'):
+        group = ChatService.start_fan_out(chat, content)
+        JobService.enqueue('chat_fanout', {'chat_id': chat.id, 'group': group, 'role_ids': role_ids}, chat_id=chat.id)
+        return redirect(url_for("chats.view", chat_id=chat.id))
+    # Synchroner Fan-out belegt den Chat wie ein Stream: Reload währenddessen startet keine zweite Antwort
+    if not ChatService.claim_reply(chat):
+        flash("Antwort wird bereits erzeugt", "error")
+        return redirect(url_for("chats.view", chat_id=chat.id))
+    try:
+        ChatService.fan_out(chat, content, role_ids)
+    except ValueError as e:
+        flash(str(e), "error")
+    finally:
+        ChatService.release_reply(chat)
+    return redirect(url_for("chats.view", chat_id=chat.id))
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@bp.get("/<int:chat_id>/stream")
+def stream(chat_id: int):
+    """Server-Sent Events: streamt die Antwort auf die letzte offene User-Nachricht."""
+    chat = Chat.query.get_or_404(chat_id)
+    from ..models import Message as _Msg
+
+    def last_message():
+        return chat.messages.order_by(_Msg.created_at.desc(), _Msg.id.desc()).first()
+
+    def generate():
+        last = last_message()
+        if not last or last.role != 'user':
+            # Nichts offen (z.B. Reload nach Abschluss) -> kein zweiter Model Call
+            yield _sse('done', {'message_id': last.id if last else None})
+            return
+        if JobService.active_for_chat(chat.id, kind=None) or not ChatService.claim_reply(chat):
+            # Antwort läuft bereits (anderer Tab, Reload während des Streams, Antwort- oder Fan-out Job) -> Seite wartet
+            yield _sse('busy', {})
+            return
+        last = last_message()
+        if last.role != 'user':
+            # Paralleler Stream ist zwischen Prüfung und Sperre fertig geworden
+            ChatService.release_reply(chat)
+            yield _sse('done', {'message_id': last.id})
+            return
+        try:
+            for event, payload in ChatService.stream_assistant_reply(chat):
+                if event == 'delta':
+                    yield _sse('delta', {'text': payload})
+                elif event == 'done':
+                    yield _sse('done', {'message_id': payload.id})
+                else:
+                    yield _sse('error', {'error': payload})
+        except Exception as e:  # noqa: BLE001
+            current_app.logger.warning('[Chat] stream Fehler chat=%s err=%s', chat.id, e)
+            yield _sse('error', {'error': str(e)})
+        finally:
+            ChatService.release_reply(chat)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+
 @bp.route('/<int:chat_id>/assign_project', methods=['POST'])
 def assign_project(chat_id: int):
     chat = Chat.query.get_or_404(chat_id)
@@ -65,6 +201,7 @@ def assign_project(chat_id: int):
         chat.project = proj
     else:
         chat.project = None
+    ChatService.invalidate_resources(chat_id=chat.id)
     from ..extensions import db as _db
     _db.session.commit()
     flash('Projektzuordnung aktualisiert', 'success')
@@ -17,8 +17,84 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+    # Alternativer Endpoint, z.B. lokaler Stand-in (python manage.py fake-openai) -> http://127.0.0.1:8099/v1
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "")
     OPENAI_CHAT_MODEL = os.environ.get("OPENAI_CHAT_MODEL", "gpt-4.5")  # Platzhalter
     OPENAI_WORKER_MODEL = os.environ.get("OPENAI_WORKER_MODEL", "gpt-4.1")  # Platzhalter
     OPENAI_REQUEST_TIMEOUT = int(os.environ.get("OPENAI_REQUEST_TIMEOUT", "60"))  # Sekunden
-    OPENAI_POLL_INTERVAL = float(os.environ.get("OPENAI_POLL_INTERVAL", "1.0"))  # Sekunden zwischen Polls
+    # Adaptives Polling (Responses + Assistants Runs): Backoff von Floor bis Ceiling mit Jitter
+    OPENAI_POLL_FLOOR = float(os.environ.get("OPENAI_POLL_FLOOR", "0.25"))       # kürzestes Intervall (s)
+    OPENAI_POLL_CEILING = float(os.environ.get("OPENAI_POLL_CEILING", "5.0"))    # längstes Intervall (s)
+    OPENAI_POLL_BACKOFF = float(os.environ.get("OPENAI_POLL_BACKOFF", "1.6"))    # Faktor je Poll ohne Fortschritt
+    OPENAI_POLL_JITTER = float(os.environ.get("OPENAI_POLL_JITTER", "0.2"))      # +/- Anteil Zufall
     OPENAI_POLL_TIMEOUT = int(os.environ.get("OPENAI_POLL_TIMEOUT", "120"))      # Max Wartezeit gesamt
+    # Chat Antworten per Responses Streaming + SSE statt blockierendem POST
+    OPENAI_CHAT_STREAMING = os.environ.get("OPENAI_CHAT_STREAMING", "1") == "1"
+    # Max. Dauer (s), die eine laufende SSE Antwort den Chat für weitere Streams sperrt (z.B. nach Absturz)
+    CHAT_STREAM_LOCK_TIMEOUT = int(os.environ.get("CHAT_STREAM_LOCK_TIMEOUT", "600"))
+    # Chat Antworten als DB Job einreihen (ausgeführt von `manage.py run-jobs`) statt im Web Request
+    CHAT_REPLY_JOBS = os.environ.get("CHAT_REPLY_JOBS", "0") == "1"
+    # Job Worker: parallele Threads, Poll-Intervall (s), Versuche je Job, Lock-Timeout (s) für abgestürzte Worker
+    # (laufende Jobs erneuern ihren Lock per Heartbeat alle JOB_LOCK_TIMEOUT/4)
+    JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "4"))
+    JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+    JOB_LOCK_TIMEOUT = int(os.environ.get("JOB_LOCK_TIMEOUT", "600"))
+    # Chat Seite: Anzahl initial gerenderter Nachrichten, ältere werden per JSON nachgeladen
+    CHAT_MESSAGES_PAGE_SIZE = int(os.environ.get("CHAT_MESSAGES_PAGE_SIZE", "50"))
+    # Fan-out: max. parallele Rollen je Frage
+    CHAT_FANOUT_CONCURRENCY = int(os.environ.get("CHAT_FANOUT_CONCURRENCY", "4"))
+    # Worker Runs als Job (ausgeführt von `manage.py run-jobs`) statt im Web Request;
+    # Zeitscheibe je Job (< JOB_LOCK_TIMEOUT) und Gesamt-Timeout (s)
+    WORKER_RUN_JOBS = os.environ.get("WORKER_RUN_JOBS", "0") == "1"
+    WORKER_RUN_POLL_SLICE = int(os.environ.get("WORKER_RUN_POLL_SLICE", "240"))
+    WORKER_RUN_TIMEOUT = int(os.environ.get("WORKER_RUN_TIMEOUT", "1800"))
+    # Worker Runs per Assistants Event Stream (Text/Files aus Events, Zwischenstand alle n Sekunden ins Log)
+    WORKER_RUN_STREAMING = os.environ.get("WORKER_RUN_STREAMING", "1") == "1"
+    WORKER_RUN_FLUSH_INTERVAL = float(os.environ.get("WORKER_RUN_FLUSH_INTERVAL", "1.0"))
+    # "Alle Worker ausführen": max. gleichzeitige Runs je Projekt (zusätzlich durch JOB_CONCURRENCY begrenzt),
+    # Wartezeit (s) bis ein blockierter Run (Thread belegt / Limit erreicht) erneut versucht wird
+    PROJECT_RUN_CONCURRENCY = int(os.environ.get("PROJECT_RUN_CONCURRENCY", "4"))
+    WORKER_RUN_WAIT = float(os.environ.get("WORKER_RUN_WAIT", "5"))
+    # Worker Batches (viele Prompts, je Prompt ein eigener Thread): max. gleichzeitige Runs je Batch,
+    # max. Prompts je Datei, Threads nach Abschluss eines Eintrags löschen
+    WORKER_BATCH_CONCURRENCY = int(os.environ.get("WORKER_BATCH_CONCURRENCY", "4"))
+    WORKER_BATCH_MAX_PROMPTS = int(os.environ.get("WORKER_BATCH_MAX_PROMPTS", "1000"))
+    WORKER_BATCH_DELETE_THREADS = os.environ.get("WORKER_BATCH_DELETE_THREADS", "1") == "1"
+    # Batch API Fragebögen: Status-Abfrage per Job alle n Sekunden, max. Prompts je Batch (API Limit 50.000)
+    BATCH_POLL_INTERVAL = float(os.environ.get("BATCH_POLL_INTERVAL", "60"))
+    BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "50000"))
+    # Folge-Turns per previous_response_id verketten statt den ganzen Verlauf erneut zu senden
+    OPENAI_CHAT_CHAINING = os.environ.get("OPENAI_CHAT_CHAINING", "1") == "1"
+    # Kontext-Budget (geschätzte Tokens) für den Verlauf je Request, falls die Chat Rolle keins setzt (0 = unbegrenzt)
+    OPENAI_CHAT_CONTEXT_BUDGET = int(os.environ.get("OPENAI_CHAT_CONTEXT_BUDGET", "12000"))
+    # Modell und Länge der rollierenden Zusammenfassung älterer Turns
+    OPENAI_SUMMARY_MODEL = os.environ.get("OPENAI_SUMMARY_MODEL", "gpt-4.1-mini")
+    OPENAI_SUMMARY_MAX_TOKENS = int(os.environ.get("OPENAI_SUMMARY_MAX_TOKENS", "800"))
+    # HTTP Connection Pool des prozessweiten OpenAI Clients (Keep-Alive statt neuer TLS Handshakes)
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+    OPENAI_KEEPALIVE = int(os.environ.get("OPENAI_KEEPALIVE", "10"))                  # max. Keep-Alive Verbindungen
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "30"))  # Sekunden bis Idle-Verbindung schließt
+    OPENAI_LIST_PAGE_SIZE = int(os.environ.get("OPENAI_LIST_PAGE_SIZE", "100"))  # Items je Seite bei List-Iteratoren (Vector Stores max. 100)
+    # Uploads: ab Schwelle über die Uploads API in Parts (parallel), Admin lädt mehrere Dateien parallel
+    OPENAI_UPLOAD_MULTIPART_THRESHOLD = int(os.environ.get("OPENAI_UPLOAD_MULTIPART_THRESHOLD", str(32 * 1024 * 1024)))  # Bytes
+    OPENAI_UPLOAD_PART_SIZE = int(os.environ.get("OPENAI_UPLOAD_PART_SIZE", str(16 * 1024 * 1024)))  # Bytes, max. 64 MB
+    OPENAI_UPLOAD_PART_CONCURRENCY = int(os.environ.get("OPENAI_UPLOAD_PART_CONCURRENCY", "4"))  # parallele Parts je Datei
+    OPENAI_UPLOAD_FILE_CONCURRENCY = int(os.environ.get("OPENAI_UPLOAD_FILE_CONCURRENCY", "3"))  # parallele Dateien je Admin Upload
+    # Antwort-Cache für Chat Rollen mit aktiviertem Cache (prozesslokal, LRU)
+    OPENAI_RESPONSE_CACHE_SIZE = int(os.environ.get("OPENAI_RESPONSE_CACHE_SIZE", "256"))    # max. Einträge
+    OPENAI_RESPONSE_CACHE_TTL = int(os.environ.get("OPENAI_RESPONSE_CACHE_TTL", "86400"))    # Default TTL (s)
+    # Asyncio Fan-out (AsyncOpenAI im prozessweiten Event Loop)
+    OPENAI_ASYNC_CONCURRENCY = int(os.environ.get("OPENAI_ASYNC_CONCURRENCY", "8"))   # parallele Requests je Fan-out
+    OPENAI_ASYNC_TIMEOUT = float(os.environ.get("OPENAI_ASYNC_TIMEOUT", "300"))       # Gesamt-Timeout je Fan-out (s)
+    # Retry Policy + Circuit Breaker je Endpoint (ersetzt SDK-interne Retries)
+    OPENAI_RETRY_MAX = int(os.environ.get("OPENAI_RETRY_MAX", "3"))
+    OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", "0.5"))   # Full-Jitter Basis (s)
+    OPENAI_RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", "30"))      # Obergrenze je Wartezeit (s)
+    OPENAI_BREAKER_THRESHOLD = int(os.environ.get("OPENAI_BREAKER_THRESHOLD", "5"))     # Fehler in Folge bis offen
+    OPENAI_BREAKER_COOLDOWN = float(os.environ.get("OPENAI_BREAKER_COOLDOWN", "30"))    # Sekunden bis Probe-Request
+    # OpenAI Call Ledger (Tabelle openai_call)
+    OPENAI_LEDGER_ENABLED = os.environ.get("OPENAI_LEDGER_ENABLED", "1") == "1"
+    OPENAI_LEDGER_BATCH = int(os.environ.get("OPENAI_LEDGER_BATCH", "50"))           # Einträge je Bulk-Insert
+    OPENAI_LEDGER_FLUSH_SEC = float(os.environ.get("OPENAI_LEDGER_FLUSH_SEC", "2"))  # spätestens nach n Sekunden schreiben
+    OPENAI_PRICING_JSON = os.environ.get("OPENAI_PRICING_JSON")  # {"model": [input, cached, output]} USD je 1M Tokens
@@ -0,0 +1,13 @@
+"""Lokaler OpenAI Stand-in für Benchmarks, Lasttests und CI (ohne API Key).
+
+Implementiert die von Orquestrix genutzte Teilmenge der API (Responses inkl. Streaming,
+Threads/Runs/Steps/Messages, Assistants, Files, Uploads, Vector Stores und deren Files)
+im Speicher, mit konfigurierbarer Latenz, Rate Limit und Fehlerquote.
+
+Start:  python manage.py fake-openai --port 8099 --latency lognormal:0.2,0.5 --rpm 600
+App:    OPENAI_BASE_URL=http://127.0.0.1:8099/v1
+"""
+from .faults import FaultSettings, Latency
+from .server import create_fake_app
+
+__all__ = ['FaultSettings', 'Latency', 'create_fake_app']
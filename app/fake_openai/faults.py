@@ -0,0 +1,127 @@
+from __future__ import annotations
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional, Tuple
+import math
+import random
+import threading
+import time
+
+
+@dataclass
+class Latency:
+    """Latenzverteilung in Sekunden.
+
+    Spezifikation als String: ``fixed:0.2``, ``uniform:0.05,0.5``, ``normal:0.2,0.05``,
+    ``lognormal:0.2,0.5`` (Median, Sigma) oder ``exp:0.2`` (Mittelwert).
+    """
+    kind: str = 'fixed'
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: Any) -> 'Latency':
+        if isinstance(spec, Latency):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls('fixed', float(spec))
+        kind, _, args = str(spec).partition(':')
+        if not args:
+            # "0.2" ohne Typ = fixed
+            return cls('fixed', float(kind))
+        values = [float(v) for v in args.split(',')]
+        if kind not in ('fixed', 'uniform', 'normal', 'lognormal', 'exp'):
+            raise ValueError(f'Unbekannte Latenzverteilung: {kind}')
+        return cls(kind, values[0], values[1] if len(values) > 1 else 0.0)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'uniform':
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == 'normal':
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == 'lognormal':
+            value = self.a * math.exp(rng.gauss(0.0, self.b)) if self.a > 0 else 0.0
+        elif self.kind == 'exp':
+            value = rng.expovariate(1 / self.a) if self.a > 0 else 0.0
+        else:
+            value = self.a
+        return max(0.0, value)
+
+    def __str__(self) -> str:
+        if self.kind == 'fixed':
+            return f'fixed:{self.a:g}'
+        if self.kind == 'exp':
+            return f'exp:{self.a:g}'
+        return f'{self.kind}:{self.a:g},{self.b:g}'
+
+
+@dataclass
+class FaultSettings:
+    """Verhalten des Stand-in Servers (zur Laufzeit über ``/_fake/settings`` änderbar)."""
+    latency: Latency = field(default_factory=Latency)             # je HTTP Request
+    stream_delay: Latency = field(default_factory=lambda: Latency('fixed', 0.02))  # je SSE Delta
+    run_queue: Latency = field(default_factory=lambda: Latency('fixed', 0.5))      # Run queued -> in_progress
+    run_time: Latency = field(default_factory=lambda: Latency('fixed', 2.0))       # Run in_progress -> terminal
+    rpm: int = 0                      # Requests pro Minute (0 = kein Rate Limit)
+    error_rate: float = 0.0           # Anteil Requests mit 5xx
+    error_statuses: Tuple[int, ...] = (500, 502, 503)
+    run_fail_rate: float = 0.0        # Anteil Runs mit Status failed
+    output_file_rate: float = 0.0     # Anteil Runs mit erzeugter assistants_output Datei
+    reply_words: int = 60             # Länge der generierten Antworten
+    seed: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        for key in ('latency', 'stream_delay', 'run_queue', 'run_time'):
+            d[key] = str(getattr(self, key))
+        d['error_statuses'] = list(self.error_statuses)
+        return d
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            if key in ('latency', 'stream_delay', 'run_queue', 'run_time'):
+                setattr(self, key, Latency.parse(value))
+            elif key == 'error_statuses':
+                self.error_statuses = tuple(int(v) for v in value)
+            elif key in ('rpm', 'reply_words'):
+                setattr(self, key, int(value))
+            elif key in ('error_rate', 'run_fail_rate', 'output_file_rate'):
+                setattr(self, key, float(value))
+            elif key == 'seed':
+                self.seed = int(value) if value is not None else None
+            else:
+                raise ValueError(f'Unbekannte Einstellung: {key}')
+
+
+class RateLimiter:
+    """Token Bucket je Minute; liefert dieselben Header wie die OpenAI API."""
+
+    def __init__(self, rpm: int, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.configure(rpm)
+
+    def configure(self, rpm: int) -> None:
+        with self._lock:
+            self.rpm = max(0, rpm)
+            self._tokens = float(self.rpm)
+            self._updated = self._clock()
+
+    def acquire(self) -> Tuple[bool, float, Dict[str, str]]:
+        """(zugelassen, Sekunden bis nächster Token, Rate Limit Header)."""
+        if not self.rpm:
+            return True, 0.0, {}
+        with self._lock:
+            now = self._clock()
+            rate = self.rpm / 60.0
+            self._tokens = min(float(self.rpm), self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            allowed = self._tokens >= 1.0
+            if allowed:
+                self._tokens -= 1.0
+            wait = 0.0 if self._tokens >= 1.0 else (1.0 - self._tokens) / rate
+            headers = {
+                'x-ratelimit-limit-requests': str(self.rpm),
+                'x-ratelimit-remaining-requests': str(int(self._tokens)),
+                'x-ratelimit-reset-requests': f'{int(wait * 1000)}ms',
+            }
+        return allowed, wait, headers
@@ -0,0 +1,576 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterator, Optional, Tuple
+import json
+import time
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, stream_with_context
+from .faults import FaultSettings, RateLimiter
+from .store import FakeStore, new_id, paginate
+
+
+bp = Blueprint('fake_openai', __name__)
+
+
+def _store() -> FakeStore:
+    return current_app.extensions['fake_openai']
+
+
+def _error(status: int, message: str, etype: str = 'invalid_request_error', code: Optional[str] = None,
+           headers: Optional[Dict[str, str]] = None, param: Optional[str] = None) -> Tuple[Response, int]:
+    resp = jsonify({'error': {'message': message, 'type': etype, 'param': param, 'code': code}})
+    for k, v in (headers or {}).items():
+        resp.headers[k] = v
+    return resp, status
+
+
+def _not_found(kind: str, oid: str):
+    return _error(404, f"No {kind} found with id '{oid}'.", code='not_found')
+
+
+def _page(items):
+    args = request.args
+    return jsonify(paginate(
+        FakeStore.public_list(items),
+        args.get('limit', type=int),
+        after=args.get('after'),
+        before=args.get('before'),
+        order=args.get('order', 'desc'),
+    ))
+
+
+# ---------------------- Fehler-/Latenz-Injektion ----------------------
+@bp.before_request
+def _inject_faults():
+    if request.path.startswith('/_fake'):
+        return None
+    store = _store()
+    settings = store.settings
+    store.count(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}')
+    allowed, wait, headers = current_app.extensions['fake_openai_limiter'].acquire()
+    g.ratelimit_headers = headers
+    if not allowed:
+        headers = dict(headers, **{'retry-after-ms': str(int(wait * 1000)), 'retry-after': str(max(1, round(wait)))})
+        return _error(429, 'Rate limit reached for requests (fake)', 'requests', 'rate_limit_exceeded', headers)
+    delay = settings.latency.sample(store.rng)
+    if delay:
+        time.sleep(delay)
+    if settings.error_rate and store.rng.random() < settings.error_rate:
+        status = store.rng.choice(settings.error_statuses or (500,))
+        return _error(status, f'Simulierter Fehler {status} (fake)', 'server_error', 'server_error')
+    return None
+
+
+@bp.after_request
+def _ratelimit_headers(resp: Response) -> Response:
+    for k, v in (getattr(g, 'ratelimit_headers', None) or {}).items():
+        resp.headers.setdefault(k, v)
+    resp.headers.setdefault('x-request-id', new_id('req'))
+    return resp
+
+
+# ---------------------- Steuerung ----------------------
+@bp.route('/_fake/settings', methods=['GET', 'POST'])
+def fake_settings():
+    store = _store()
+    if request.method == 'POST':
+        try:
+            with store.lock:
+                store.settings.update(request.get_json(force=True) or {})
+        except (ValueError, TypeError) as e:
+            return _error(400, str(e))
+        current_app.extensions['fake_openai_limiter'].configure(store.settings.rpm)
+    return jsonify(store.settings.as_dict())
+
+
+@bp.post('/_fake/reset')
+def fake_reset():
+    _store().reset()
+    return jsonify({'reset': True})
+
+
+@bp.get('/_fake/stats')
+def fake_stats():
+    store = _store()
+    with store.lock:
+        return jsonify({
+            'requests': dict(sorted(store.counters.items())),
+            'objects': {
+                'files': len(store.files), 'vector_stores': len(store.vector_stores), 'assistants': len(store.assistants),
+                'threads': len(store.threads), 'runs': len(store.runs), 'responses': len(store.responses),
+            },
+        })
+
+
+# ---------------------- Models ----------------------
+@bp.get('/v1/models')
+def models_list():
+    now = int(time.time())
+    ids = ('gpt-4.1', 'gpt-4.1-mini', 'gpt-4o', 'gpt-4o-mini', 'gpt-4.5-preview', 'o3', 'o4-mini')
+    return jsonify({'object': 'list', 'data': [{'id': m, 'object': 'model', 'created': now, 'owned_by': 'fake'} for m in ids]})
+
+
+# ---------------------- Responses ----------------------
+@bp.post('/v1/responses')
+def responses_create():
+    payload = request.get_json(force=True) or {}
+    if not payload.get('model'):
+        return _error(400, "Missing required parameter: 'model'.")
+    store = _store()
+    prev = payload.get('previous_response_id')
+    if prev and prev not in store.responses:
+        return _error(400, f"Previous response with id '{prev}' not found.", code='previous_response_not_found',
+                      param='previous_response_id')
+    obj = store.build_response(payload)
+    if not payload.get('stream'):
+        return jsonify(obj)
+    return Response(stream_with_context(_stream_response(store, obj)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def _stream_response(store: FakeStore, obj: Dict[str, Any]) -> Iterator[str]:
+    item = obj['output'][0]
+    text = item['content'][0]['text']
+    pending = dict(obj, status='in_progress', output=[], usage=None)
+    seq = iter(range(1_000_000))
+    yield _sse({'type': 'response.created', 'response': pending, 'sequence_number': next(seq)})
+    yield _sse({'type': 'response.in_progress', 'response': pending, 'sequence_number': next(seq)})
+    yield _sse({'type': 'response.output_item.added', 'output_index': 0, 'sequence_number': next(seq),
+                'item': dict(item, status='in_progress', content=[])})
+    yield _sse({'type': 'response.content_part.added', 'item_id': item['id'], 'output_index': 0, 'content_index': 0,
+                'sequence_number': next(seq), 'part': {'type': 'output_text', 'text': '', 'annotations': []}})
+    words = text.split(' ')
+    for i, word in enumerate(words):
+        delay = store.settings.stream_delay.sample(store.rng)
+        if delay:
+            time.sleep(delay)
+        delta = word if i == len(words) - 1 else word + ' '
+        yield _sse({'type': 'response.output_text.delta', 'item_id': item['id'], 'output_index': 0,
+                    'content_index': 0, 'delta': delta, 'sequence_number': next(seq)})
+    yield _sse({'type': 'response.output_text.done', 'item_id': item['id'], 'output_index': 0, 'content_index': 0,
+                'text': text, 'sequence_number': next(seq)})
+    yield _sse({'type': 'response.content_part.done', 'item_id': item['id'], 'output_index': 0, 'content_index': 0,
+                'sequence_number': next(seq), 'part': item['content'][0]})
+    yield _sse({'type': 'response.output_item.done', 'output_index': 0, 'item': item, 'sequence_number': next(seq)})
+    final = 'response.completed' if obj['status'] == 'completed' else 'response.incomplete'
+    yield _sse({'type': final, 'response': obj, 'sequence_number': next(seq)})
+
+
+@bp.get('/v1/responses/<response_id>')
+def responses_retrieve(response_id: str):
+    obj = _store().responses.get(response_id)
+    return jsonify(obj) if obj else _not_found('response', response_id)
+
+
+# ---------------------- Files ----------------------
+@bp.post('/v1/files')
+def files_create():
+    up = request.files.get('file')
+    purpose = request.form.get('purpose')
+    if up is None or not purpose:
+        return _error(400, "Missing required parameter: 'file' or 'purpose'.")
+    return jsonify(_store().add_file(up.filename or 'upload', up.read(), purpose))
+
+
+@bp.get('/v1/files')
+def files_list():
+    return _page(_store().files_of(request.args.get('purpose')))
+
+
+@bp.get('/v1/files/<file_id>')
+def files_retrieve(file_id: str):
+    obj = _store().files.get(file_id)
+    return jsonify(obj) if obj else _not_found('file', file_id)
+
+
+@bp.delete('/v1/files/<file_id>')
+def files_delete(file_id: str):
+    store = _store()
+    with store.lock:
+        found = store.files.pop(file_id, None) is not None
+        store.file_content.pop(file_id, None)
+    if not found:
+        return _not_found('file', file_id)
+    return jsonify({'id': file_id, 'object': 'file', 'deleted': True})
+
+
+@bp.get('/v1/files/<file_id>/content')
+def files_content(file_id: str):
+    content = _store().file_content.get(file_id)
+    if content is None:
+        return _not_found('file', file_id)
+    return Response(content, mimetype='application/octet-stream')
+
+
+# ---------------------- Uploads (Multipart) ----------------------
+@bp.post('/v1/uploads')
+def uploads_create():
+    payload = request.get_json(force=True) or {}
+    now = int(time.time())
+    obj = {
+        'id': new_id('upload'),
+        'object': 'upload',
+        'bytes': payload.get('bytes'),
+        'filename': payload.get('filename'),
+        'purpose': payload.get('purpose'),
+        'status': 'pending',
+        'created_at': now,
+        'expires_at': now + 3600,
+        'file': None,
+    }
+    _store().uploads[obj['id']] = obj
+    return jsonify(obj)
+
+
+@bp.post('/v1/uploads/<upload_id>/parts')
+def uploads_parts_create(upload_id: str):
+    store = _store()
+    upload = store.uploads.get(upload_id)
+    if not upload:
+        return _not_found('upload', upload_id)
+    data = request.files.get('data')
+    if data is None:
+        return _error(400, "Missing required parameter: 'data'.")
+    part_id = new_id('part')
+    with store.lock:
+        store.upload_parts[part_id] = data.read()
+    return jsonify({'id': part_id, 'object': 'upload.part', 'upload_id': upload_id, 'created_at': int(time.time())})
+
+
+@bp.post('/v1/uploads/<upload_id>/complete')
+def uploads_complete(upload_id: str):
+    store = _store()
+    upload = store.uploads.get(upload_id)
+    if not upload:
+        return _not_found('upload', upload_id)
+    part_ids = (request.get_json(force=True) or {}).get('part_ids') or []
+    with store.lock:
+        missing = [p for p in part_ids if p not in store.upload_parts]
+        if missing:
+            return _error(400, f'Unknown part ids: {missing}')
+        content = b''.join(store.upload_parts.pop(p) for p in part_ids)
+    if upload['bytes'] is not None and len(content) != upload['bytes']:
+        return _error(400, f"Upload size mismatch: expected {upload['bytes']} got {len(content)}")
+    upload['file'] = store.add_file(upload['filename'], content, upload['purpose'])
+    upload['status'] = 'completed'
+    return jsonify(upload)
+
+
+@bp.post('/v1/uploads/<upload_id>/cancel')
+def uploads_cancel(upload_id: str):
+    upload = _store().uploads.get(upload_id)
+    if not upload:
+        return _not_found('upload', upload_id)
+    upload['status'] = 'cancelled'
+    return jsonify(upload)
+
+
+# ---------------------- Vector Stores ----------------------
+@bp.post('/v1/vector_stores')
+def vector_stores_create():
+    payload = request.get_json(force=True) or {}
+    store = _store()
+    obj = store.add_vector_store(payload.get('name'))
+    for fid in payload.get('file_ids') or []:
+        store.attach_file(obj['id'], fid)
+    return jsonify(obj)
+
+
+@bp.get('/v1/vector_stores')
+def vector_stores_list():
+    return _page(list(_store().vector_stores.values()))
+
+
+@bp.get('/v1/vector_stores/<vs_id>')
+def vector_stores_retrieve(vs_id: str):
+    obj = _store().vector_stores.get(vs_id)
+    return jsonify(obj) if obj else _not_found('vector store', vs_id)
+
+
+@bp.delete('/v1/vector_stores/<vs_id>')
+def vector_stores_delete(vs_id: str):
+    store = _store()
+    with store.lock:
+        found = store.vector_stores.pop(vs_id, None) is not None
+        store.vector_store_files.pop(vs_id, None)
+    if not found:
+        return _not_found('vector store', vs_id)
+    return jsonify({'id': vs_id, 'object': 'vector_store.deleted', 'deleted': True})
+
+
+@bp.post('/v1/vector_stores/<vs_id>/files')
+def vector_store_files_create(vs_id: str):
+    store = _store()
+    if vs_id not in store.vector_stores:
+        return _not_found('vector store', vs_id)
+    file_id = (request.get_json(force=True) or {}).get('file_id')
+    if file_id not in store.files:
+        return _not_found('file', file_id or '')
+    return jsonify(store.attach_file(vs_id, file_id))
+
+
+@bp.get('/v1/vector_stores/<vs_id>/files')
+def vector_store_files_list(vs_id: str):
+    store = _store()
+    if vs_id not in store.vector_stores:
+        return _not_found('vector store', vs_id)
+    return _page(list(store.vector_store_files[vs_id].values()))
+
+
+@bp.delete('/v1/vector_stores/<vs_id>/files/<file_id>')
+def vector_store_files_delete(vs_id: str, file_id: str):
+    store = _store()
+    with store.lock:
+        found = store.vector_store_files.get(vs_id, {}).pop(file_id, None) is not None
+        if found:
+            store._refresh_counts(vs_id)
+    if not found:
+        return _not_found('vector store file', file_id)
+    return jsonify({'id': file_id, 'object': 'vector_store.file.deleted', 'deleted': True})
+
+
+# ---------------------- Assistants ----------------------
+@bp.post('/v1/assistants')
+def assistants_create():
+    payload = request.get_json(force=True) or {}
+    obj = {
+        'id': new_id('asst'),
+        'object': 'assistant',
+        'created_at': int(time.time()),
+        'name': payload.get('name'),
+        'description': payload.get('description'),
+        'model': payload.get('model') or 'gpt-4.1',
+        'instructions': payload.get('instructions'),
+        'tools': payload.get('tools') or [],
+        'tool_resources': payload.get('tool_resources') or {},
+        'metadata': payload.get('metadata') or {},
+        'temperature': payload.get('temperature'),
+        'top_p': payload.get('top_p'),
+        'response_format': 'auto',
+    }
+    _store().assistants[obj['id']] = obj
+    return jsonify(obj)
+
+
+@bp.get('/v1/assistants')
+def assistants_list():
+    return _page(list(_store().assistants.values()))
+
+
+@bp.delete('/v1/assistants/<assistant_id>')
+def assistants_delete(assistant_id: str):
+    if _store().assistants.pop(assistant_id, None) is None:
+        return _not_found('assistant', assistant_id)
+    return jsonify({'id': assistant_id, 'object': 'assistant.deleted', 'deleted': True})
+
+
+# ---------------------- Threads / Messages / Runs ----------------------
+@bp.post('/v1/threads')
+def threads_create():
+    payload = request.get_json(force=True, silent=True) or {}
+    store = _store()
+    obj = {
+        'id': new_id('thread'),
+        'object': 'thread',
+        'created_at': int(time.time()),
+        'tool_resources': payload.get('tool_resources') or {},
+        'metadata': payload.get('metadata') or {},
+    }
+    with store.lock:
+        store.threads[obj['id']] = obj
+        store.messages[obj['id']] = []
+    for m in payload.get('messages') or []:
+        store.add_message(obj['id'], m.get('role', 'user'), m.get('content'), attachments=m.get('attachments'))
+    return jsonify(obj)
+
+
+@bp.delete('/v1/threads/<thread_id>')
+def threads_delete(thread_id: str):
+    store = _store()
+    with store.lock:
+        if store.threads.pop(thread_id, None) is None:
+            return _not_found('thread', thread_id)
+        store.messages.pop(thread_id, None)
+        for run_id in [rid for rid, r in store.runs.items() if r['thread_id'] == thread_id]:
+            del store.runs[run_id]
+            store.steps.pop(run_id, None)
+    return jsonify({'id': thread_id, 'object': 'thread.deleted', 'deleted': True})
+
+
+@bp.post('/v1/threads/<thread_id>/messages')
+def messages_create(thread_id: str):
+    store = _store()
+    if thread_id not in store.threads:
+        return _not_found('thread', thread_id)
+    if any(r['thread_id'] == thread_id and r['status'] in ('queued', 'in_progress')
+           for r in (store.advance_run(r) for r in list(store.runs.values()))):
+        return _error(400, f"Can't add messages to {thread_id} while a run is active.")
+    payload = request.get_json(force=True) or {}
+    return jsonify(store.add_message(thread_id, payload.get('role', 'user'), payload.get('content'),
+                                     attachments=payload.get('attachments')))
+
+
+@bp.get('/v1/threads/<thread_id>/messages')
+def messages_list(thread_id: str):
+    store = _store()
+    if thread_id not in store.threads:
+        return _not_found('thread', thread_id)
+    for run in list(store.runs.values()):
+        if run['thread_id'] == thread_id:
+            store.advance_run(run)
+    items = list(store.messages.get(thread_id, []))
+    run_id = request.args.get('run_id')
+    if run_id:
+        items = [m for m in items if m['run_id'] == run_id]
+    return _page(items)
+
+
+@bp.post('/v1/threads/<thread_id>/runs')
+def runs_create(thread_id: str):
+    store = _store()
+    if thread_id not in store.threads:
+        return _not_found('thread', thread_id)
+    payload = request.get_json(force=True) or {}
+    if not payload.get('assistant_id'):
+        return _error(400, "Missing required parameter: 'assistant_id'.")
+    run = store.create_run(thread_id, payload['assistant_id'], payload.get('model'), payload.get('instructions'))
+    if not payload.get('stream'):
+        return jsonify(FakeStore.public(run))
+    return Response(stream_with_context(_stream_run(store, run)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+def _thread_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_run(store: FakeStore, run: Dict[str, Any]) -> Iterator[str]:
+    """Assistants Event Stream: Statuswechsel zu den simulierten Zeitpunkten, danach Message Deltas."""
+    yield _thread_sse('thread.run.created', FakeStore.public(run))
+    yield _thread_sse('thread.run.queued', FakeStore.public(run))
+    for key, status in (('_started', 'in_progress'), ('_finished', None)):
+        while run['status'] in ('queued', 'in_progress') and time.time() < run[key]:
+            time.sleep(min(0.05, max(0.0, run[key] - time.time())))
+        store.advance_run(run)
+        if status and run['status'] == status:
+            yield _thread_sse('thread.run.in_progress', FakeStore.public(run))
+    if run['status'] != 'completed':
+        yield _thread_sse(f"thread.run.{run['status']}", FakeStore.public(run))
+        yield 'event: done\ndata: [DONE]\n\n'
+        return
+    msg = next(m for m in reversed(store.messages[run['thread_id']]) if m['run_id'] == run['id'])
+    step = store.steps[run['id']][-1]
+    yield _thread_sse('thread.run.step.created', dict(step, status='in_progress', completed_at=None))
+    yield _thread_sse('thread.message.created', dict(msg, status='in_progress', content=[]))
+    text = msg['content'][0]['text']
+    words = text['value'].split(' ')
+    for i, word in enumerate(words):
+        delay = store.settings.stream_delay.sample(store.rng)
+        if delay:
+            time.sleep(delay)
+        part = {'index': 0, 'type': 'text', 'text': {'value': word if i == len(words) - 1 else word + ' '}}
+        if i == len(words) - 1 and text['annotations']:
+            part['text']['annotations'] = [dict(a, index=j) for j, a in enumerate(text['annotations'])]
+        yield _thread_sse('thread.message.delta', {'id': msg['id'], 'object': 'thread.message.delta',
+                                                    'delta': {'content': [part]}})
+    yield _thread_sse('thread.message.completed', msg)
+    yield _thread_sse('thread.run.step.completed', step)
+    yield _thread_sse('thread.run.completed', FakeStore.public(run))
+    yield 'event: done\ndata: [DONE]\n\n'
+
+
+@bp.get('/v1/threads/<thread_id>/runs')
+def runs_list(thread_id: str):
+    store = _store()
+    if thread_id not in store.threads:
+        return _not_found('thread', thread_id)
+    items = [store.advance_run(r) for r in list(store.runs.values()) if r['thread_id'] == thread_id]
+    return _page(items)
+
+
+@bp.get('/v1/threads/<thread_id>/runs/<run_id>')
+def runs_retrieve(thread_id: str, run_id: str):
+    store = _store()
+    run = store.runs.get(run_id)
+    if not run or run['thread_id'] != thread_id:
+        return _not_found('run', run_id)
+    return jsonify(FakeStore.public(store.advance_run(run)))
+
+
+@bp.post('/v1/threads/<thread_id>/runs/<run_id>/cancel')
+def runs_cancel(thread_id: str, run_id: str):
+    store = _store()
+    run = store.runs.get(run_id)
+    if not run or run['thread_id'] != thread_id:
+        return _not_found('run', run_id)
+    with store.lock:
+        store.advance_run(run)
+        if run['status'] in ('queued', 'in_progress'):
+            run['status'] = 'cancelled'
+            run['cancelled_at'] = int(time.time())
+    return jsonify(FakeStore.public(run))
+
+
+@bp.get('/v1/threads/<thread_id>/runs/<run_id>/steps')
+def runs_steps_list(thread_id: str, run_id: str):
+    store = _store()
+    run = store.runs.get(run_id)
+    if not run or run['thread_id'] != thread_id:
+        return _not_found('run', run_id)
+    store.advance_run(run)
+    return _page(list(store.steps.get(run_id, [])))
+
+
+# ---------------------- Batches ----------------------
+@bp.post('/v1/batches')
+def batches_create():
+    store = _store()
+    payload = request.get_json(force=True) or {}
+    file_id = payload.get('input_file_id')
+    if file_id not in store.files:
+        return _not_found('file', file_id or '')
+    if store.files[file_id]['purpose'] != 'batch':
+        return _error(400, "The input file must have purpose 'batch'.", param='input_file_id')
+    if payload.get('endpoint') not in ('/v1/responses', '/v1/chat/completions', '/v1/embeddings'):
+        return _error(400, f"Unsupported endpoint '{payload.get('endpoint')}'.", param='endpoint')
+    batch = store.create_batch(file_id, payload['endpoint'], payload.get('completion_window') or '24h',
+                               payload.get('metadata'))
+    return jsonify(FakeStore.public(batch))
+
+
+@bp.get('/v1/batches')
+def batches_list():
+    store = _store()
+    return _page([store.advance_batch(b) for b in list(store.batches.values())])
+
+
+@bp.get('/v1/batches/<batch_id>')
+def batches_retrieve(batch_id: str):
+    store = _store()
+    batch = store.batches.get(batch_id)
+    if not batch:
+        return _not_found('batch', batch_id)
+    return jsonify(FakeStore.public(store.advance_batch(batch)))
+
+
+@bp.post('/v1/batches/<batch_id>/cancel')
+def batches_cancel(batch_id: str):
+    store = _store()
+    batch = store.batches.get(batch_id)
+    if not batch:
+        return _not_found('batch', batch_id)
+    store.advance_batch(batch)
+    return jsonify(FakeStore.public(store.cancel_batch(batch)))
+
+
+def create_fake_app(settings: Optional[FaultSettings] = None) -> Flask:
+    """Flask App des Stand-in Servers (eigene App, unabhängig von der Orquestrix DB)."""
+    settings = settings or FaultSettings()
+    app = Flask(__name__)
+    app.json.sort_keys = False
+    app.extensions['fake_openai'] = FakeStore(settings)
+    app.extensions['fake_openai_limiter'] = RateLimiter(settings.rpm)
+    app.register_blueprint(bp)
+    return app
@@ -0,0 +1,472 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from .faults import FaultSettings
+
+
+_WORDS = (
+    'Dynamics', 'Finance', 'Supply', 'Chain', 'Buchung', 'Sachkonto', 'Debitor', 'Kreditor', 'Lager',
+    'Produktion', 'Stückliste', 'Arbeitsplan', 'Datenentität', 'Konfiguration', 'Parameter', 'Workflow',
+    'Periode', 'Dimension', 'Journal', 'Bestellung', 'Auftrag', 'Lieferung', 'Rechnung', 'Zahlung',
+)
+_RUN_ACTIVE = ('queued', 'in_progress')
+_BATCH_ACTIVE = ('validating', 'in_progress', 'finalizing', 'cancelling')
+
+
+def new_id(prefix: str) -> str:
+    sep = '-' if prefix == 'file' else '_'
+    return f'{prefix}{sep}{uuid.uuid4().hex[:24]}'
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, int(len(text.split()) * 4 / 3)) if text else 0
+
+
+def paginate(items: List[Dict[str, Any]], limit: Optional[int], after: Optional[str] = None,
+             before: Optional[str] = None, order: str = 'desc') -> Dict[str, Any]:
+    """Cursor-Liste wie die API (``after``/``before`` = Objekt-ID, Default neueste zuerst)."""
+    ordered = list(reversed(items)) if order == 'desc' else list(items)
+    ids = [o['id'] for o in ordered]
+    start = ids.index(after) + 1 if after in ids else 0
+    end = ids.index(before) if before in ids else len(ordered)
+    limit = max(1, min(int(limit or 20), 10000))
+    window = ordered[start:end]
+    data = window[:limit]
+    return {
+        'object': 'list',
+        'data': data,
+        'first_id': data[0]['id'] if data else None,
+        'last_id': data[-1]['id'] if data else None,
+        'has_more': len(window) > limit,
+    }
+
+
+class FakeStore:
+    """In-Memory Zustand des Stand-in Servers (threadsicher über ein Lock)."""
+
+    def __init__(self, settings: FaultSettings):
+        self.settings = settings
+        self.rng = random.Random(settings.seed)
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.files: Dict[str, Dict[str, Any]] = {}
+            self.file_content: Dict[str, bytes] = {}
+            self.uploads: Dict[str, Dict[str, Any]] = {}
+            self.upload_parts: Dict[str, bytes] = {}
+            self.vector_stores: Dict[str, Dict[str, Any]] = {}
+            self.vector_store_files: Dict[str, Dict[str, Dict[str, Any]]] = {}
+            self.assistants: Dict[str, Dict[str, Any]] = {}
+            self.threads: Dict[str, Dict[str, Any]] = {}
+            self.messages: Dict[str, List[Dict[str, Any]]] = {}
+            self.runs: Dict[str, Dict[str, Any]] = {}
+            self.steps: Dict[str, List[Dict[str, Any]]] = {}
+            self.responses: Dict[str, Dict[str, Any]] = {}
+            self.batches: Dict[str, Dict[str, Any]] = {}
+            self.context_tokens: Dict[str, int] = {}   # Response ID -> Tokens des Verlaufs bis einschließlich Antwort
+            self.prompt_prefixes: set = set()          # Hashes bereits gesehener Prompt-Präfixe (Prompt Caching)
+            self.counters: Dict[str, int] = {}
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    # ---------------------- Text ----------------------
+    def reply_text(self, prompt: str) -> str:
+        words = [self.rng.choice(_WORDS) for _ in range(max(0, self.settings.reply_words - 4))]
+        head = ' '.join((prompt or '').split()[:12])
+        return f'Fake Antwort auf: {head}\n\n' + ' '.join(words) + '.'
+
+    # ---------------------- Files ----------------------
+    def add_file(self, filename: str, content: bytes, purpose: str) -> Dict[str, Any]:
+        obj = {
+            'id': new_id('file'),
+            'object': 'file',
+            'bytes': len(content),
+            'created_at': int(time.time()),
+            'filename': filename,
+            'purpose': purpose,
+            'status': 'processed',
+            'status_details': None,
+        }
+        with self.lock:
+            self.files[obj['id']] = obj
+            self.file_content[obj['id']] = content
+        return obj
+
+    def files_of(self, purpose: Optional[str]) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [f for f in self.files.values() if not purpose or f['purpose'] == purpose]
+
+    # ---------------------- Vector Stores ----------------------
+    def add_vector_store(self, name: Optional[str]) -> Dict[str, Any]:
+        now = int(time.time())
+        obj = {
+            'id': new_id('vs'),
+            'object': 'vector_store',
+            'created_at': now,
+            'last_active_at': now,
+            'name': name or '',
+            'status': 'completed',
+            'usage_bytes': 0,
+            'file_counts': {'in_progress': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'total': 0},
+            'metadata': {},
+            'expires_after': None,
+            'expires_at': None,
+        }
+        with self.lock:
+            self.vector_stores[obj['id']] = obj
+            self.vector_store_files[obj['id']] = {}
+        return obj
+
+    def attach_file(self, vector_store_id: str, file_id: str) -> Dict[str, Any]:
+        with self.lock:
+            size = self.files.get(file_id, {}).get('bytes', 0)
+            obj = {
+                'id': file_id,
+                'object': 'vector_store.file',
+                'created_at': int(time.time()),
+                'vector_store_id': vector_store_id,
+                'status': 'completed',
+                'usage_bytes': size,
+                'last_error': None,
+            }
+            self.vector_store_files[vector_store_id][file_id] = obj
+            self._refresh_counts(vector_store_id)
+        return obj
+
+    def _refresh_counts(self, vector_store_id: str) -> None:
+        files = self.vector_store_files[vector_store_id]
+        vs = self.vector_stores[vector_store_id]
+        vs['file_counts'] = {'in_progress': 0, 'completed': len(files), 'failed': 0, 'cancelled': 0, 'total': len(files)}
+        vs['usage_bytes'] = sum(f['usage_bytes'] for f in files.values())
+
+    # ---------------------- Assistants / Threads ----------------------
+    def add_message(self, thread_id: str, role: str, content: Any, run_id: Optional[str] = None,
+                    assistant_id: Optional[str] = None, attachments: Optional[list] = None) -> Dict[str, Any]:
+        if isinstance(content, str):
+            blocks = [{'type': 'text', 'text': {'value': content, 'annotations': []}}]
+        else:
+            # Request-Format ({'type': 'text', 'text': str}) in Objekt-Format überführen
+            blocks = [
+                {'type': 'text', 'text': {'value': b['text'], 'annotations': []}}
+                if b.get('type') == 'text' and isinstance(b.get('text'), str) else b
+                for b in (content or [])
+            ]
+        obj = {
+            'id': new_id('msg'),
+            'object': 'thread.message',
+            'created_at': int(time.time()),
+            'thread_id': thread_id,
+            'role': role,
+            'content': blocks,
+            'assistant_id': assistant_id,
+            'run_id': run_id,
+            'attachments': attachments or [],
+            'metadata': {},
+            'status': 'completed',
+        }
+        with self.lock:
+            self.messages.setdefault(thread_id, []).append(obj)
+        return obj
+
+    def create_run(self, thread_id: str, assistant_id: str, model: Optional[str], instructions: Optional[str]) -> Dict[str, Any]:
+        now = time.time()
+        queue = self.settings.run_queue.sample(self.rng)
+        duration = self.settings.run_time.sample(self.rng)
+        assistant = self.assistants.get(assistant_id, {})
+        run = {
+            'id': new_id('run'),
+            'object': 'thread.run',
+            'created_at': int(now),
+            'thread_id': thread_id,
+            'assistant_id': assistant_id,
+            'status': 'queued',
+            'model': model or assistant.get('model') or 'gpt-4.1',
+            'instructions': instructions or assistant.get('instructions') or '',
+            'tools': assistant.get('tools', []),
+            'started_at': None,
+            'completed_at': None,
+            'failed_at': None,
+            'cancelled_at': None,
+            'expires_at': int(now) + 600,
+            'last_error': None,
+            'usage': None,
+            'metadata': {},
+            'parallel_tool_calls': True,
+            # intern: Zeitpunkte der Statuswechsel
+            '_started': now + queue,
+            '_finished': now + queue + duration,
+        }
+        with self.lock:
+            self.runs[run['id']] = run
+            self.steps[run['id']] = []
+        return run
+
+    def advance_run(self, run: Dict[str, Any]) -> Dict[str, Any]:
+        """Status eines Runs anhand der vergangenen Zeit fortschreiben (lazy, ohne Hintergrund-Thread)."""
+        with self.lock:
+            if run['status'] not in _RUN_ACTIVE:
+                return run
+            now = time.time()
+            if now >= run['_started'] and run['status'] == 'queued':
+                run['status'] = 'in_progress'
+                run['started_at'] = int(run['_started'])
+            if now >= run['_finished']:
+                self._finish_run(run)
+            return run
+
+    def _finish_run(self, run: Dict[str, Any]) -> None:
+        run['started_at'] = run['started_at'] or int(run['_started'])
+        if self.rng.random() < self.settings.run_fail_rate:
+            run['status'] = 'failed'
+            run['failed_at'] = int(run['_finished'])
+            run['last_error'] = {'code': 'server_error', 'message': 'Simulierter Run Fehler (fake)'}
+            return
+        thread_msgs = self.messages.get(run['thread_id'], [])
+        prompt = next((self._message_text(m) for m in reversed(thread_msgs) if m['role'] == 'user'), '')
+        text = self.reply_text(prompt)
+        content: List[Dict[str, Any]] = [{'type': 'text', 'text': {'value': text, 'annotations': []}}]
+        attachments = []
+        if self.rng.random() < self.settings.output_file_rate:
+            out = self.add_file('output.csv', b'col_a,col_b\n1,2\n', 'assistants_output')
+            content[0]['text']['annotations'].append({
+                'type': 'file_path', 'text': 'sandbox:/mnt/data/output.csv', 'start_index': 0, 'end_index': 0,
+                'file_path': {'file_id': out['id']},
+            })
+            attachments.append({'file_id': out['id'], 'tools': [{'type': 'code_interpreter'}]})
+        msg = self.add_message(run['thread_id'], 'assistant', content, run_id=run['id'],
+                               assistant_id=run['assistant_id'], attachments=attachments)
+        self.steps[run['id']].append({
+            'id': new_id('step'),
+            'object': 'thread.run.step',
+            'created_at': int(run['_started']),
+            'completed_at': int(run['_finished']),
+            'run_id': run['id'],
+            'thread_id': run['thread_id'],
+            'assistant_id': run['assistant_id'],
+            'type': 'message_creation',
+            'status': 'completed',
+            'step_details': {'type': 'message_creation', 'message_creation': {'message_id': msg['id']}},
+            'last_error': None,
+            'usage': None,
+        })
+        prompt_tokens = estimate_tokens(run['instructions']) + sum(estimate_tokens(self._message_text(m)) for m in thread_msgs)
+        completion_tokens = estimate_tokens(text)
+        run['usage'] = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens}
+        run['status'] = 'completed'
+        run['completed_at'] = int(run['_finished'])
+
+    @staticmethod
+    def _message_text(message: Dict[str, Any]) -> str:
+        return ' '.join(
+            (b.get('text') or {}).get('value', '') for b in message.get('content', []) if b.get('type') == 'text'
+        )
+
+    # ---------------------- Responses ----------------------
+    @staticmethod
+    def _input_text(content: Any) -> str:
+        # content als String oder Liste von Parts ({'type': 'input_text', 'text': ...})
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return ' '.join(p.get('text', '') for p in content if isinstance(p, dict) and isinstance(p.get('text'), str))
+        return ''
+
+    def build_response(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        items = payload.get('input') or []
+        if isinstance(items, str):
+            items = [{'role': 'user', 'content': items}]
+        items = [i for i in items if isinstance(i, dict)]
+        texts = [self._input_text(i.get('content')) for i in items]
+        prompt = next((t for i, t in zip(reversed(items), reversed(texts)) if i.get('role', 'user') == 'user'), '')
+        text = self.reply_text(prompt)
+        input_tokens = estimate_tokens(payload.get('instructions') or '') + sum(estimate_tokens(t) for t in texts)
+        history_tokens = self.context_tokens.get(payload.get('previous_response_id') or '', 0)
+        # Serverseitiger Verlauf wird wie bei OpenAI als Input mitberechnet (ohne alte Instructions)
+        input_tokens += history_tokens
+        cached_tokens = self._cached_prefix_tokens(payload, items, texts, history_tokens)
+        output_tokens = estimate_tokens(text)
+        max_tokens = payload.get('max_output_tokens')
+        status = 'completed'
+        if max_tokens and output_tokens > max_tokens:
+            status = 'incomplete'
+        obj = {
+            'id': new_id('resp'),
+            'object': 'response',
+            'created_at': int(time.time()),
+            'status': status,
+            'model': payload.get('model') or 'gpt-4.1',
+            'instructions': payload.get('instructions'),
+            'max_output_tokens': max_tokens,
+            'parallel_tool_calls': bool(payload.get('parallel_tool_calls', True)),
+            'tool_choice': payload.get('tool_choice', 'auto'),
+            'tools': payload.get('tools') or [],
+            'previous_response_id': payload.get('previous_response_id'),
+            'error': None,
+            'incomplete_details': {'reason': 'max_output_tokens'} if status == 'incomplete' else None,
+            'output': [{
+                'id': new_id('msg'),
+                'type': 'message',
+                'role': 'assistant',
+                'status': 'completed',
+                'content': [{'type': 'output_text', 'text': text, 'annotations': []}],
+            }],
+            'usage': {
+                'input_tokens': input_tokens,
+                'input_tokens_details': {'cached_tokens': cached_tokens},
+                'output_tokens': output_tokens,
+                'output_tokens_details': {'reasoning_tokens': 0},
+                'total_tokens': input_tokens + output_tokens,
+            },
+            'metadata': payload.get('metadata') or {},
+            'temperature': payload.get('temperature'),
+            'top_p': payload.get('top_p'),
+            'truncation': 'disabled',
+            'text': {'format': {'type': 'text'}},
+        }
+        with self.lock:
+            self.responses[obj['id']] = obj
+            self.context_tokens[obj['id']] = history_tokens + sum(estimate_tokens(t) for t in texts) + output_tokens
+        return obj
+
+    def _cached_prefix_tokens(self, payload: Dict[str, Any], items: List[Dict[str, Any]], texts: List[str],
+                              history_tokens: int) -> int:
+        """Prompt Caching wie bei OpenAI: längster bereits gesehener Präfix, ab 1024 Tokens in 128er Schritten.
+
+        Präfix-Segmente: Modell + Instructions + Tools, serverseitiger Verlauf, dann je Input Item.
+        """
+        segments = [
+            (json.dumps([payload.get('model'), payload.get('instructions') or '', payload.get('tools') or []],
+                        sort_keys=True), estimate_tokens(payload.get('instructions') or '')),
+            (payload.get('previous_response_id') or '', history_tokens),
+        ]
+        segments += [(json.dumps([i.get('role', 'user'), t]), estimate_tokens(t)) for i, t in zip(items, texts)]
+        digest = hashlib.sha256()
+        tokens = cached = 0
+        with self.lock:
+            for material, seg_tokens in segments:
+                digest.update(material.encode('utf-8') + b'\x1e')  # Trenner: leere Segmente ändern den Hash
+                key = digest.hexdigest()
+                tokens += seg_tokens
+                if key in self.prompt_prefixes:
+                    cached = tokens
+                else:
+                    self.prompt_prefixes.add(key)
+        return cached // 128 * 128 if cached >= 1024 else 0
+
+    # ---------------------- Batches ----------------------
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str,
+                     metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        now = time.time()
+        queue = self.settings.run_queue.sample(self.rng)
+        duration = self.settings.run_time.sample(self.rng)
+        lines = [ln for ln in self.file_content.get(input_file_id, b'').decode('utf-8').splitlines() if ln.strip()]
+        batch = {
+            'id': new_id('batch'),
+            'object': 'batch',
+            'endpoint': endpoint,
+            'errors': None,
+            'input_file_id': input_file_id,
+            'completion_window': completion_window,
+            'status': 'validating',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': int(now),
+            'in_progress_at': None,
+            'expires_at': int(now) + 86400,
+            'finalizing_at': None,
+            'completed_at': None,
+            'failed_at': None,
+            'expired_at': None,
+            'cancelling_at': None,
+            'cancelled_at': None,
+            'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0},
+            'metadata': metadata or {},
+            '_started': now + queue,
+            '_finished': now + queue + duration,
+        }
+        with self.lock:
+            self.batches[batch['id']] = batch
+        return batch
+
+    def advance_batch(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Batch Status lazy fortschreiben (wie ``advance_run``); Abschluss erzeugt Output/Error Files."""
+        with self.lock:
+            if batch['status'] not in _BATCH_ACTIVE:
+                return batch
+            now = time.time()
+            if batch['status'] == 'cancelling':
+                self._finish_batch(batch, cancelled=True)
+                return batch
+            if now >= batch['_started'] and batch['status'] == 'validating':
+                batch['status'] = 'in_progress'
+                batch['in_progress_at'] = int(batch['_started'])
+            if now >= batch['_finished']:
+                self._finish_batch(batch)
+            return batch
+
+    def cancel_batch(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            if batch['status'] in _BATCH_ACTIVE:
+                batch['status'] = 'cancelling'
+                batch['cancelling_at'] = int(time.time())
+            return batch
+
+    def _finish_batch(self, batch: Dict[str, Any], cancelled: bool = False) -> None:
+        raw = self.file_content.get(batch['input_file_id'], b'').decode('utf-8')
+        out_lines: List[str] = []
+        err_lines: List[str] = []
+        for line in raw.splitlines():
+            if not line.strip():
+                continue
+            req = json.loads(line)
+            entry: Dict[str, Any] = {'id': new_id('batch_req'), 'custom_id': req.get('custom_id'),
+                                     'response': None, 'error': None}
+            if cancelled:
+                entry['error'] = {'code': 'batch_cancelled', 'message': 'Batch abgebrochen'}
+                err_lines.append(json.dumps(entry))
+            elif req.get('url') != batch['endpoint']:
+                entry['error'] = {'code': 'invalid_url', 'message': f"URL {req.get('url')} passt nicht zu {batch['endpoint']}"}
+                err_lines.append(json.dumps(entry))
+            elif self.rng.random() < self.settings.run_fail_rate:
+                entry['response'] = {'status_code': 500, 'request_id': new_id('req'),
+                                     'body': {'error': {'message': 'Simulierter Fehler (fake)', 'type': 'server_error'}}}
+                err_lines.append(json.dumps(entry))
+            else:
+                body = self.build_response(req.get('body') or {})
+                entry['response'] = {'status_code': 200, 'request_id': new_id('req'), 'body': body}
+                out_lines.append(json.dumps(entry))
+        if out_lines:
+            batch['output_file_id'] = self.add_file(f"{batch['id']}_output.jsonl",
+                                                    ('\n'.join(out_lines) + '\n').encode('utf-8'), 'batch_output')['id']
+        if err_lines:
+            batch['error_file_id'] = self.add_file(f"{batch['id']}_error.jsonl",
+                                                   ('\n'.join(err_lines) + '\n').encode('utf-8'), 'batch_output')['id']
+        batch['request_counts']['completed'] = len(out_lines)
+        batch['request_counts']['failed'] = len(err_lines)
+        ts = int(time.time()) if cancelled else int(batch['_finished'])
+        batch['in_progress_at'] = batch['in_progress_at'] or int(batch['_started'])
+        if cancelled:
+            batch['status'] = 'cancelled'
+            batch['cancelled_at'] = ts
+        else:
+            batch['finalizing_at'] = ts
+            batch['status'] = 'completed'
+            batch['completed_at'] = ts
+
+    @staticmethod
+    def public(obj: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in obj.items() if not k.startswith('_')}
+
+    @staticmethod
+    def public_list(objs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [FakeStore.public(o) for o in objs]
@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, jsonify, current_app
-from ..services.openai_client import get_openai_client
+from ..services.openai_client import get_openai_client, openai_pool_stats
+from ..services.poller import poll_totals
+from ..services.resilience import policy as resilience_policy
 from ..models import Chat, Project
 
 bp = Blueprint("main", __name__)
@@ -25,7 +27,26 @@ def openai_health():
             "chat_model_configured": expected_chat,
             "worker_model_configured": expected_worker,
             "models_sample": models[:10],
+            "pool": openai_pool_stats(),
             "ok": True
         })
     except Exception as e:  # noqa: BLE001
         return jsonify({"ok": False, "error": str(e)}), 500
+
+
+@bp.get("/openai/pool")
+def openai_pool():
+    # Auslastung des prozessweiten HTTP Pools (ohne Remote Call)
+    return jsonify(openai_pool_stats())
+
+
+@bp.get("/openai/polling")
+def openai_polling():
+    # Summen je Poll-Typ seit Prozessstart (Anzahl Polls, Wartezeit, max. verschenkte Wartezeit)
+    return jsonify(poll_totals())
+
+
+@bp.get("/openai/circuits")
+def openai_circuits():
+    # Breaker-Zustand, Retries und letzte x-ratelimit-* Header je Endpoint
+    return jsonify({"degraded": resilience_policy.degraded(), "endpoints": resilience_policy.snapshot()})
@@ -133,6 +133,15 @@ class Chat(db.Model, TimestampMixin):
     chat_role_id = db.Column(db.Integer, db.ForeignKey("chat_role.id"), nullable=True)
 
     project_id = db.Column(db.Integer, db.ForeignKey("project.id"), nullable=True)
+    # Rollierende Zusammenfassung älterer Turns (Kontext-Budget)
+    summary = db.Column(db.Text, nullable=True)
+    summary_message_id = db.Column(db.Integer, nullable=True)  # letzte zusammengefasste Message
+    summary_token_count = db.Column(db.Integer, nullable=True)
+    context_start_message_id = db.Column(db.Integer, nullable=True)  # erste Message der serverseitigen Kette
+    # JSON Cache der aufgelösten Ressourcen {"vector_store_ids": [...], "file_ids": [...]}; NULL = neu berechnen
+    resource_ids_cache = db.Column(db.Text, nullable=True)
+    # Start der laufenden SSE Antwort (Reload / zweiter Tab startet keinen zweiten Model Call)
+    reply_started_at = db.Column(db.DateTime, nullable=True)
 
     user = db.relationship("User", back_populates="chats")
     messages = db.relationship("Message", back_populates="chat", cascade="all, delete-orphan", lazy="dynamic")
@@ -153,6 +162,10 @@ class ChatRole(db.Model, TimestampMixin):
     model = db.Column(db.String(100), nullable=False, default="gpt-4.5")
     active = db.Column(db.Boolean, default=True)
     temperature = db.Column(db.Float, nullable=False, default=0.7)
+    # Antwort-Cache (opt-in): identische Requests liefern die gespeicherte Antwort
+    cache_enabled = db.Column(db.Boolean, nullable=False, default=False)
+    cache_ttl_sec = db.Column(db.Integer, nullable=True)  # None = OPENAI_RESPONSE_CACHE_TTL
+    context_budget_tokens = db.Column(db.Integer, nullable=True)  # None = OPENAI_CHAT_CONTEXT_BUDGET
 
     chats = db.relationship("Chat", backref="chat_role", lazy="dynamic")
 
@@ -161,13 +174,25 @@ class ChatRole(db.Model, TimestampMixin):
 
 
 class Message(db.Model, TimestampMixin):
+    # Keyset Pagination je Chat auf (created_at, id)
+    __table_args__ = (db.Index('ix_message_chat_created_id', 'chat_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     chat_id = db.Column(db.Integer, db.ForeignKey("chat.id"), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # user / assistant / system
     content = db.Column(db.Text, nullable=False)
     openai_response_id = db.Column(db.String(100), nullable=True)
+    token_count = db.Column(db.Integer, nullable=True)  # geschätzt beim Einfügen
+    # Nur Assistant Antworten: Usage der Response und zitierte Quellen (JSON Liste)
+    input_tokens = db.Column(db.Integer, nullable=True)
+    output_tokens = db.Column(db.Integer, nullable=True)
+    cached_tokens = db.Column(db.Integer, nullable=True)
+    citations = db.Column(db.Text, nullable=True)
+    # Fan-out: Frage und Antworten mehrerer Rollen teilen eine Gruppe; chat_role_id = antwortende Rolle
+    fanout_group = db.Column(db.String(32), nullable=True, index=True)
+    chat_role_id = db.Column(db.Integer, db.ForeignKey("chat_role.id", ondelete="SET NULL"), nullable=True)
 
     chat = db.relationship("Chat", back_populates="messages")
+    chat_role = db.relationship("ChatRole")
 
     def __repr__(self):
         return f"<Message {self.role} {self.id}>"
@@ -195,6 +220,8 @@ class Worker(db.Model, TimestampMixin):
 
 class WorkerLog(db.Model, TimestampMixin):
     __tablename__ = 'worker_log'
+    # Je Pipeline-Run höchstens ein Log pro Stufe (parallele advance Jobs)
+    __table_args__ = (db.UniqueConstraint('project_run_id', 'pipeline_stage_id', name='uq_worker_log_run_stage'),)
     id = db.Column(db.Integer, primary_key=True)
     worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False)
     input_text = db.Column(db.Text, nullable=False)
@@ -202,13 +229,214 @@ class WorkerLog(db.Model, TimestampMixin):
     openai_run_id = db.Column(db.String(100), nullable=True)
     run_status = db.Column(db.String(50), nullable=True)
     output_file_ids = db.Column(db.Text, nullable=True)  # JSON Liste von File IDs
+    # Ausführung als Job: queued / running / done / failed (run_status = Status des OpenAI Runs),
+    # Batch Einträge warten als pending, bis ein Platz frei ist
+    state = db.Column(db.String(20), nullable=False, default='done', server_default='done', index=True)
+    openai_thread_id = db.Column(db.String(100), nullable=True)
+    openai_message_id = db.Column(db.String(100), nullable=True)  # gepostete User Message (kein Duplikat bei Retry)
+    error = db.Column(db.Text, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Teil eines Projekt-Runs ("Alle Worker ausführen" oder Pipeline)
+    project_run_id = db.Column(db.Integer, db.ForeignKey('project_run.id', ondelete='SET NULL'), nullable=True, index=True)
+    # Pipeline: Stufe, zusätzliche Input Files (Outputs der Vorstufen, als Message Attachments) und
+    # Hash aller Eingaben (unveränderte Stufen werden übersprungen)
+    pipeline_stage_id = db.Column(db.Integer, db.ForeignKey('worker_pipeline_stage.id', ondelete='SET NULL'), nullable=True)
+    input_file_ids = db.Column(db.Text, nullable=True)  # JSON Liste OpenAI File IDs
+    input_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Batch: Eintrag eines WorkerBatch (eigener kurzlebiger Thread) mit ID aus der Eingabedatei
+    worker_batch_id = db.Column(db.Integer, db.ForeignKey('worker_batch.id', ondelete='SET NULL'), nullable=True, index=True)
+    batch_key = db.Column(db.String(64), nullable=True)
 
     worker = db.relationship('Worker', backref=db.backref('logs', lazy='dynamic', cascade="all, delete-orphan"))
+    project_run = db.relationship('ProjectRun', back_populates='logs')
+    pipeline_stage = db.relationship('WorkerPipelineStage')
+    worker_batch = db.relationship('WorkerBatch', back_populates='logs')
 
     def __repr__(self):
         return f"<WorkerLog {self.worker_id} {self.id}>"
 
 
+class ProjectRun(db.Model, TimestampMixin):
+    """Prompt (gemeinsam oder je Worker) über alle Worker eines Projekts, parallel als worker_run Jobs."""
+    __tablename__ = 'project_run'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
+    prompt = db.Column(db.Text, nullable=True)  # gemeinsamer Prompt (None = nur Einzel-Prompts)
+    concurrency = db.Column(db.Integer, nullable=False, default=4)  # max. gleichzeitig laufende Worker Runs
+    pipeline_id = db.Column(db.Integer, db.ForeignKey('worker_pipeline.id', ondelete='SET NULL'), nullable=True)
+
+    project = db.relationship('Project', backref=db.backref('runs', lazy='dynamic', cascade='all, delete-orphan'))
+    logs = db.relationship('WorkerLog', back_populates='project_run', order_by='WorkerLog.id')
+    pipeline = db.relationship('WorkerPipeline')
+
+    def __repr__(self):
+        return f"<ProjectRun {self.project_id} {self.id}>"
+
+
+class WorkerBatch(db.Model, TimestampMixin):
+    """Viele Prompts (CSV/JSONL) für einen Worker: je Prompt ein eigener Thread, begrenzt parallel."""
+    __tablename__ = 'worker_batch'
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    concurrency = db.Column(db.Integer, nullable=False, default=4)  # max. gleichzeitig laufende Runs
+
+    worker = db.relationship('Worker', backref=db.backref('batches', lazy='dynamic', cascade='all, delete-orphan'))
+    logs = db.relationship('WorkerLog', back_populates='worker_batch', lazy='dynamic', order_by='WorkerLog.id')
+
+    def __repr__(self):
+        return f"<WorkerBatch {self.worker_id} {self.id}>"
+
+
+pipeline_stage_dependency = db.Table(
+    "pipeline_stage_dependency",
+    db.Column("stage_id", db.Integer, db.ForeignKey("worker_pipeline_stage.id"), primary_key=True),
+    db.Column("upstream_id", db.Integer, db.ForeignKey("worker_pipeline_stage.id"), primary_key=True),
+)
+
+
+class WorkerPipeline(db.Model, TimestampMixin):
+    """DAG aus Worker Stufen eines Projekts: Output Files einer Stufe sind Inputs der nachfolgenden."""
+    __tablename__ = 'worker_pipeline'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+
+    project = db.relationship('Project', backref=db.backref('pipelines', lazy='dynamic', cascade='all, delete-orphan'))
+    stages = db.relationship('WorkerPipelineStage', back_populates='pipeline', cascade='all, delete-orphan',
+                             order_by='WorkerPipelineStage.id')
+
+    def __repr__(self):
+        return f"<WorkerPipeline {self.name}>"
+
+
+class WorkerPipelineStage(db.Model):
+    __tablename__ = 'worker_pipeline_stage'
+    # Ein Worker höchstens einmal je Pipeline (ein Thread je Worker)
+    __table_args__ = (db.UniqueConstraint('pipeline_id', 'worker_id', name='uq_pipeline_stage_worker'),)
+    id = db.Column(db.Integer, primary_key=True)
+    pipeline_id = db.Column(db.Integer, db.ForeignKey('worker_pipeline.id'), nullable=False, index=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), nullable=False)
+    prompt = db.Column(db.Text, nullable=False)
+
+    pipeline = db.relationship('WorkerPipeline', back_populates='stages')
+    worker = db.relationship('Worker', backref=db.backref('pipeline_stages', cascade='all, delete-orphan'))
+    upstream = db.relationship(
+        'WorkerPipelineStage', secondary=pipeline_stage_dependency,
+        primaryjoin=lambda: WorkerPipelineStage.id == pipeline_stage_dependency.c.stage_id,
+        secondaryjoin=lambda: WorkerPipelineStage.id == pipeline_stage_dependency.c.upstream_id,
+        backref='downstream',
+    )
+
+    def __repr__(self):
+        return f"<WorkerPipelineStage {self.pipeline_id} {self.worker_id}>"
+
+
+class OpenAICall(db.Model):
+    """Ledger: ein Eintrag je OpenAI Call (Latenz, Tokens, Kosten, Zuordnung)."""
+    __tablename__ = 'openai_call'
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    endpoint = db.Column(db.String(120), nullable=False, index=True)  # z.B. "POST /responses"
+    model = db.Column(db.String(100), nullable=True, index=True)
+    openai_id = db.Column(db.String(100), nullable=True)
+    status = db.Column(db.String(30), nullable=False)
+    http_status = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    latency_ms = db.Column(db.Integer, nullable=True)
+    # Nur für terminale Assistants Runs: Warteschlange vs. Ausführung
+    queue_ms = db.Column(db.Integer, nullable=True)
+    run_ms = db.Column(db.Integer, nullable=True)
+    input_tokens = db.Column(db.Integer, nullable=True)
+    output_tokens = db.Column(db.Integer, nullable=True)
+    cached_tokens = db.Column(db.Integer, nullable=True)
+    cost_usd = db.Column(db.Float, nullable=True)
+    # Keine FKs: Ledger bleibt nach Löschen von Chat/Worker/Projekt erhalten
+    chat_id = db.Column(db.Integer, nullable=True, index=True)
+    worker_id = db.Column(db.Integer, nullable=True, index=True)
+    project_id = db.Column(db.Integer, nullable=True, index=True)
+    chat_role_id = db.Column(db.Integer, nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<OpenAICall {self.endpoint} {self.id}>"
+
+
+class Job(db.Model, TimestampMixin):
+    """Persistente Hintergrund-Jobs; ausgeführt von ``manage.py run-jobs`` (nicht im Web Prozess)."""
+    __tablename__ = 'job'
+    __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, index=True)  # z.B. "chat_reply"
+    payload = db.Column(db.Text, nullable=True)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(120), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON
+    # Keine FK: Job Historie bleibt nach Löschen des Chats erhalten
+    chat_id = db.Column(db.Integer, nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<Job {self.kind} {self.id} {self.status}>"
+
+
+class ChatBatch(db.Model, TimestampMixin):
+    """Fragebogen über die Batch API: viele Prompts einer Chat Rolle, asynchron verarbeitet."""
+    __tablename__ = 'chat_batch'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    chat_role_id = db.Column(db.Integer, db.ForeignKey('chat_role.id'), nullable=False)
+    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id', ondelete='SET NULL'), nullable=True)  # Ergebnisse als Messages
+    vector_store_ids = db.Column(db.Text, nullable=True)  # JSON Liste OpenAI IDs (bei Einreichung aufgelöst)
+    file_ids = db.Column(db.Text, nullable=True)  # JSON Liste OpenAI IDs
+    # draft / validating / in_progress / finalizing / completed / failed / expired / cancelling / cancelled
+    status = db.Column(db.String(30), nullable=False, default='draft')
+    openai_batch_id = db.Column(db.String(100), nullable=True, unique=True)
+    input_file_id = db.Column(db.String(100), nullable=True)
+    output_file_id = db.Column(db.String(100), nullable=True)
+    error_file_id = db.Column(db.String(100), nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    imported_at = db.Column(db.DateTime, nullable=True)
+
+    chat_role = db.relationship('ChatRole')
+    chat = db.relationship('Chat')
+    items = db.relationship('ChatBatchItem', back_populates='batch', cascade='all, delete-orphan', lazy='dynamic',
+                            order_by='ChatBatchItem.position')
+
+    def __repr__(self):
+        return f"<ChatBatch {self.name} {self.status}>"
+
+
+class ChatBatchItem(db.Model):
+    __tablename__ = 'chat_batch_item'
+    __table_args__ = (db.UniqueConstraint('batch_id', 'custom_id', name='uq_chat_batch_item_custom_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('chat_batch.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    custom_id = db.Column(db.String(64), nullable=False)
+    prompt = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / done / failed
+    error = db.Column(db.Text, nullable=True)
+    openai_response_id = db.Column(db.String(100), nullable=True)
+    input_tokens = db.Column(db.Integer, nullable=True)
+    output_tokens = db.Column(db.Integer, nullable=True)
+    cached_tokens = db.Column(db.Integer, nullable=True)
+
+    batch = db.relationship('ChatBatch', back_populates='items')
+
+    def __repr__(self):
+        return f"<ChatBatchItem {self.batch_id}/{self.custom_id}>"
+
+
 # Association Table für VectorStore <-> File (Einbettungen)
 vector_store_file = db.Table(
     "vector_store_file",
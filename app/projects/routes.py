@@ -1,6 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from ..models import Project, File, WorkerLog, File as OrxFile
+from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash
+from ..models import Project, ProjectRun, File, Worker, WorkerLog, WorkerPipeline, WorkerPipelineStage, File as OrxFile
 from ..extensions import db
+from ..services.chat_service import ChatService
+from ..services.job_service import JobService
+from ..services.pipeline_service import PipelineService, PipelineServiceError
+from ..services.worker_service import WorkerService, WorkerServiceError
 # VectorStore / File Ingestion bewusst NICHT automatisch hier – ausgewählte Projektdateien werden als direkte Files übergeben (nicht in Vector Store ingestiert).
 
 bp = Blueprint("projects", __name__)
@@ -66,6 +70,9 @@ def view(project_id: int):
     if output_ids:
         file_objs = OrxFile.query.filter(OrxFile.openai_file_id.in_(list(output_ids))).all()
         file_map = {f.openai_file_id: f for f in file_objs if f.openai_file_id}
+    # Letzte Projekt-Runs ("Alle Worker ausführen") mit Fortschritt
+    project_runs = [WorkerService.project_run_progress(r)
+                    for r in project.runs.order_by(ProjectRun.id.desc()).limit(3)]
     return render_template(
         "project.html",
         project=project,
@@ -75,9 +82,121 @@ def view(project_id: int):
         q=q,
         only_selected=only_selected,
         file_map=file_map,
+        project_runs=project_runs,
     )
 
 
+@bp.route('/<int:project_id>/run', methods=['POST'])
+def run_workers(project_id: int):
+    """Alle Worker des Projekts parallel ausführen (Jobs, ausgeführt von `manage.py run-jobs`)."""
+    project = Project.query.get_or_404(project_id)
+    prompts = {}
+    for key, value in request.form.items():
+        if key.startswith('prompt_') and key[7:].isdigit():
+            prompts[int(key[7:])] = value
+    try:
+        run, skipped = WorkerService.queue_project_run(
+            project, request.form.get('prompt'), prompts, request.form.get('concurrency', type=int)
+        )
+    except WorkerServiceError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('projects.view', project_id=project.id))
+    for log in run.logs:
+        JobService.enqueue('worker_run', {'log_id': log.id})
+    flash(f'{len(run.logs)} Worker Runs eingereiht (max. {run.concurrency} parallel)', 'info')
+    if skipped:
+        flash('Übersprungen (kein Assistant oder Prompt): ' + ', '.join(skipped), 'info')
+    return redirect(url_for('projects.view', project_id=project.id))
+
+
+# ---------------------- Pipelines ----------------------
+def _pipeline_or_404(project_id: int, pipeline_id: int) -> WorkerPipeline:
+    return WorkerPipeline.query.filter_by(id=pipeline_id, project_id=project_id).first_or_404()
+
+
+@bp.route('/<int:project_id>/pipelines', methods=['POST'])
+def pipeline_create(project_id: int):
+    project = Project.query.get_or_404(project_id)
+    pipeline = PipelineService.create(project, request.form.get('name') or 'Pipeline')
+    return redirect(url_for('projects.pipeline_view', project_id=project.id, pipeline_id=pipeline.id))
+
+
+@bp.route('/<int:project_id>/pipelines/<int:pipeline_id>')
+def pipeline_view(project_id: int, pipeline_id: int):
+    pipeline = _pipeline_or_404(project_id, pipeline_id)
+    try:
+        stages = PipelineService.order(pipeline)
+    except PipelineServiceError as e:
+        flash(str(e), 'danger')
+        stages = list(pipeline.stages)
+    used = {st.worker_id for st in pipeline.stages}
+    workers = [w for w in pipeline.project.workers.order_by(Worker.name.asc()) if w.id not in used]
+    return render_template('project_pipeline.html', project=pipeline.project, pipeline=pipeline, stages=stages,
+                           workers=workers)
+
+
+@bp.route('/<int:project_id>/pipelines/<int:pipeline_id>/stages', methods=['POST'])
+def pipeline_add_stage(project_id: int, pipeline_id: int):
+    pipeline = _pipeline_or_404(project_id, pipeline_id)
+    worker = Worker.query.get_or_404(request.form.get('worker_id', type=int))
+    try:
+        PipelineService.add_stage(pipeline, worker, request.form.get('prompt'),
+                                  [int(x) for x in request.form.getlist('upstream_ids') if x.isdigit()])
+        flash('Stufe hinzugefügt', 'success')
+    except PipelineServiceError as e:
+        flash(str(e), 'danger')
+    return redirect(url_for('projects.pipeline_view', project_id=project_id, pipeline_id=pipeline.id))
+
+
+@bp.route('/<int:project_id>/pipelines/<int:pipeline_id>/stages/<int:stage_id>/upstream', methods=['POST'])
+def pipeline_stage_upstream(project_id: int, pipeline_id: int, stage_id: int):
+    pipeline = _pipeline_or_404(project_id, pipeline_id)
+    stage = WorkerPipelineStage.query.filter_by(id=stage_id, pipeline_id=pipeline.id).first_or_404()
+    try:
+        PipelineService.set_upstream(stage, [int(x) for x in request.form.getlist('upstream_ids') if x.isdigit()])
+        flash('Vorstufen gespeichert', 'success')
+    except PipelineServiceError as e:
+        flash(str(e), 'danger')
+    return redirect(url_for('projects.pipeline_view', project_id=project_id, pipeline_id=pipeline.id))
+
+
+@bp.route('/<int:project_id>/pipelines/<int:pipeline_id>/stages/<int:stage_id>/delete', methods=['POST'])
+def pipeline_stage_delete(project_id: int, pipeline_id: int, stage_id: int):
+    pipeline = _pipeline_or_404(project_id, pipeline_id)
+    stage = WorkerPipelineStage.query.filter_by(id=stage_id, pipeline_id=pipeline.id).first_or_404()
+    PipelineService.delete_stage(stage)
+    flash('Stufe entfernt', 'info')
+    return redirect(url_for('projects.pipeline_view', project_id=project_id, pipeline_id=pipeline.id))
+
+
+@bp.route('/<int:project_id>/pipelines/<int:pipeline_id>/run', methods=['POST'])
+def pipeline_run(project_id: int, pipeline_id: int):
+    pipeline = _pipeline_or_404(project_id, pipeline_id)
+    try:
+        run = PipelineService.start(pipeline, request.form.get('concurrency', type=int))
+    except PipelineServiceError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('projects.pipeline_view', project_id=project_id, pipeline_id=pipeline.id))
+    JobService.enqueue('pipeline_advance', {'project_run_id': run.id})
+    flash(f'Pipeline {pipeline.name} gestartet (max. {run.concurrency} parallel)', 'info')
+    return redirect(url_for('projects.view', project_id=project_id))
+
+
+@bp.route('/<int:project_id>/pipelines/<int:pipeline_id>/delete', methods=['POST'])
+def pipeline_delete(project_id: int, pipeline_id: int):
+    pipeline = _pipeline_or_404(project_id, pipeline_id)
+    db.session.delete(pipeline)
+    db.session.commit()
+    flash('Pipeline gelöscht', 'info')
+    return redirect(url_for('projects.view', project_id=project_id))
+
+
+@bp.route('/<int:project_id>/runs/<int:run_id>/status')
+def run_status(project_id: int, run_id: int):
+    run = ProjectRun.query.filter_by(id=run_id, project_id=project_id).first_or_404()
+    return jsonify(WorkerService.project_run_progress(run))
+
+
 @bp.route('/<int:project_id>/files', methods=['POST'])
 def update_files(project_id: int):
     project = Project.query.get_or_404(project_id)
@@ -95,6 +214,7 @@ def update_files(project_id: int):
             new_files.append(f)
     # Setzen (altes Clear via Zuweisung)
     project.files = new_files
+    ChatService.invalidate_resources(project_id=project.id)
     db.session.commit()
 
     flash('Projekt-Dateien aktualisiert', 'success')
@@ -104,6 +224,7 @@ def update_files(project_id: int):
 @bp.route("/<int:project_id>/delete", methods=["POST"])
 def delete(project_id: int):
     project = Project.query.get_or_404(project_id)
+    ChatService.invalidate_resources(project_id=project.id)
     db.session.delete(project)
     db.session.commit()
     flash("Projekt gelöscht", "info")
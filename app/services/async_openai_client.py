@@ -0,0 +1,254 @@
+from __future__ import annotations
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+from flask import current_app
+from openai import AsyncOpenAI
+import asyncio
+import atexit
+import httpx
+import logging
+import os
+import threading
+from .poller import AdaptivePoller, status_attr
+from .resilience import AsyncResilientTransport
+from .call_ledger import bind, ledger
+from .openai_client import VECTOR_STORE_FILE_FIELDS, client_credentials, compact_item
+
+
+T = TypeVar('T')
+
+
+def _to_dict(obj: Any) -> Dict[str, Any]:
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    return obj if isinstance(obj, dict) else {}
+
+
+class AsyncOpenAIClientWrapper:
+    """Asyncio Gegenstück zu OpenAIClientWrapper für Fan-out Aufrufe (Sync, Run-Auswertung).
+
+    Läuft ausschließlich im Event Loop des _LoopRunner; Konfiguration wird beim Erzeugen
+    aus der App übernommen, da im Loop Thread kein App Context existiert.
+    """
+
+    def __init__(self, api_key: str, timeout: float, limits: httpx.Limits, concurrency: int, logger: logging.Logger,
+                 poll_config: Dict[str, Any], base_url: Optional[str] = None):
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY fehlt (nicht in .env gesetzt)")
+        transport = AsyncResilientTransport(httpx.AsyncHTTPTransport(limits=limits), observer=ledger.observe)
+        self._http_client = httpx.AsyncClient(timeout=timeout, transport=transport)
+        self._client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, http_client=self._http_client,
+                                   max_retries=0)
+        self.concurrency = max(1, concurrency)
+        self.logger = logger
+        self.poll_config = poll_config
+
+    @property
+    def raw(self) -> AsyncOpenAI:
+        return self._client
+
+    async def close(self) -> None:
+        try:
+            await self._client.close()
+        except Exception:  # noqa: BLE001
+            pass
+
+    async def gather_bounded(self, factories: Iterable[Callable[[], Awaitable[T]]], limit: Optional[int] = None) -> List[Any]:
+        """Führt Coroutine-Factories mit begrenzter Parallelität aus (Exceptions als Ergebnis)."""
+        sem = asyncio.Semaphore(limit or self.concurrency)
+
+        async def _one(factory: Callable[[], Awaitable[T]]):
+            async with sem:
+                return await factory()
+
+        return await asyncio.gather(*(_one(f) for f in factories), return_exceptions=True)
+
+    # ---------------------- Vector Stores ----------------------
+    async def list_vector_stores(self, limit: int = 100) -> List[Dict[str, Any]]:
+        self.logger.info("[OpenAI async] vector_stores.list limit=%s", limit)
+        res = await self._client.vector_stores.list(limit=limit)
+        return [_to_dict(item) for item in getattr(res, 'data', [])]
+
+    async def list_vector_store_files(self, vector_store_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        self.logger.info("[OpenAI async] vector_stores.files.list vs=%s", vector_store_id)
+        res = await self._client.vector_stores.files.list(vector_store_id=vector_store_id, limit=limit)
+        return [_to_dict(item) for item in getattr(res, 'data', [])]
+
+    async def iter_vector_store_files(self, vector_store_id: str, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """Alle Files eines Vector Stores seitenweise (Cursor ``after``) als kompakte dicts."""
+        after: Optional[str] = None
+        pages = 0
+        while True:
+            kwargs: Dict[str, Any] = dict(vector_store_id=vector_store_id, limit=min(page_size, 100))
+            if after:
+                kwargs['after'] = after
+            page = await self._client.vector_stores.files.list(**kwargs)
+            data = getattr(page, 'data', None) or []
+            pages += 1
+            for item in data:
+                yield compact_item(item, VECTOR_STORE_FILE_FIELDS)
+            last_id = getattr(data[-1], 'id', None) if data else None
+            if not data or not getattr(page, 'has_more', False) or not last_id or last_id == after:
+                break
+            after = last_id
+        self.logger.info("[OpenAI async] vector_stores.files.list vs=%s pages=%s", vector_store_id, pages)
+
+    async def vector_store_file_ids(self, vector_store_id: str, page_size: int = 100) -> Set[str]:
+        return {item['id'] async for item in self.iter_vector_store_files(vector_store_id, page_size) if item.get('id')}
+
+    async def vector_store_file_ids_many(self, vector_store_ids: List[str], page_size: int = 100) -> Dict[str, Any]:
+        """vector_store_id -> Set der File IDs (alle Seiten) oder Exception; Stores parallel, Seiten je Store sequentiell."""
+        results = await self.gather_bounded(
+            [lambda vid=vid: self.vector_store_file_ids(vid, page_size=page_size) for vid in vector_store_ids]
+        )
+        return dict(zip(vector_store_ids, results))
+
+    # ---------------------- Files ----------------------
+    async def retrieve_file(self, file_id: str) -> Dict[str, Any]:
+        self.logger.info("[OpenAI async] files.retrieve id=%s", file_id)
+        return _to_dict(await self._client.files.retrieve(file_id))
+
+    async def retrieve_files(self, file_ids: List[str]) -> Dict[str, Any]:
+        """file_id -> Metadaten dict oder Exception (parallel abgerufen)."""
+        results = await self.gather_bounded([lambda fid=fid: self.retrieve_file(fid) for fid in file_ids])
+        return dict(zip(file_ids, results))
+
+    # ---------------------- Runs (Assistants) ----------------------
+    async def create_run(self, thread_id: str, assistant_id: str, model: Optional[str] = None) -> Any:
+        self.logger.info("[OpenAI async] threads.runs.create thread=%s assistant=%s", thread_id, assistant_id)
+        kwargs: Dict[str, Any] = dict(thread_id=thread_id, assistant_id=assistant_id)
+        if model:
+            kwargs['model'] = model
+        return await self._client.beta.threads.runs.create(**kwargs)
+
+    async def wait_for_run(self, thread_id: str, run_id: str, initial: Any = None, timeout: Optional[float] = None) -> Any:
+        cfg = dict(self.poll_config)
+        if timeout is not None:
+            cfg['timeout'] = timeout
+        poller = AdaptivePoller(label='runs.retrieve', **cfg)
+        return await poller.arun(
+            lambda: self._client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id),
+            status_attr,
+            initial=initial,
+        )
+
+    async def run_output_lists(self, thread_id: str, run_id: str, limit: int = 100) -> List[Any]:
+        """[Messages, Steps] eines Runs parallel (nur dieser Run, je Liste dicts oder Exception)."""
+        self.logger.info("[OpenAI async] messages.list + steps.list thread=%s run=%s", thread_id, run_id)
+
+        async def _messages() -> List[Dict[str, Any]]:
+            res = await self._client.beta.threads.messages.list(thread_id=thread_id, run_id=run_id, order='asc', limit=limit)
+            return [_to_dict(m) for m in getattr(res, 'data', [])]
+
+        async def _steps() -> List[Dict[str, Any]]:
+            res = await self._client.beta.threads.runs.steps.list(thread_id=thread_id, run_id=run_id, limit=limit)
+            return [_to_dict(st) for st in getattr(res, 'data', [])]
+
+        return await self.gather_bounded([_messages, _steps], limit=2)
+
+    async def run_and_wait(self, thread_id: str, assistant_id: str, prompt: Optional[str] = None,
+                           model: Optional[str] = None) -> Any:
+        """Optional User-Message posten, Run starten und bis terminalem Status warten."""
+        if prompt:
+            await self._client.beta.threads.messages.create(thread_id=thread_id, role='user', content=prompt)
+        run = await self.create_run(thread_id, assistant_id, model=model)
+        return await self.wait_for_run(thread_id, run.id, initial=run)
+
+
+class _LoopRunner:
+    """Ein Event Loop in einem Daemon-Thread pro Prozess; sync Flask Routen reichen Coroutines ein."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._client: Optional[AsyncOpenAIClientWrapper] = None
+        self._client_key: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid() or not (self._thread and self._thread.is_alive()):
+                # Nach fork gehört der Thread dem Elternprozess -> neuen Loop aufbauen
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='orquestrix-async', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+                self._client = None
+                self._client_key = None
+            return self._loop
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop())  # type: ignore[arg-type]
+        try:
+            return fut.result(timeout)
+        except BaseException:
+            fut.cancel()
+            raise
+
+    def client(self, api_key: str, factory: Callable[[], AsyncOpenAIClientWrapper]) -> AsyncOpenAIClientWrapper:
+        self.loop()
+        with self._lock:
+            if self._client is None or self._client_key != api_key:
+                self._client = factory()
+                self._client_key = api_key
+            return self._client
+
+    def shutdown(self) -> None:
+        with self._lock:
+            loop, client, pid = self._loop, self._client, self._pid
+            self._loop = self._client = self._thread = None
+            self._client_key = None
+        if loop is None or pid != os.getpid():
+            return
+        if client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), loop).result(5)
+            except Exception:  # noqa: BLE001
+                pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+_runner = _LoopRunner()
+
+
+def get_async_openai_client() -> AsyncOpenAIClientWrapper:
+    cfg = current_app.config
+    api_key, base_url = client_credentials(cfg)
+
+    def _factory() -> AsyncOpenAIClientWrapper:
+        limits = httpx.Limits(
+            max_connections=cfg.get('OPENAI_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=cfg.get('OPENAI_KEEPALIVE', 10),
+            keepalive_expiry=cfg.get('OPENAI_KEEPALIVE_EXPIRY', 30.0),
+        )
+        return AsyncOpenAIClientWrapper(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=cfg.get('OPENAI_REQUEST_TIMEOUT', 60),
+            limits=limits,
+            concurrency=cfg.get('OPENAI_ASYNC_CONCURRENCY', 8),
+            logger=current_app.logger,
+            poll_config=dict(
+                floor=cfg.get('OPENAI_POLL_FLOOR', 0.25),
+                ceiling=cfg.get('OPENAI_POLL_CEILING', 5.0),
+                factor=cfg.get('OPENAI_POLL_BACKOFF', 1.6),
+                jitter=cfg.get('OPENAI_POLL_JITTER', 0.2),
+                timeout=cfg.get('OPENAI_POLL_TIMEOUT', 120),
+            ),
+        )
+
+    return _runner.client(f'{api_key}@{base_url or ""}', _factory)
+
+
+def run_async(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Coroutine aus sync Code (Flask Route / Service) im prozessweiten Loop ausführen."""
+    if timeout is None:
+        try:
+            timeout = current_app.config.get('OPENAI_ASYNC_TIMEOUT', 300)
+        except RuntimeError:
+            timeout = 300
+    # Chat/Worker Zuordnung des Aufrufers in den Loop Thread mitnehmen
+    return _runner.run(bind(coro), timeout=timeout)
+
+
+atexit.register(_runner.shutdown)
@@ -0,0 +1,277 @@
+from __future__ import annotations
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+import os
+from flask import current_app
+from sqlalchemy import insert, update
+from ..extensions import db
+from ..models import ChatBatch, ChatBatchItem, ChatRole, Chat, Message, VectorStore
+from .openai_client import get_openai_client
+from .call_ledger import attribute
+from .chat_service import ChatService
+from .context_budget import estimate_tokens
+from .file_service import FileService
+from .response_extract import extract_usage
+
+
+class BatchServiceError(Exception):
+    pass
+
+
+TERMINAL = ('completed', 'failed', 'expired', 'cancelled')
+_PROMPT_KEYS = ('prompt', 'frage', 'question', 'input')
+_ID_KEYS = ('custom_id', 'id', 'nr')
+
+
+def _pick(row: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[Any]:
+    lowered = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    return next((lowered[k] for k in keys if lowered.get(k) not in (None, '')), None)
+
+
+class BatchService:
+    """Fragebögen (viele Prompts, eine Chat Rolle) offline über die Batch API verarbeiten."""
+
+    # ---------------- Eingabe ----------------
+    @staticmethod
+    def parse_prompts(filename: str, data: bytes) -> List[Tuple[str, str]]:
+        """(custom_id, prompt) aus CSV oder JSONL.
+
+        CSV: Spalte prompt/frage/question (optional id/custom_id/nr), ohne passenden Header
+        zählt die erste Spalte. JSONL: Objekte mit denselben Keys oder reine Strings.
+        """
+        text = data.decode('utf-8-sig')
+        rows: List[Tuple[Optional[str], str]] = []
+        if filename.lower().endswith(('.jsonl', '.ndjson')):
+            for n, line in enumerate(text.splitlines(), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    obj = json.loads(line)
+                except ValueError as e:
+                    raise BatchServiceError(f"Zeile {n}: kein gültiges JSON ({e})") from e
+                if isinstance(obj, str):
+                    rows.append((None, obj))
+                elif isinstance(obj, dict) and _pick(obj, _PROMPT_KEYS):
+                    cid = _pick(obj, _ID_KEYS)
+                    rows.append((str(cid) if cid is not None else None, str(_pick(obj, _PROMPT_KEYS))))
+                else:
+                    raise BatchServiceError(f"Zeile {n}: Feld 'prompt' fehlt")
+        else:
+            try:
+                dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            table = [r for r in csv.reader(io.StringIO(text), dialect) if any(c.strip() for c in r)]
+            header = [c.strip().lower() for c in table[0]] if table else []
+            if any(k in header for k in _PROMPT_KEYS):
+                for r in table[1:]:
+                    row = dict(zip(header, r))
+                    prompt, cid = _pick(row, _PROMPT_KEYS), _pick(row, _ID_KEYS)
+                    if prompt:
+                        rows.append((cid.strip() if cid else None, prompt))
+            else:
+                rows = [(None, r[0]) for r in table if r[0].strip()]
+        if not rows:
+            raise BatchServiceError("Keine Prompts gefunden")
+        limit = current_app.config.get('BATCH_MAX_REQUESTS', 50000)
+        if len(rows) > limit:
+            raise BatchServiceError(f"Zu viele Prompts ({len(rows)} > {limit})")
+        prompts: List[Tuple[str, str]] = []
+        seen = set()
+        for pos, (cid, prompt) in enumerate(rows, start=1):
+            cid = (cid or f"q{pos}")[:64]
+            if cid in seen:
+                raise BatchServiceError(f"ID doppelt: {cid}")
+            seen.add(cid)
+            prompts.append((cid, prompt.strip()))
+        return prompts
+
+    @staticmethod
+    def create(name: str, role: ChatRole, prompts: List[Tuple[str, str]], chat: Optional[Chat] = None,
+               vector_store_ids: Optional[List[int]] = None) -> ChatBatch:
+        """Batch samt Items anlegen (Status draft); Ressourcen werden aus dem Chat oder der Auswahl übernommen."""
+        if chat is not None:
+            vs_ids, file_ids = ChatService.resolve_resources(chat)
+        else:
+            vs_ids, file_ids = [], []
+            if vector_store_ids:
+                vs_ids = [v.openai_vector_store_id for v in VectorStore.query.filter(VectorStore.id.in_(vector_store_ids))
+                          if v.openai_vector_store_id]
+        batch = ChatBatch(
+            name=name, chat_role_id=role.id, chat_id=chat.id if chat else None,
+            vector_store_ids=json.dumps(vs_ids), file_ids=json.dumps(file_ids), total=len(prompts),
+        )
+        db.session.add(batch)
+        db.session.flush()
+        db.session.execute(insert(ChatBatchItem), [
+            {'batch_id': batch.id, 'position': pos, 'custom_id': cid, 'prompt': prompt, 'status': 'pending'}
+            for pos, (cid, prompt) in enumerate(prompts)
+        ])
+        db.session.commit()
+        return batch
+
+    # ---------------- Einreichen / Status ----------------
+    @staticmethod
+    def submit(batch: ChatBatch) -> ChatBatch:
+        """JSONL schreiben, über den File Upload (purpose=batch) hochladen und Batch anlegen."""
+        if batch.status != 'draft':
+            raise BatchServiceError("Batch wurde bereits eingereicht")
+        role = batch.chat_role
+        client = get_openai_client()
+        # Body ist für alle Zeilen gleich bis auf input -> einmal aufbauen
+        base = client.response_request_body(
+            role.instructions or '', role.model, [],
+            max_output_tokens=batch.chat.max_output_tokens if batch.chat else 1024,
+            vector_store_ids=json.loads(batch.vector_store_ids or '[]'),
+            file_ids=json.loads(batch.file_ids or '[]'),
+        )
+        batch_dir = Path(current_app.instance_path) / 'batches'
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        path = batch_dir / f"chat_batch_{batch.id}.jsonl"
+        with open(path, 'w', encoding='utf-8') as f:
+            query = (db.session.query(ChatBatchItem.custom_id, ChatBatchItem.prompt)
+                     .filter(ChatBatchItem.batch_id == batch.id).order_by(ChatBatchItem.position))
+            for cid, prompt in query.yield_per(1000):
+                body = dict(base, input=[{'role': 'user', 'content': prompt}])
+                f.write(json.dumps({'custom_id': cid, 'method': 'POST', 'url': '/v1/responses', 'body': body},
+                                   ensure_ascii=False) + '\n')
+        try:
+            with attribute(chat_id=batch.chat_id, chat_role_id=batch.chat_role_id):
+                upload = FileService.upload_and_create(str(path), purpose='batch')
+                remote = client.create_batch(upload.openai_file_id, metadata={'orquestrix_batch': str(batch.id)})
+        except Exception as e:  # noqa: BLE001
+            db.session.rollback()
+            batch.status = 'failed'
+            batch.error = str(e)[:2000]
+            db.session.commit()
+            raise BatchServiceError(f"Einreichen fehlgeschlagen: {e}") from e
+        finally:
+            if path.exists():
+                os.remove(path)
+        BatchService._apply(batch, remote)
+        batch.input_file_id = upload.openai_file_id
+        db.session.commit()
+        current_app.logger.info('[Batch] %s eingereicht: %s Requests openai_id=%s', batch.id, batch.total, batch.openai_batch_id)
+        return batch
+
+    @staticmethod
+    def _apply(batch: ChatBatch, remote: Dict[str, Any]) -> None:
+        batch.openai_batch_id = remote.get('id') or batch.openai_batch_id
+        batch.status = remote.get('status') or batch.status
+        batch.output_file_id = remote.get('output_file_id')
+        batch.error_file_id = remote.get('error_file_id')
+        counts = remote.get('request_counts') or {}
+        batch.completed = counts.get('completed') or 0
+        batch.failed = counts.get('failed') or 0
+        errors = (remote.get('errors') or {}).get('data') or []
+        if errors:
+            batch.error = '; '.join(e.get('message') or e.get('code') or '' for e in errors)[:2000]
+
+    @staticmethod
+    def refresh(batch: ChatBatch) -> ChatBatch:
+        """Status abfragen und Ergebnisse einmalig importieren, sobald der Batch beendet ist."""
+        if not batch.openai_batch_id:
+            return batch
+        if batch.status not in TERMINAL:
+            with attribute(chat_id=batch.chat_id, chat_role_id=batch.chat_role_id):
+                remote = get_openai_client().retrieve_batch(batch.openai_batch_id)
+            BatchService._apply(batch, remote)
+            db.session.commit()
+        if batch.status in TERMINAL and batch.imported_at is None:
+            BatchService.import_results(batch)
+        return batch
+
+    @staticmethod
+    def cancel(batch: ChatBatch) -> ChatBatch:
+        if not batch.openai_batch_id or batch.status in TERMINAL:
+            raise BatchServiceError("Batch ist nicht aktiv")
+        with attribute(chat_id=batch.chat_id, chat_role_id=batch.chat_role_id):
+            remote = get_openai_client().cancel_batch(batch.openai_batch_id)
+        BatchService._apply(batch, remote)
+        db.session.commit()
+        return batch
+
+    # ---------------- Ergebnisse ----------------
+    @staticmethod
+    def _result_fields(line: Dict[str, Any]) -> Dict[str, Any]:
+        response = line.get('response') or {}
+        body = response.get('body') or {}
+        if response.get('status_code') == 200 and not body.get('error'):
+            usage = extract_usage(body)
+            return {
+                'status': 'done',
+                'answer': ChatService._extract_text_from_response(body),
+                'error': None,
+                'openai_response_id': body.get('id'),
+                'input_tokens': usage['input_tokens'],
+                'output_tokens': usage['output_tokens'],
+                'cached_tokens': usage['cached_tokens'],
+            }
+        error = line.get('error') or body.get('error') or {}
+        return {'status': 'failed', 'error': error.get('message') or error.get('code') or f"HTTP {response.get('status_code')}"}
+
+    @staticmethod
+    def import_results(batch: ChatBatch) -> int:
+        """Output/Error JSONL in die Items übernehmen (Bulk Update) und ggf. als Messages in den Chat schreiben."""
+        ids = dict(db.session.query(ChatBatchItem.custom_id, ChatBatchItem.id).filter(ChatBatchItem.batch_id == batch.id))
+        client = get_openai_client()
+        updates: List[Dict[str, Any]] = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with attribute(chat_id=batch.chat_id, chat_role_id=batch.chat_role_id):
+                raw = client.retrieve_file_content(file_id)
+            for line in raw.decode('utf-8').splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                item_id = ids.pop(entry.get('custom_id'), None)
+                if item_id is not None:
+                    updates.append(dict(BatchService._result_fields(entry), id=item_id))
+        # Ohne Ergebnis (abgebrochen/abgelaufen) -> failed
+        updates.extend({'id': item_id, 'status': 'failed', 'error': f"Keine Antwort (Batch {batch.status})"}
+                       for item_id in ids.values())
+        for keys in {tuple(sorted(u)) for u in updates}:
+            db.session.execute(update(ChatBatchItem), [u for u in updates if tuple(sorted(u)) == keys])
+        if batch.chat_id:
+            BatchService._write_messages(batch)
+        batch.imported_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.info('[Batch] %s importiert: %s Items', batch.id, len(updates))
+        return len(updates)
+
+    @staticmethod
+    def _write_messages(batch: ChatBatch) -> None:
+        # Ohne openai_response_id: Batch Antworten sind keine Kette, Folge-Turns senden den Verlauf
+        messages: List[Message] = []
+        for item in batch.items.filter(ChatBatchItem.status == 'done'):
+            messages.append(Message(chat_id=batch.chat_id, role='user', content=item.prompt,
+                                    token_count=estimate_tokens(item.prompt)))
+            messages.append(Message(chat_id=batch.chat_id, role='assistant', content=item.answer or '',
+                                    token_count=estimate_tokens(item.answer or ''), chat_role_id=batch.chat_role_id,
+                                    input_tokens=item.input_tokens, output_tokens=item.output_tokens,
+                                    cached_tokens=item.cached_tokens))
+        db.session.add_all(messages)
+
+    @staticmethod
+    def results_csv(batch: ChatBatch) -> Iterator[str]:
+        """CSV Zeilen (Semikolon, Excel-tauglich) für den Download, seitenweise aus der DB."""
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter=';')
+
+        def flush() -> str:
+            value = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            return value
+
+        writer.writerow(['id', 'prompt', 'answer', 'status', 'error', 'input_tokens', 'output_tokens', 'cached_tokens'])
+        yield '\ufeff' + flush()
+        for item in batch.items.yield_per(500):
+            writer.writerow([item.custom_id, item.prompt, item.answer or '', item.status, item.error or '',
+                             item.input_tokens or '', item.output_tokens or '', item.cached_tokens or ''])
+            yield flush()
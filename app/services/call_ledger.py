@@ -0,0 +1,258 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import httpx
+from .resilience import endpoint_key
+
+
+logger = logging.getLogger('orquestrix.openai.ledger')
+T = TypeVar('T')
+
+# Zuordnung laufender Calls zu Chat / Worker / Projekt (pro Request bzw. Task)
+_attribution: ContextVar[Dict[str, Optional[int]]] = ContextVar('openai_call_attribution', default={})
+
+# USD je 1M Tokens: (input, cached input, output); per OPENAI_PRICING_JSON überschreibbar
+DEFAULT_PRICING: Dict[str, tuple] = {
+    'gpt-4.5': (75.0, 37.5, 150.0),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1-nano': (0.10, 0.025, 0.40),
+    'gpt-4.1': (2.00, 0.50, 8.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4': (30.0, 30.0, 60.0),
+    'o3-pro': (20.0, 20.0, 80.0),
+    'o3-mini': (1.10, 0.55, 4.40),
+    'o3': (2.00, 0.50, 8.00),
+    'o4-mini': (1.10, 0.275, 4.40),
+}
+
+_TERMINAL_RUN = ('completed', 'failed', 'cancelled', 'expired', 'incomplete')
+
+
+@contextmanager
+def attribute(chat_id: Optional[int] = None, worker_id: Optional[int] = None, project_id: Optional[int] = None,
+              chat_role_id: Optional[int] = None):
+    """Alle OpenAI Calls innerhalb des Blocks dem Chat/Worker/Projekt (und der Chat Rolle) zuordnen."""
+    current = dict(_attribution.get())
+    for k, v in (('chat_id', chat_id), ('worker_id', worker_id), ('project_id', project_id), ('chat_role_id', chat_role_id)):
+        if v is not None:
+            current[k] = v
+    token = _attribution.set(current)
+    try:
+        yield current
+    finally:
+        _attribution.reset(token)
+
+
+def current_attribution() -> Dict[str, Optional[int]]:
+    return dict(_attribution.get())
+
+
+async def _bound(coro: Awaitable[T], attribution: Dict[str, Optional[int]]) -> T:
+    _attribution.set(attribution)
+    return await coro
+
+
+def bind(coro: Awaitable[T]) -> Awaitable[T]:
+    """Zuordnung des Aufrufers in eine Coroutine mitnehmen (Event Loop läuft in anderem Thread)."""
+    return _bound(coro, current_attribution())
+
+
+def estimate_cost(model: Optional[str], input_tokens: int, cached_tokens: int, output_tokens: int,
+                  pricing: Dict[str, tuple]) -> Optional[float]:
+    if not model:
+        return None
+    # Längster Präfix gewinnt (o3-pro-2025-06-10 -> o3-pro, nicht o3)
+    match = max((k for k in pricing if model.startswith(k)), key=len, default=None)
+    if not match:
+        return None
+    p_in, p_cached, p_out = pricing[match]
+    uncached = max(0, input_tokens - cached_tokens)
+    return round((uncached * p_in + cached_tokens * p_cached + output_tokens * p_out) / 1_000_000, 6)
+
+
+def usage_fields(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Tokens aus Responses (input/output_tokens) oder Runs (prompt/completion_tokens)."""
+    usage = body.get('usage') or {}
+    if not isinstance(usage, dict):
+        return {}
+    details = usage.get('input_tokens_details') or usage.get('prompt_token_details') or {}
+    return {
+        'input_tokens': usage.get('input_tokens', usage.get('prompt_tokens')),
+        'output_tokens': usage.get('output_tokens', usage.get('completion_tokens')),
+        'cached_tokens': (details or {}).get('cached_tokens') if isinstance(details, dict) else None,
+    }
+
+
+def run_timing_fields(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Queue- vs. Laufzeit eines terminalen Runs aus created_at/started_at/*_at."""
+    if body.get('object') != 'thread.run' or body.get('status') not in _TERMINAL_RUN:
+        return {}
+    created = body.get('created_at')
+    started = body.get('started_at')
+    ended = body.get('completed_at') or body.get('failed_at') or body.get('cancelled_at') or body.get('expires_at')
+    out: Dict[str, Any] = {}
+    if created and started:
+        out['queue_ms'] = int((started - created) * 1000)
+    if started and ended:
+        out['run_ms'] = int((ended - started) * 1000)
+    return out
+
+
+class CallLedger:
+    """Puffert Call-Einträge und schreibt sie gebündelt in ``openai_call``.
+
+    Schreiben erfolgt in einem Hintergrund-Thread über eine eigene Connection, damit weder
+    die Latenz des Aufrufers noch dessen DB Session (offene Transaktion) betroffen sind.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.pricing: Dict[str, tuple] = dict(DEFAULT_PRICING)
+        self.enabled = True
+        self.batch_size = 50
+        self.flush_interval = 2.0
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self.enabled = app.config.get('OPENAI_LEDGER_ENABLED', True)
+        self.batch_size = app.config.get('OPENAI_LEDGER_BATCH', 50)
+        self.flush_interval = app.config.get('OPENAI_LEDGER_FLUSH_SEC', 2.0)
+        raw = app.config.get('OPENAI_PRICING_JSON')
+        if raw:
+            try:
+                self.pricing.update({k: tuple(v) for k, v in json.loads(raw).items()})
+            except Exception as e:  # noqa: BLE001
+                app.logger.warning('[Ledger] OPENAI_PRICING_JSON ungültig: %s', e)
+
+    # ---------------------- Erfassen ----------------------
+    def record(self, endpoint: str, status: str, latency_ms: Optional[int] = None, http_status: Optional[int] = None,
+               body: Optional[Dict[str, Any]] = None, attempts: int = 1, error: Optional[str] = None,
+               attribution: Optional[Dict[str, Optional[int]]] = None) -> None:
+        if not self.enabled or self._app is None:
+            return
+        body = body or {}
+        entry: Dict[str, Any] = {
+            'created_at': datetime.utcnow(),
+            'endpoint': endpoint[:120],
+            'model': (body.get('model') or None) if isinstance(body.get('model'), str) else None,
+            'openai_id': body.get('id') if isinstance(body.get('id'), str) else None,
+            'status': status[:30],
+            'http_status': http_status,
+            'latency_ms': latency_ms,
+            'attempts': attempts,
+            'error': error[:500] if error else None,
+            'queue_ms': None,
+            'run_ms': None,
+            'input_tokens': None,
+            'output_tokens': None,
+            'cached_tokens': None,
+            'cost_usd': None,
+            'chat_id': None,
+            'worker_id': None,
+            'project_id': None,
+            'chat_role_id': None,
+        }
+        entry.update({k: v for k, v in usage_fields(body).items() if v is not None})
+        entry.update(run_timing_fields(body))
+        entry.update({k: v for k, v in (attribution if attribution is not None else current_attribution()).items() if v is not None})
+        if entry['input_tokens'] is not None or entry['output_tokens'] is not None:
+            entry['cost_usd'] = estimate_cost(
+                entry['model'], entry['input_tokens'] or 0, entry['cached_tokens'] or 0, entry['output_tokens'] or 0, self.pricing
+            )
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def observe(self, request: httpx.Request, response: Optional[httpx.Response], error: Optional[BaseException],
+                latency: float, attempts: int, body: Optional[Dict[str, Any]] = None) -> None:
+        """Transport-Hook: ein Eintrag je logischem Call (nach Retries)."""
+        if response is not None and 'text/event-stream' in response.headers.get('content-type', ''):
+            return  # Streams erfasst der Aufrufer (timed_call) mit finaler Response
+        key = endpoint_key(request.method, request.url.path)
+        if response is None:
+            self.record(key, 'error', int(latency * 1000), None, None, attempts, f'{type(error).__name__}: {error}')
+            return
+        if response.headers.get('x-orquestrix-circuit') == 'open':
+            status = 'circuit_open'
+        else:
+            status = str((body or {}).get('status') or ('ok' if response.status_code < 400 else 'error'))
+        err = None
+        if response.status_code >= 400 and body:
+            e = body.get('error')
+            err = (e.get('message') if isinstance(e, dict) else str(e)) if e else None
+        self.record(key, status, int(latency * 1000), response.status_code, body, attempts, err)
+
+    # ---------------------- Schreiben ----------------------
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name='orquestrix-ledger', daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch or self._app is None:
+            return 0
+        from ..extensions import db
+        from ..models import OpenAICall
+        try:
+            with self._app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(OpenAICall.__table__.insert(), batch)
+        except Exception as e:  # noqa: BLE001
+            logger.warning('[Ledger] flush fehlgeschlagen (%s Einträge verworfen): %s', len(batch), e)
+            return 0
+        return len(batch)
+
+
+ledger = CallLedger()
+atexit.register(ledger.flush)
+
+
+@contextmanager
+def timed_call(endpoint: str) -> Iterator[Dict[str, Any]]:
+    """Manuelle Erfassung für Calls ohne JSON Body im Transport (z.B. SSE Streams)."""
+    info: Dict[str, Any] = {'body': None, 'status': 'ok', 'error': None}
+    start = time.monotonic()
+    try:
+        yield info
+    except GeneratorExit:
+        # Client hat den SSE Stream verlassen (close() des Generators): kein vollständiger Call
+        info['status'] = 'cancelled'
+        info['error'] = 'Stream vom Client abgebrochen'
+        raise
+    except Exception as e:  # noqa: BLE001
+        info['status'] = 'error'
+        info['error'] = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        ledger.record(endpoint, info['status'], int((time.monotonic() - start) * 1000), None,
+                      info['body'], 1, info['error'])
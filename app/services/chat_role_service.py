@@ -11,7 +11,8 @@ class ChatRoleServiceError(Exception):
 class ChatRoleService:
     @staticmethod
     def create(name: str, instructions: str, description: str | None = None, model: str | None = None,
-               active: bool = True, temperature: float | None = None) -> ChatRole:
+               active: bool = True, temperature: float | None = None, cache_enabled: bool = False,
+               cache_ttl_sec: int | None = None, context_budget_tokens: int | None = None) -> ChatRole:
         if not name or not instructions:
             raise ChatRoleServiceError("Name und Instructions sind Pflicht")
         temp = 0.7 if temperature is None else max(0.0, min(1.0, float(temperature)))
@@ -22,6 +23,9 @@ class ChatRoleService:
             model=model or 'gpt-4.5',
             active=active,
             temperature=temp,
+            cache_enabled=bool(cache_enabled),
+            cache_ttl_sec=cache_ttl_sec if cache_ttl_sec and cache_ttl_sec > 0 else None,
+            context_budget_tokens=context_budget_tokens if context_budget_tokens and context_budget_tokens > 0 else None,
         )
         db.session.add(role)
         db.session.commit()
@@ -30,6 +34,14 @@ class ChatRoleService:
     @staticmethod
     def update(role: ChatRole, **kwargs) -> ChatRole:
         temp = kwargs.pop('temperature', None)
+        if 'cache_ttl_sec' in kwargs:
+            # leer/0 = Default TTL aus Config
+            ttl = kwargs.pop('cache_ttl_sec')
+            role.cache_ttl_sec = ttl if ttl and ttl > 0 else None
+        if 'context_budget_tokens' in kwargs:
+            # leer/0 = Default Budget aus Config
+            budget = kwargs.pop('context_budget_tokens')
+            role.context_budget_tokens = budget if budget and budget > 0 else None
         for k, v in kwargs.items():
             if hasattr(role, k) and v is not None:
                 setattr(role, k, v)
@@ -1,8 +1,39 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
 from flask import current_app
+from sqlalchemy import and_, func, literal, or_, update
+from sqlalchemy.orm import joinedload
 from ..extensions import db
-from ..models import Chat, Message, ChatRole
+from ..models import Chat, Message, ChatRole, File, VectorStore, chat_file, chat_vector_store, project_file
 from .openai_client import get_openai_client
+from .call_ledger import attribute, ledger
+from .context_budget import estimate_tokens, select_recent
+from .response_cache import cache_key, cacheable, response_cache
+from .prompt_builder import canonical_ids
+from .response_extract import extract_response, extract_usage
+
+# Token-Schätzung je Message (Altbestand ohne token_count: Zeichen / 4)
+_TOKENS = func.coalesce(Message.token_count, func.length(Message.content) / 4)
+# Anteil des Budgets, den ein neu aufgesetzter Verlauf belegt (Rest = Spielraum für verkettete Folge-Turns)
+_REBASE_FILL = 0.6
+_RESOURCE_FOOTER = "\n---\nVerwendete Ressourcen:"
+_SUMMARY_INSTRUCTIONS = (
+    "Fasse den bisherigen Gesprächsverlauf kompakt auf Deutsch zusammen. Erhalte Fakten, Zahlen, Namen, "
+    "Entscheidungen, Vorgaben des Users und offene Fragen. Antworte nur mit der Zusammenfassung."
+)
+
+# Hintergrund-Jobs für Zusammenfassungen (prozesslokal, je Chat höchstens einer gleichzeitig)
+_summary_pool: Optional[ThreadPoolExecutor] = None
+_summary_pool_pid: Optional[int] = None
+_summary_pending: Set[int] = set()
+_summary_lock = threading.Lock()
 
 
 class ChatService:
@@ -17,58 +48,477 @@ class ChatService:
         )
         db.session.add(chat)
         db.session.flush()
-        # Projekt-Dateien (nicht in Vector Stores) automatisch anhängen
+        # Projekt-Dateien (nicht in Vector Stores) automatisch anhängen – eine Query statt Lazy Load je Datei
         if project_id:
-            from ..models import Project as _Proj, File as _File
-            proj = _Proj.query.get(project_id)
-            if proj:
-                for f in proj.files:
-                    # Nur Dateien ohne Zugehörigkeit zu einem Vector Store
-                    if not f.vector_stores:
-                        chat.files.append(f)
+            chat.files.extend(
+                File.query.join(project_file, project_file.c.file_id == File.id)
+                .filter(project_file.c.project_id == project_id, ~File.vector_stores.any())
+                .all()
+            )
         db.session.commit()
         return chat
 
     @staticmethod
-    def add_message(chat_id: int, role: str, content: str, openai_response_id: str | None = None) -> Message:
-        msg = Message(chat_id=chat_id, role=role, content=content, openai_response_id=openai_response_id)
+    def add_message(chat_id: int, role: str, content: str, openai_response_id: str | None = None,
+                    **fields: Any) -> Message:
+        """Message speichern; ``fields`` = optionale Spalten (Usage, citations)."""
+        msg = Message(chat_id=chat_id, role=role, content=content, openai_response_id=openai_response_id,
+                      token_count=estimate_tokens(content), **fields)
         db.session.add(msg)
         db.session.commit()
         return msg
 
     @staticmethod
-    def generate_assistant_reply(chat: Chat) -> Message:
-        # Ordnung nach Nachrichten-Zeitstempel (nicht Chat.created_at, sonst fehlt Tabelle im Query Context)
-        from ..models import Message as _Msg  # lokale Import-Vermeidung zyklischer Probleme
-        messages = [
-            {"role": m.role, "content": m.content}
-            for m in chat.messages.order_by(_Msg.created_at.asc()).all()
-        ]
-        client = get_openai_client()
-        role: ChatRole | None = getattr(chat, 'chat_role', None)
-        instructions = (role.instructions if role else None) or chat.objective or ""
-        model = role.model if role else chat.model
+    def message_page(chat: Chat, before: Optional[str] = None, limit: int = 50) -> Tuple[List[Message], Optional[str]]:
+        """Keyset Pagination: bis zu ``limit`` Nachrichten vor dem Cursor (aufsteigend sortiert).
 
-        # Projekt-Dateien ohne Vector Stores zusätzlich berücksichtigen
-        proj_file_ids: list[str] = []
-        if chat.project:
-            for f in chat.project.files:
-                if not f.vector_stores and f.openai_file_id:
-                    proj_file_ids.append(f.openai_file_id)
+        Liefert (Nachrichten, Cursor für die nächstälteren oder None). Der Cursor kodiert
+        (created_at, id) der ältesten gelieferten Nachricht.
+        """
+        query = chat.messages
+        if before:
+            created_at, message_id = ChatService._parse_cursor(before)
+            query = query.filter(or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < message_id),
+            ))
+        rows = (query.options(joinedload(Message.chat_role))
+                .order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all())
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        cursor = f"{rows[0].created_at.isoformat()}_{rows[0].id}" if has_more and rows else None
+        return rows, cursor
 
-        # VectorStores: nur explizit dem Chat zugewiesene (kein automatischer Projekt-Fallback)
-        vector_store_ids = [vs.openai_vector_store_id for vs in chat.vector_stores if vs.openai_vector_store_id]
+    @staticmethod
+    def _parse_cursor(cursor: str) -> Tuple[datetime, int]:
+        try:
+            ts, _, message_id = cursor.rpartition('_')
+            return datetime.fromisoformat(ts), int(message_id)
+        except ValueError as e:
+            raise ValueError(f"Ungültiger Cursor: {cursor}") from e
+
+    @staticmethod
+    def _build_reply_request(chat: Chat, chain: bool = True) -> Dict[str, Any]:
+        """Stellt Parameter für create_chat_response / stream_chat_response zusammen.
 
-        file_ids_final = [f.openai_file_id for f in chat.files if f.openai_file_id] + proj_file_ids
-        response = client.create_chat_response(
+        Mit ``chain`` werden nur die neuen User-Turns seit der letzten Antwort gesendet
+        (previous_response_id), sonst der (ggf. gekürzte) komplette Verlauf.
+        """
+        messages, previous_response_id = None, None
+        if chain and current_app.config.get('OPENAI_CHAT_CHAINING', True):
+            messages, previous_response_id = ChatService._chained_turns(chat)
+        if previous_response_id is None:
+            messages = ChatService._full_history(chat)
+        role: ChatRole | None = getattr(chat, 'chat_role', None)
+        instructions = (role.instructions if role else None) or chat.objective or ""
+        model = role.model if role else chat.model
+        vector_store_ids, file_ids_final = ChatService.resolve_resources(chat)
+        return dict(
             instructions=instructions,
             model=model,
             messages=messages,
             max_output_tokens=chat.max_output_tokens,
             vector_store_ids=vector_store_ids,
             file_ids=file_ids_final,
+            **({'previous_response_id': previous_response_id} if previous_response_id else {}),
         )
+
+    @staticmethod
+    def resolve_resources(chat: Chat) -> Tuple[List[str], List[str]]:
+        """(Vector Store IDs, File IDs) des Chats; aus resource_ids_cache oder per einer Query neu berechnet.
+
+        VectorStores: nur explizit dem Chat zugewiesene (kein automatischer Projekt-Fallback).
+        Files: Chat-Dateien plus Projekt-Dateien ohne Vector Store.
+        """
+        if chat.resource_ids_cache:
+            cached = json.loads(chat.resource_ids_cache)
+            return cached['vector_store_ids'], cached['file_ids']
+        parts = [
+            db.session.query(literal('vs').label('kind'), VectorStore.openai_vector_store_id.label('oid'))
+            .join(chat_vector_store, chat_vector_store.c.vector_store_id == VectorStore.id)
+            .filter(chat_vector_store.c.chat_id == chat.id),
+            db.session.query(literal('file').label('kind'), File.openai_file_id.label('oid'))
+            .join(chat_file, chat_file.c.file_id == File.id)
+            .filter(chat_file.c.chat_id == chat.id),
+        ]
+        if chat.project_id:
+            parts.append(
+                db.session.query(literal('project_file').label('kind'), File.openai_file_id.label('oid'))
+                .join(project_file, project_file.c.file_id == File.id)
+                .filter(project_file.c.project_id == chat.project_id, ~File.vector_stores.any())
+            )
+        rows = parts[0].union_all(*parts[1:]).all()
+        # Sortiert + ohne Duplikate (Projekt-Dateien hängen auch am Chat): stabiler Prompt-Präfix
+        vector_store_ids = canonical_ids(oid for kind, oid in rows if kind == 'vs')
+        file_ids = canonical_ids(oid for kind, oid in rows if kind != 'vs')
+        chat.resource_ids_cache = json.dumps({'vector_store_ids': vector_store_ids, 'file_ids': file_ids})
+        db.session.commit()
+        return vector_store_ids, file_ids
+
+    @staticmethod
+    def invalidate_resources(chat_id: Optional[int] = None, project_id: Optional[int] = None,
+                             file_id: Optional[int] = None) -> None:
+        """Resource Cache betroffener Chats verwerfen (ohne Argument: alle). Commit durch den Aufrufer."""
+        query = Chat.query
+        if chat_id is not None:
+            query = query.filter(Chat.id == chat_id)
+        elif project_id is not None:
+            query = query.filter(Chat.project_id == project_id)
+        elif file_id is not None:
+            # Vector Store Zuordnung einer Datei ändert nur die Projekt-Dateien der Chats
+            project_ids = db.session.query(project_file.c.project_id).filter(project_file.c.file_id == file_id)
+            query = query.filter(Chat.project_id.in_(project_ids))
+        query.filter(Chat.resource_ids_cache.isnot(None)).update(
+            {'resource_ids_cache': None}, synchronize_session='fetch')
+
+    @staticmethod
+    def _context_budget(chat: Chat) -> int:
+        """Token-Budget für den Verlauf (Chat Rolle vor Config, 0 = unbegrenzt)."""
+        role: ChatRole | None = getattr(chat, 'chat_role', None)
+        if role and role.context_budget_tokens:
+            return role.context_budget_tokens
+        return current_app.config.get('OPENAI_CHAT_CONTEXT_BUDGET', 0)
+
+    @staticmethod
+    def _chained_turns(chat: Chat) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Neue User-Turns nach der letzten Assistant Antwort und deren Response ID.
+
+        Nur wenn seit der Antwort ausschließlich User-Nachrichten hinzukamen und die
+        serverseitige Kette noch ins Kontext-Budget passt, sonst ([], None).
+        """
+        last = (chat.messages
+                .filter(Message.role == 'assistant', Message.openai_response_id.isnot(None))
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .first())
+        if not last or last.fanout_group:
+            # Fan-out Antworten bilden keine lineare Kette -> voller Verlauf mit allen Geschwistern
+            return [], None
+        newer = chat.messages.filter(Message.id > last.id).order_by(Message.created_at.asc(), Message.id.asc()).all()
+        if not newer or any(m.role != 'user' for m in newer):
+            return [], None
+        budget = ChatService._context_budget(chat)
+        if budget:
+            used = (db.session.query(func.coalesce(func.sum(_TOKENS), 0))
+                    .filter(Message.chat_id == chat.id, Message.id >= (chat.context_start_message_id or 0))
+                    .scalar())
+            if chat.context_start_message_id and chat.summary:
+                used += chat.summary_token_count or 0
+            if used > budget:
+                # Kette zu lang -> mit Zusammenfassung + neuesten Turns neu aufsetzen
+                return [], None
+        return [{"role": m.role, "content": m.content} for m in newer], last.openai_response_id
+
+    @staticmethod
+    def _full_history(chat: Chat) -> List[Dict[str, Any]]:
+        """Neueste Nachrichten im Kontext-Budget, ältere Turns als rollierende Zusammenfassung."""
+        budget = ChatService._context_budget(chat)
+        # Ordnung nach Nachrichten-Zeitstempel (nicht Chat.created_at, sonst fehlt Tabelle im Query Context)
+        if not budget:
+            rows = chat.messages.order_by(Message.created_at.asc(), Message.id.asc()).all()
+            truncated = False
+        else:
+            summary_tokens = (chat.summary_token_count or 0) if chat.summary else 0
+            # Neu aufgesetzte Kette nur teilweise füllen, damit Folge-Turns wieder verketten können
+            fill = max(1, int(budget * _REBASE_FILL) - summary_tokens)
+            sizes = (db.session.query(Message.id, _TOKENS)
+                     .filter(Message.chat_id == chat.id)
+                     .order_by(Message.created_at.desc(), Message.id.desc())
+                     .yield_per(200))
+            ids, truncated = select_recent(sizes, fill)
+            rows = (Message.query.filter(Message.id.in_(ids))
+                    .order_by(Message.created_at.asc(), Message.id.asc()).all())
+        messages = [{"role": m.role, "content": m.content} for m in rows]
+        # Start der (neuen) serverseitigen Kette merken -> Budget-Prüfung in _chained_turns
+        start_id = rows[0].id if truncated and rows else None
+        if chat.context_start_message_id != start_id:
+            chat.context_start_message_id = start_id
+            db.session.commit()
+        if not truncated:
+            return messages
+        current_app.logger.info('[ChatService] Kontext-Budget chat=%s budget=%s kept=%s summary_upto=%s',
+                                chat.id, budget, len(rows), chat.summary_message_id)
+        ChatService.schedule_summary(chat)
+        if chat.summary:
+            note = f"[Zusammenfassung des bisherigen Gesprächsverlaufs]\n{chat.summary}"
+            messages.insert(0, {"role": "system", "content": note})
+        return messages
+
+    # ---------------------- Rollierende Zusammenfassung ----------------------
+    @staticmethod
+    def schedule_summary(chat: Chat) -> None:
+        """Zusammenfassung der Turns vor dem Kontext-Fenster im Hintergrund nachziehen (je Chat max. ein Job)."""
+        global _summary_pool, _summary_pool_pid
+        app = current_app._get_current_object()
+        with _summary_lock:
+            if chat.id in _summary_pending:
+                return
+            _summary_pending.add(chat.id)
+            if _summary_pool is None or _summary_pool_pid != os.getpid():
+                _summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='orquestrix-summary')
+                _summary_pool_pid = os.getpid()
+            pool = _summary_pool
+        pool.submit(ChatService._summary_job, app, chat.id)
+
+    @staticmethod
+    def _summary_job(app, chat_id: int) -> None:
+        with app.app_context():
+            try:
+                ChatService.update_summary(chat_id)
+            except Exception as e:  # noqa: BLE001
+                db.session.rollback()
+                app.logger.warning('[ChatService] Zusammenfassung fehlgeschlagen chat=%s err=%s', chat_id, e)
+            finally:
+                with _summary_lock:
+                    _summary_pending.discard(chat_id)
+                db.session.remove()
+
+    @staticmethod
+    def update_summary(chat_id: int) -> Optional[str]:
+        """Fasst alle Nachrichten vor context_start_message_id inkrementell zusammen (blockweise, je Block ein Commit)."""
+        chat = Chat.query.get(chat_id)
+        if not chat or not chat.context_start_message_id:
+            return chat.summary if chat else None
+        budget = ChatService._context_budget(chat) or current_app.config.get('OPENAI_CHAT_CONTEXT_BUDGET', 0) or 12000
+        pending = (chat.messages
+                   .filter(Message.id > (chat.summary_message_id or 0), Message.id < chat.context_start_message_id)
+                   .order_by(Message.created_at.asc(), Message.id.asc())
+                   .all())
+        client = get_openai_client()
+        chunk: List[Message] = []
+        used = 0
+        for i, m in enumerate(pending):
+            chunk.append(m)
+            used += m.token_count or estimate_tokens(m.content)
+            if used < budget and i < len(pending) - 1:
+                continue
+            transcript = '\n\n'.join(
+                f"{'User' if c.role == 'user' else 'Assistant'}: {c.content.split(_RESOURCE_FOOTER)[0].strip()}"
+                for c in chunk
+            )
+            text = (f"Bisherige Zusammenfassung:\n{chat.summary}\n\n" if chat.summary else '') + \
+                f"Neue Nachrichten:\n{transcript}"
+            with attribute(chat_id=chat.id, project_id=chat.project_id):
+                response = client.create_chat_response(
+                    instructions=_SUMMARY_INSTRUCTIONS,
+                    model=current_app.config.get('OPENAI_SUMMARY_MODEL') or chat.model,
+                    messages=[{"role": "user", "content": text}],
+                    max_output_tokens=current_app.config.get('OPENAI_SUMMARY_MAX_TOKENS', 800),
+                )
+            if response.get('error') or response.get('status') not in (None, 'completed'):
+                raise RuntimeError(f"Zusammenfassung unvollständig status={response.get('status')}")
+            chat.summary = ChatService._extract_text_from_response(response)
+            chat.summary_message_id = chunk[-1].id
+            chat.summary_token_count = estimate_tokens(chat.summary)
+            db.session.commit()
+            current_app.logger.info('[ChatService] Zusammenfassung chat=%s upto=%s tokens=%s',
+                                    chat.id, chat.summary_message_id, chat.summary_token_count)
+            chunk, used = [], 0
+        return chat.summary
+
+    @staticmethod
+    def _is_chain_error(exc: Exception) -> bool:
+        """True wenn die API die previous_response_id ablehnt (abgelaufen, gelöscht, unbekannt)."""
+        if getattr(exc, 'status_code', None) not in (400, 404):
+            return False
+        if getattr(exc, 'param', None) == 'previous_response_id':
+            return True
+        text = str(exc).lower()
+        return 'previous_response' in text or 'previous response' in text
+
+    @staticmethod
+    def _cache_ttl(chat: Chat) -> Optional[float]:
+        """TTL falls die Chat Rolle den Antwort-Cache aktiviert hat, sonst None."""
+        return ChatService._role_cache_ttl(getattr(chat, 'chat_role', None))
+
+    @staticmethod
+    def _role_cache_ttl(role: Optional[ChatRole]) -> Optional[float]:
+        if not role or not role.cache_enabled:
+            return None
+        return role.cache_ttl_sec if role.cache_ttl_sec is not None else response_cache.default_ttl
+
+    @staticmethod
+    def generate_assistant_reply(chat: Chat) -> Message:
+        request = ChatService._build_reply_request(chat)
+        ttl = ChatService._cache_ttl(chat)
+        key = cache_key(request) if ttl is not None else None
+        if key:
+            cached = response_cache.get(key)
+            if cached is not None:
+                current_app.logger.info('[ChatService] cache hit chat=%s response_id=%s', chat.id, cached.get('id'))
+                return ChatService._store_reply(chat, cached, request, cache_hit=True)
+        client = get_openai_client()
+        started = time.monotonic()
+        with attribute(chat_id=chat.id, project_id=chat.project_id, chat_role_id=chat.chat_role_id):
+            try:
+                response = client.create_chat_response(**request)
+            except Exception as e:  # noqa: BLE001
+                if not request.get('previous_response_id') or not ChatService._is_chain_error(e):
+                    raise
+                current_app.logger.warning('[ChatService] Kette ungültig chat=%s err=%s -> voller Verlauf', chat.id, e)
+                request = ChatService._build_reply_request(chat, chain=False)
+                key = cache_key(request) if ttl is not None else None
+                response = client.create_chat_response(**request)
+        if key and cacheable(response):
+            response_cache.put(key, response, ttl=ttl, latency_sec=time.monotonic() - started)
+        return ChatService._store_reply(chat, response, request)
+
+    @staticmethod
+    def fan_out(chat: Chat, content: str, role_ids: List[int]) -> List[Message]:
+        """Eine Frage parallel an mehrere Chat Rollen; Antworten als Geschwister-Nachrichten (gleiche fanout_group)."""
+        roles = ChatRole.query.filter(ChatRole.id.in_(role_ids)).order_by(ChatRole.name.asc()).all()
+        if not roles:
+            raise ValueError("Keine Chat Rollen gewählt")
+        group = ChatService.start_fan_out(chat, content)
+        return ChatService.answer_fan_out(chat, group, [r.id for r in roles])
+
+    @staticmethod
+    def start_fan_out(chat: Chat, content: str) -> str:
+        """Speichert die Fan-out Frage und liefert die Gruppe für die Antworten."""
+        group = uuid.uuid4().hex[:16]
+        ChatService.add_message(chat.id, "user", content, fanout_group=group)
+        return group
+
+    @staticmethod
+    def answer_fan_out(chat: Chat, group: str, role_ids: List[int]) -> List[Message]:
+        """Beantwortet die Fan-out Frage ``group`` je Rolle; Wartezeit = langsamste Rolle statt Summe."""
+        roles = ChatRole.query.filter(ChatRole.id.in_(role_ids)).order_by(ChatRole.name.asc()).all()
+        # Verlauf und Ressourcen einmal auflösen, je Rolle nur Instructions/Modell tauschen
+        base = ChatService._build_reply_request(chat, chain=False)
+        requests: Dict[int, Dict[str, Any]] = {}
+        results: Dict[int, Any] = {}
+        hits: Set[int] = set()
+        for role in roles:
+            requests[role.id] = dict(base, instructions=role.instructions or chat.objective or "", model=role.model)
+            ttl = ChatService._role_cache_ttl(role)
+            cached = response_cache.get(cache_key(requests[role.id])) if ttl is not None else None
+            if cached is not None:
+                results[role.id] = cached
+                hits.add(role.id)
+        pending = [r for r in roles if r.id not in results]
+        app = current_app._get_current_object()
+        client = get_openai_client()
+
+        def ask(role_id: int) -> Tuple[Dict[str, Any], float]:
+            started = time.monotonic()
+            with app.app_context(), attribute(chat_id=chat.id, project_id=chat.project_id, chat_role_id=role_id):
+                return client.create_chat_response(**requests[role_id]), time.monotonic() - started
+
+        if pending:
+            limit = max(1, current_app.config.get('CHAT_FANOUT_CONCURRENCY', 4))
+            with ThreadPoolExecutor(max_workers=min(limit, len(pending)), thread_name_prefix='orquestrix-fanout') as pool:
+                futures = {role.id: pool.submit(ask, role.id) for role in pending}
+                for role in pending:
+                    try:
+                        response, latency = futures[role.id].result()
+                    except Exception as e:  # noqa: BLE001
+                        current_app.logger.warning('[ChatService] fan-out chat=%s role=%s err=%s', chat.id, role.id, e)
+                        results[role.id] = {'error': {'message': str(e)}}
+                        continue
+                    ttl = ChatService._role_cache_ttl(role)
+                    if ttl is not None and cacheable(response):
+                        response_cache.put(cache_key(requests[role.id]), response, ttl=ttl, latency_sec=latency)
+                    results[role.id] = response
+        # Speichern im aufrufenden Thread (eine Session), Reihenfolge nach Rollenname
+        return [
+            ChatService._store_reply(chat, results[role.id], requests[role.id], cache_hit=role.id in hits,
+                                     chat_role_id=role.id, fanout_group=group)
+            for role in roles
+        ]
+
+    @staticmethod
+    def claim_reply(chat: Chat) -> bool:
+        """Chat für eine SSE Antwort belegen (bedingtes UPDATE); False, wenn bereits eine läuft.
+
+        Eine Sperre älter als CHAT_STREAM_LOCK_TIMEOUT (abgebrochener Prozess) gilt als frei.
+        """
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=current_app.config.get('CHAT_STREAM_LOCK_TIMEOUT', 600))
+        claimed = db.session.execute(
+            update(Chat).where(Chat.id == chat.id, or_(Chat.reply_started_at.is_(None), Chat.reply_started_at < stale))
+            .values(reply_started_at=now).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return bool(claimed)
+
+    @staticmethod
+    def release_reply(chat: Chat) -> None:
+        db.session.rollback()
+        db.session.execute(update(Chat).where(Chat.id == chat.id).values(reply_started_at=None)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+
+    @staticmethod
+    def stream_assistant_reply(chat: Chat) -> Iterator[Tuple[str, Any]]:
+        """Streaming Antwort: reicht Deltas durch und persistiert die Message nach Abschluss.
+
+        Liefert ('delta', str), abschließend ('done', Message) oder ('error', str).
+        """
+        request = ChatService._build_reply_request(chat)
+        ttl = ChatService._cache_ttl(chat)
+        key = cache_key(request) if ttl is not None else None
+        if key:
+            cached = response_cache.get(key)
+            if cached is not None:
+                # Treffer: kompletter Text als ein Delta
+                current_app.logger.info('[ChatService] cache hit (stream) chat=%s response_id=%s', chat.id, cached.get('id'))
+                yield 'delta', ChatService._extract_text_from_response(cached)
+                yield 'done', ChatService._store_reply(chat, cached, request, cache_hit=True)
+                return
+        client = get_openai_client()
+        started = time.monotonic()
+        with attribute(chat_id=chat.id, project_id=chat.project_id, chat_role_id=chat.chat_role_id):
+            try:
+                stream = client.stream_chat_response(**request)
+                # Abgelehnte previous_response_id schlägt beim Öffnen fehl, also vor dem ersten Delta
+                first = next(stream, None)
+            except Exception as e:  # noqa: BLE001
+                if not request.get('previous_response_id') or not ChatService._is_chain_error(e):
+                    raise
+                current_app.logger.warning('[ChatService] Kette ungültig (stream) chat=%s err=%s -> voller Verlauf', chat.id, e)
+                request = ChatService._build_reply_request(chat, chain=False)
+                key = cache_key(request) if ttl is not None else None
+                stream = client.stream_chat_response(**request)
+                first = next(stream, None)
+            events = stream if first is None else itertools.chain([first], stream)
+            final: Optional[Tuple[str, Any]] = None
+            try:
+                for event, payload in events:
+                    if event != 'delta':
+                        final = (event, payload)
+                        break
+                    yield event, payload
+            finally:
+                # Stream sofort schließen: der Ledger-Eintrag (timed_call) entsteht so noch mit
+                # Chat/Rolle-Zuordnung und echter Dauer statt erst beim Garbage Collect
+                stream.close()
+            if final is None:
+                yield 'error', 'Stream ohne Abschluss beendet'
+                return
+            event, payload = final
+            if event == 'completed':
+                if key and cacheable(payload):
+                    response_cache.put(key, payload, ttl=ttl, latency_sec=time.monotonic() - started)
+                yield 'done', ChatService._store_reply(chat, payload, request)
+            else:
+                yield 'error', payload
+
+    @staticmethod
+    def _store_reply(chat: Chat, response: Dict[str, Any], request: Dict[str, Any], cache_hit: bool = False,
+                     **fields: Any) -> Message:
+        vector_store_ids = request.get('vector_store_ids') or []
+        file_ids_final = request.get('file_ids') or []
         output_text = ChatService._extract_text_from_response(response)
+        extracted = extract_response(response)
+        usage = extract_usage(response)
+        if cache_hit:
+            # Antwort aus dem Antwort-Cache: nichts abgerechnet -> 0 Tokens an der Message und im Ledger
+            # (eigener Eintrag mit status 'cache_hit', Usage der Original-Antwort bleibt an deren Call)
+            usage = dict(usage, input_tokens=0, output_tokens=0, cached_tokens=0)
+            ledger.record('POST /responses (cache)', 'cache_hit', 0, None,
+                          {'id': response.get('id'), 'usage': {'input_tokens': 0, 'output_tokens': 0}},
+                          attribution={'chat_id': chat.id, 'project_id': chat.project_id,
+                                       'chat_role_id': fields.get('chat_role_id') or chat.chat_role_id})
         if not output_text or output_text.startswith('(Keine Antwort'):
             current_app.logger.warning(
                 "[ChatService] Leere oder fehlende Antwort extrahiert response_id=%s raw_keys=%s",
@@ -88,7 +538,14 @@ class ChatService:
             output_text = output_text.rstrip() + "\n" + "\n".join(res_suffix_lines)
         except Exception as _e:  # noqa: BLE001
             current_app.logger.debug('[ChatService] Ressourcen-Anhang Fehler %s', _e)
-        return ChatService.add_message(chat.id, "assistant", output_text, openai_response_id=response.get("id"))
+        return ChatService.add_message(
+            chat.id, "assistant", output_text, openai_response_id=response.get("id"),
+            input_tokens=usage['input_tokens'],
+            output_tokens=usage['output_tokens'],
+            cached_tokens=usage['cached_tokens'],
+            citations=json.dumps(extracted.citations) if extracted and extracted.citations else None,
+            **fields,
+        )
 
     @staticmethod
     def _extract_text_from_response(response: Dict[str, Any]) -> str:
@@ -104,6 +561,9 @@ class ChatService:
 
         oder vereinfachte Felder wie 'output_text', 'text', 'content'.
 
+        Zuerst typisierter Fast Path (nur message -> output_text, siehe response_extract);
+        der rekursive Walker greift nur, wenn dort kein Text gefunden wird.
+
         Fehlerbehandlung: Falls ein 'error' Feld existiert, wird dessen Inhalt priorisiert
         als Fehlermeldung zurückgegeben.
         """
@@ -126,6 +586,17 @@ class ChatService:
             if isinstance(err, str):
                 return f"Fehler: {err}"
 
+        # 2. Typisierter Fast Path: nur message -> output_text Parts
+        extracted = extract_response(response)
+        if extracted is not None:
+            return extracted.text
+
+        # 3. Fallback: generischer Walker über alle Strukturen
+        return ChatService._extract_text_generic(response)
+
+    @staticmethod
+    def _extract_text_generic(response: Dict[str, Any]) -> str:
+        """Rekursiver Walker über output bzw. einfache Textfelder (Fallback für unbekannte Strukturen)."""
         collected: List[str] = []
 
         def collect_from_obj(obj: Any):
@@ -158,7 +629,7 @@ class ChatService:
                     collect_from_obj(item)
                 return
 
-        # 2. Output Feld rekursiv durchsuchen
+        # Output Feld rekursiv durchsuchen
         if 'output' in response:
             collect_from_obj(response.get('output'))
             if collected:
@@ -171,7 +642,7 @@ class ChatService:
                         unique.append(t)
                 return '\n'.join(unique)
 
-        # 3. Fallback einzelne Felder direkt
+        # Fallback einzelne Felder direkt
         for key in ("output_text", "text", "content", "message"):
             v = response.get(key)
             if isinstance(v, str) and v.strip():
@@ -0,0 +1,24 @@
+from __future__ import annotations
+from typing import Iterable, List, Tuple
+import math
+
+
+def estimate_tokens(text: str | None) -> int:
+    """Grobe Token-Schätzung (~4 Zeichen je Token) ohne Tokenizer-Abhängigkeit."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def select_recent(items: Iterable[Tuple[int, int]], budget: int) -> Tuple[List[int], bool]:
+    """Wählt von (id, tokens) Paaren (neueste zuerst) so viele, wie ins Budget passen.
+
+    Liefert (ids neueste zuerst, ob ältere Einträge abgeschnitten wurden). Der neueste
+    Eintrag wird immer übernommen, auch wenn er allein das Budget überschreitet.
+    """
+    kept: List[int] = []
+    used = 0
+    for item_id, tokens in items:
+        if kept and budget and used + tokens > budget:
+            return kept, True
+        kept.append(item_id)
+        used += tokens
+    return kept, False
@@ -1,24 +1,70 @@
 from __future__ import annotations
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import os
+import threading
+import uuid
 from flask import current_app
 from ..extensions import db
 from ..models import File, VectorStore
 from .openai_client import get_openai_client
+from .chat_service import ChatService
 
 
 class FileSyncError(Exception):
     pass
 
 
+def _chunked(items: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    chunk: List[dict] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@dataclass
+class UploadProgress:
+    filename: str
+    size: int
+    sent: int = 0
+    status: str = 'queued'  # queued | uploading | done | error
+    error: Optional[str] = None
+    file_id: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        return {
+            'filename': self.filename,
+            'size': self.size,
+            'sent': self.sent,
+            'percent': int(self.sent * 100 / self.size) if self.size else (100 if self.status == 'done' else 0),
+            'status': self.status,
+            'error': self.error,
+            'file_id': self.file_id,
+        }
+
+
+# Upload-Batches des Admin Uploads (prozesslokal; Status-Abfrage muss denselben Prozess treffen)
+_MAX_BATCHES = 20
+_batches: Dict[str, List[UploadProgress]] = {}
+_batches_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+
+
 class FileService:
     @staticmethod
-    def upload_and_create(local_path: str, purpose: str = "assistants") -> File:
+    def upload_and_create(local_path: str, purpose: str = "assistants",
+                          progress: Optional[Callable[[int, int], None]] = None) -> File:
         if not os.path.isfile(local_path):
             raise FileSyncError("Datei existiert nicht")
         client = get_openai_client()
         try:
-            remote = client.upload_file(local_path, purpose=purpose)
+            remote = client.upload_file(local_path, purpose=purpose, progress=progress)
         except Exception as e:  # noqa: BLE001
             raise FileSyncError(f"Upload Fehler: {e}") from e
         f = File(
@@ -33,34 +79,35 @@ class FileService:
 
     @staticmethod
     def pull_remote(purpose: str | None = None) -> Tuple[int, int]:
+        """Remote Files seitenweise übernehmen; je Seite ein Lookup + Commit (begrenzter Speicher)."""
         client = get_openai_client()
-        try:
-            remote_files = client.list_files(purpose=purpose)
-        except Exception as e:  # noqa: BLE001
-            raise FileSyncError(f"Remote List Fehler: {e}") from e
         added = 0
         updated = 0
-        for item in remote_files:
-            rid = item.get('id')
-            if not rid:
-                continue
-            existing = File.query.filter_by(openai_file_id=rid).first()
-            if existing:
-                new_name = item.get('filename') or existing.filename
-                if existing.filename != new_name:
-                    existing.filename = new_name
-                    existing.size_bytes = item.get('bytes') or existing.size_bytes
-                    updated += 1
-            else:
-                nf = File(
-                    openai_file_id=rid,
-                    filename=item.get('filename') or 'unnamed',
-                    purpose=item.get('purpose') or 'assistants',
-                    size_bytes=item.get('bytes'),
-                )
-                db.session.add(nf)
-                added += 1
-        db.session.commit()
+        try:
+            for chunk in _chunked(client.iter_files(purpose=purpose), current_app.config.get('OPENAI_LIST_PAGE_SIZE', 100)):
+                items = {item['id']: item for item in chunk if item.get('id')}
+                existing_by_rid = {f.openai_file_id: f for f in File.query.filter(File.openai_file_id.in_(list(items))).all()}
+                for rid, item in items.items():
+                    existing = existing_by_rid.get(rid)
+                    if existing:
+                        new_name = item.get('filename') or existing.filename
+                        if existing.filename != new_name:
+                            existing.filename = new_name
+                            existing.size_bytes = item.get('bytes') or existing.size_bytes
+                            updated += 1
+                    else:
+                        nf = File(
+                            openai_file_id=rid,
+                            filename=item.get('filename') or 'unnamed',
+                            purpose=item.get('purpose') or 'assistants',
+                            size_bytes=item.get('bytes'),
+                        )
+                        db.session.add(nf)
+                        added += 1
+                db.session.commit()
+        except Exception as e:  # noqa: BLE001
+            db.session.rollback()
+            raise FileSyncError(f"Remote List Fehler (bisher übernommen: {added} neu, {updated} aktualisiert): {e}") from e
         return added, updated
 
     @staticmethod
@@ -72,6 +119,7 @@ class FileService:
             except Exception as e:  # noqa: BLE001
                 raise FileSyncError(f"Remote Delete Fehler: {e}") from e
         db.session.delete(file_obj)
+        ChatService.invalidate_resources()
         db.session.commit()
 
     @staticmethod
@@ -93,6 +141,7 @@ class FileService:
             import json as _json
             ids = {vs.openai_vector_store_id for vs in file_obj.vector_stores if vs.openai_vector_store_id}
             file_obj.vector_store_ids_cache = _json.dumps(sorted(ids)) if ids else None
+            ChatService.invalidate_resources(file_id=file_obj.id)
             db.session.commit()
         return res
 
@@ -110,4 +159,58 @@ class FileService:
             else:
                 file_obj.in_vector_store = False
                 file_obj.vector_store_ids_cache = None
+            ChatService.invalidate_resources(file_id=file_obj.id)
             db.session.commit()
+
+    # ---------------------- Batch Upload (Admin) ----------------------
+    @staticmethod
+    def start_upload_batch(local_paths: List[str], purpose: str = "assistants") -> str:
+        """Mehrere Dateien im Hintergrund hochladen (begrenzter Thread Pool); liefert Batch ID für den Status."""
+        global _pool, _pool_pid
+        app = current_app._get_current_object()
+        batch_id = uuid.uuid4().hex[:12]
+        items = [UploadProgress(filename=os.path.basename(p), size=os.path.getsize(p)) for p in local_paths]
+        with _batches_lock:
+            _batches[batch_id] = items
+            while len(_batches) > _MAX_BATCHES:
+                _batches.pop(next(iter(_batches)))
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(
+                    max_workers=max(1, app.config.get('OPENAI_UPLOAD_FILE_CONCURRENCY', 3)),
+                    thread_name_prefix='orquestrix-file-upload',
+                )
+                _pool_pid = os.getpid()
+            pool = _pool
+        for path, item in zip(local_paths, items):
+            pool.submit(FileService._upload_one, app, path, item, purpose)
+        return batch_id
+
+    @staticmethod
+    def upload_batch_status(batch_id: str) -> Optional[List[dict]]:
+        with _batches_lock:
+            items = _batches.get(batch_id)
+        return [i.as_dict() for i in items] if items is not None else None
+
+    @staticmethod
+    def _upload_one(app, local_path: str, item: UploadProgress, purpose: str) -> None:
+        def _progress(sent: int, total: int) -> None:
+            item.sent = sent
+
+        with app.app_context():
+            item.status = 'uploading'
+            try:
+                f = FileService.upload_and_create(local_path, purpose=purpose, progress=_progress)
+            except Exception as e:  # noqa: BLE001
+                db.session.rollback()
+                item.status = 'error'
+                item.error = str(e)
+                app.logger.warning('[FileService] Upload %s fehlgeschlagen: %s', item.filename, e)
+                return
+            item.sent = item.size
+            item.file_id = f.id
+            item.status = 'done'
+            try:
+                os.remove(local_path)
+                os.rmdir(os.path.dirname(local_path))  # nur wenn Batch-Verzeichnis leer
+            except OSError:
+                pass
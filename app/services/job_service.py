@@ -0,0 +1,415 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from flask import current_app
+from sqlalchemy import func
+from ..extensions import db
+from ..models import Job, Chat, ChatBatch, Message, ProjectRun, WorkerBatch, WorkerLog
+from .batch_service import BatchService, TERMINAL as BATCH_TERMINAL
+from .chat_service import ChatService
+from .pipeline_service import PipelineService
+from .worker_batch_service import WorkerBatchService
+from .worker_service import WorkerService, WorkerServiceError
+
+
+class JobError(Exception):
+    """Dauerhafter Fehler: Job wird ohne weiteren Versuch als failed markiert."""
+    pass
+
+
+class JobDeferred(Exception):
+    """Noch nicht fertig (Run läuft, Thread belegt): derselbe Job läuft nach ``delay_sec`` erneut.
+
+    Zählt nicht als Fehlversuch und legt keine neue Job Zeile an.
+    """
+
+    def __init__(self, delay_sec: float = 0, result: Optional[Dict[str, Any]] = None):
+        super().__init__(f'erneut in {delay_sec}s')
+        self.delay_sec = delay_sec
+        self.result = result
+
+
+# kind -> Handler(payload) -> optionales Ergebnis (JSON-fähig)
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = {}
+# kind -> Callback(payload, Fehlertext), wenn ein Job endgültig fehlschlägt
+JOB_FAILURE_HANDLERS: Dict[str, Callable[[Dict[str, Any], str], None]] = {}
+_ACTIVE = ('queued', 'running')
+# IDs der Jobs, die dieser Prozess gerade ausführt (Heartbeat erneuert nur diese)
+_executing: set = set()
+_executing_lock = threading.Lock()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def job_handler(kind: str, on_failure: Optional[Callable[[Dict[str, Any], str], None]] = None):
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        if on_failure is not None:
+            JOB_FAILURE_HANDLERS[kind] = on_failure
+        return fn
+    return register
+
+
+class JobService:
+    @staticmethod
+    def enqueue(kind: str, payload: Optional[Dict[str, Any]] = None, chat_id: Optional[int] = None,
+                max_attempts: Optional[int] = None, delay_sec: float = 0) -> Job:
+        if kind not in JOB_HANDLERS:
+            raise JobError(f"Unbekannter Job Typ: {kind}")
+        job = Job(
+            kind=kind,
+            payload=json.dumps(payload or {}),
+            chat_id=chat_id,
+            max_attempts=max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 3),
+            run_after=datetime.utcnow() + timedelta(seconds=delay_sec),
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def active_for_chat(chat_id: int, kind: Optional[str] = 'chat_reply') -> Optional[Job]:
+        """Wartender oder laufender Job des Chats (``kind=None``: Antwort oder Fan-out)."""
+        query = Job.query.filter(Job.chat_id == chat_id, Job.status.in_(_ACTIVE))
+        if kind:
+            query = query.filter(Job.kind == kind)
+        return query.order_by(Job.id.desc()).first()
+
+    @staticmethod
+    def latest_for_chat(chat_id: int, kind: Optional[str] = None) -> Optional[Job]:
+        """Neuester Job des Chats (ohne ``kind``: Antwort oder Fan-out)."""
+        query = Job.query.filter(Job.chat_id == chat_id)
+        if kind:
+            query = query.filter(Job.kind == kind)
+        return query.order_by(Job.id.desc()).first()
+
+    @staticmethod
+    def claim(worker_name: str) -> Optional[Job]:
+        """Nächsten fälligen Job atomar übernehmen (Compare-and-Set auf status, portabel für SQLite/Postgres)."""
+        now = datetime.utcnow()
+        candidates = (db.session.query(Job.id)
+                      .filter(Job.status == 'queued', Job.run_after <= now)
+                      .order_by(Job.run_after.asc(), Job.id.asc())
+                      .limit(10).all())
+        for (job_id,) in candidates:
+            claimed = (Job.query.filter(Job.id == job_id, Job.status == 'queued')
+                       .update({'status': 'running', 'locked_by': worker_name, 'locked_at': now,
+                                'attempts': Job.attempts + 1}, synchronize_session=False))
+            db.session.commit()
+            if claimed:
+                return Job.query.get(job_id)
+        return None
+
+    @staticmethod
+    def run(job: Job) -> None:
+        """Führt einen übernommenen Job aus und setzt done / queued (Retry mit Backoff) / failed."""
+        handler = JOB_HANDLERS.get(job.kind)
+        started = time.monotonic()
+        try:
+            if handler is None:
+                raise JobError(f"Unbekannter Job Typ: {job.kind}")
+            result = handler(json.loads(job.payload or '{}'))
+        except JobDeferred as d:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=d.delay_sec)
+            job.attempts = max(0, job.attempts - 1)
+            job.result = json.dumps(d.result) if d.result is not None else None
+            job.error = None
+            job.locked_by = None
+            db.session.commit()
+            return
+        except Exception as e:  # noqa: BLE001
+            db.session.rollback()
+            job = Job.query.get(job.id)
+            job.error = str(e)[:2000]
+            if isinstance(e, JobError) or job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+            else:
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + timedelta(seconds=min(300, 5 * 2 ** (job.attempts - 1)))
+            job.locked_by = None
+            db.session.commit()
+            current_app.logger.warning('[Jobs] %s #%s Versuch %s/%s -> %s err=%s', job.kind, job.id,
+                                       job.attempts, job.max_attempts, job.status, e)
+            if job.status == 'failed':
+                JobService._notify_failure(job)
+            return
+        job.status = 'done'
+        job.result = json.dumps(result) if result is not None else None
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.info('[Jobs] %s #%s done in %.2fs', job.kind, job.id, time.monotonic() - started)
+
+    @staticmethod
+    def requeue_stale(lock_timeout_sec: float) -> int:
+        """Jobs eines abgestürzten Workers (running, Lock älter als Timeout) wieder einreihen."""
+        cutoff = datetime.utcnow() - timedelta(seconds=lock_timeout_sec)
+        stale = Job.query.filter(Job.status == 'running', Job.locked_at < cutoff).all()
+        return JobService._requeue(stale, 'Worker Lock abgelaufen')
+
+    @staticmethod
+    def heartbeat() -> int:
+        """``locked_at`` der Jobs erneuern, die dieser Prozess gerade ausführt, damit lange Handler
+        (o3-pro Antworten, Worker Runs) nicht von ``requeue_stale`` ein zweites Mal vergeben werden."""
+        with _executing_lock:
+            job_ids = list(_executing)
+        if not job_ids:
+            return 0
+        refreshed = (Job.query.filter(Job.id.in_(job_ids), Job.status == 'running')
+                     .update({'locked_at': datetime.utcnow()}, synchronize_session=False))
+        db.session.commit()
+        return refreshed
+
+    @staticmethod
+    def requeue_orphaned(owner: str) -> int:
+        """Beim Start: running Jobs toter Prozesse dieses Hosts sofort wieder einreihen (ohne Lock-Timeout).
+
+        ``owner`` ist host:pid:token dieses Prozesses. Ein Job mit gleicher PID, aber anderem
+        Token stammt von einem früheren Start (Container: PID 1 nach Neustart) und ist verwaist.
+        """
+        host = socket.gethostname()
+        orphaned = []
+        for job in Job.query.filter(Job.status == 'running', Job.locked_by.like(f'{host}:%')).all():
+            if job.locked_by.startswith(f'{owner}:'):
+                continue
+            try:
+                pid = int(job.locked_by.split(':')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid == os.getpid() or not _pid_alive(pid):
+                orphaned.append(job)
+        return JobService._requeue(orphaned, 'Worker Prozess beendet')
+
+    @staticmethod
+    def _requeue(jobs: List[Job], reason: str) -> int:
+        failed = []
+        for job in jobs:
+            job.locked_by = None
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.error = reason
+                job.finished_at = datetime.utcnow()
+                failed.append(job)
+            else:
+                job.status = 'queued'
+                job.run_after = datetime.utcnow()
+        if jobs:
+            db.session.commit()
+            current_app.logger.warning('[Jobs] %s verwaiste Jobs zurückgesetzt (%s)', len(jobs), reason)
+        for job in failed:
+            JobService._notify_failure(job)
+        return len(jobs)
+
+    @staticmethod
+    def _notify_failure(job: Job) -> None:
+        callback = JOB_FAILURE_HANDLERS.get(job.kind)
+        if callback is None:
+            return
+        try:
+            callback(json.loads(job.payload or '{}'), job.error or 'Job fehlgeschlagen')
+        except Exception as e:  # noqa: BLE001
+            db.session.rollback()
+            current_app.logger.warning('[Jobs] Fehler-Callback %s #%s: %s', job.kind, job.id, e)
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        rows = db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+        counts = {status: 0 for status in ('queued', 'running', 'done', 'failed')}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    @staticmethod
+    def work(app, concurrency: int = 1, poll_interval: float = 1.0, once: bool = False,
+             stop: Optional[threading.Event] = None) -> None:
+        """Worker-Schleife mit ``concurrency`` Threads; ``once`` beendet, sobald keine Jobs mehr fällig sind."""
+        stop = stop or threading.Event()
+        lock_timeout = app.config.get('JOB_LOCK_TIMEOUT', 600)
+        # Token je Start: gleicher Host und gleiche PID nach Container-Neustart bleiben unterscheidbar
+        base = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        with app.app_context():
+            # Nach Neustart: Jobs (z.B. laufende Worker Runs) sofort fortsetzen statt Lock-Timeout abzuwarten
+            JobService.requeue_orphaned(base)
+            db.session.remove()
+
+        def loop(index: int) -> None:
+            name = f"{base}:{index}"
+            last_sweep = 0.0
+            with app.app_context():
+                while not stop.is_set():
+                    try:
+                        if index == 0 and time.monotonic() - last_sweep > 30:
+                            JobService.requeue_stale(lock_timeout)
+                            last_sweep = time.monotonic()
+                        job = JobService.claim(name)
+                        if job is None:
+                            if once:
+                                return
+                            stop.wait(poll_interval)
+                            continue
+                        with _executing_lock:
+                            _executing.add(job.id)
+                        try:
+                            JobService.run(job)
+                        finally:
+                            with _executing_lock:
+                                _executing.discard(job.id)
+                    except Exception as e:  # noqa: BLE001
+                        db.session.rollback()
+                        app.logger.warning('[Jobs] Worker %s Fehler: %s', name, e)
+                        stop.wait(poll_interval)
+                    finally:
+                        db.session.remove()
+
+        finished = threading.Event()
+
+        def beat() -> None:
+            # Lock der eigenen laufenden Jobs regelmäßig erneuern (deutlich unter JOB_LOCK_TIMEOUT)
+            interval = max(1.0, lock_timeout / 4)
+            with app.app_context():
+                while not finished.wait(interval) and not stop.is_set():
+                    try:
+                        JobService.heartbeat()
+                    except Exception as e:  # noqa: BLE001
+                        db.session.rollback()
+                        app.logger.warning('[Jobs] Heartbeat Fehler: %s', e)
+                    finally:
+                        db.session.remove()
+
+        threads: List[threading.Thread] = [
+            threading.Thread(target=loop, args=(i,), name=f'orquestrix-job-{i}', daemon=True)
+            for i in range(max(1, concurrency))
+        ]
+        heartbeat = threading.Thread(target=beat, name='orquestrix-job-heartbeat', daemon=True)
+        for t in threads + [heartbeat]:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+        finally:
+            finished.set()
+
+
+# ---------------------- Handler ----------------------
+@job_handler('chat_reply')
+def _chat_reply(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    chat = Chat.query.get(payload.get('chat_id'))
+    if not chat:
+        raise JobError("Chat existiert nicht mehr")
+    last = chat.messages.order_by(Message.created_at.desc(), Message.id.desc()).first()
+    if not last or last.role != 'user':
+        # Bereits beantwortet (z.B. doppelt eingereiht) -> kein zweiter Model Call
+        return {'skipped': True}
+    msg = ChatService.generate_assistant_reply(chat)
+    return {'message_id': msg.id}
+
+
+@job_handler('chat_fanout')
+def _chat_fanout(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    chat = Chat.query.get(payload.get('chat_id'))
+    if not chat:
+        raise JobError("Chat existiert nicht mehr")
+    group = payload['group']
+    # Bei Retry nur Rollen ohne gespeicherte Antwort erneut fragen
+    answered = {m.chat_role_id for m in chat.messages.filter(Message.fanout_group == group, Message.role == 'assistant')}
+    role_ids = [rid for rid in payload.get('role_ids') or [] if rid not in answered]
+    if not role_ids:
+        return {'skipped': True}
+    msgs = ChatService.answer_fan_out(chat, group, role_ids)
+    return {'message_ids': [m.id for m in msgs]}
+
+
+@job_handler('chat_batch_poll')
+def _chat_batch_poll(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    batch = ChatBatch.query.get(payload.get('batch_id'))
+    if not batch:
+        raise JobError("Batch existiert nicht mehr")
+    BatchService.refresh(batch)
+    result = {'status': batch.status, 'completed': batch.completed, 'failed': batch.failed}
+    if batch.status not in BATCH_TERMINAL:
+        # Batch läuft noch -> derselbe Job später erneut (zählt nicht als Fehlversuch)
+        raise JobDeferred(current_app.config.get('BATCH_POLL_INTERVAL', 60), result)
+    return result
+
+
+def _next_stages(log: WorkerLog) -> None:
+    """Nach Abschluss eines Logs: Pipeline Folgestufen bzw. wartende Batch Einträge einreihen."""
+    if log.project_run is not None and log.project_run.pipeline_id:
+        JobService.enqueue('pipeline_advance', {'project_run_id': log.project_run_id})
+    if log.worker_batch is not None:
+        dispatch_worker_batch(log.worker_batch)
+
+
+def dispatch_worker_batch(batch: WorkerBatch) -> int:
+    """Freie Plätze eines Worker Batches mit worker_run Jobs belegen; Anzahl gestarteter Einträge."""
+    queued = WorkerBatchService.dispatch(batch)
+    for log in queued:
+        JobService.enqueue('worker_run', {'log_id': log.id})
+    return len(queued)
+
+
+@job_handler('pipeline_advance')
+def _pipeline_advance(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    run = ProjectRun.query.get(payload.get('project_run_id'))
+    if not run or not run.pipeline:
+        raise JobError("Pipeline Run existiert nicht mehr")
+    queued = PipelineService.advance(run)
+    for log in queued:
+        JobService.enqueue('worker_run', {'log_id': log.id})
+    return {'queued': [log.id for log in queued]}
+
+
+def _worker_run_failed(payload: Dict[str, Any], error: str) -> None:
+    log = WorkerLog.query.get(payload.get('log_id'))
+    if log and log.state not in ('done', 'failed'):
+        WorkerService.fail(log, error)
+        _next_stages(log)
+
+
+@job_handler('worker_run', on_failure=_worker_run_failed)
+def _worker_run(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    log = WorkerLog.query.get(payload.get('log_id'))
+    if not log:
+        raise JobError("Worker Log existiert nicht mehr")
+    if log.state in ('done', 'failed'):
+        _next_stages(log)  # z.B. Absturz nach Abschluss, vor dem Einreihen der Folgestufen
+        return {'skipped': True}
+    if not WorkerService.acquire(log):
+        # Thread des Workers belegt oder Parallelitätslimit (Projekt-Run / Batch) erreicht -> später erneut
+        raise JobDeferred(current_app.config.get('WORKER_RUN_WAIT', 5), {'waiting': True})
+    try:
+        # Zeitscheibe < JOB_LOCK_TIMEOUT, damit laufende Jobs nicht als verwaist gelten
+        finished = WorkerService.execute(log, poll_timeout=current_app.config.get('WORKER_RUN_POLL_SLICE', 240))
+    except WorkerServiceError as e:
+        raise JobError(str(e)) from e
+    except Exception as e:  # noqa: BLE001
+        db.session.rollback()
+        log = WorkerLog.query.get(log.id)
+        log.error = str(e)[:2000]  # Retry setzt den vorhandenen Run fort
+        db.session.commit()
+        raise
+    if not finished:
+        # Run läuft noch -> derselbe Job pollt den Run in der nächsten Zeitscheibe weiter
+        raise JobDeferred(0, {'state': log.state, 'run_status': log.run_status})
+    _next_stages(log)
+    return {'state': log.state, 'run_status': log.run_status}
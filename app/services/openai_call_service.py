@@ -0,0 +1,159 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import math
+from sqlalchemy import func
+from ..models import OpenAICall, Chat, ChatRole, Worker, Project
+
+
+def percentile(sorted_values: List[int], pct: float) -> Optional[int]:
+    """Nearest-rank Perzentil einer sortierten Liste."""
+    if not sorted_values:
+        return None
+    idx = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+class OpenAICallService:
+    @staticmethod
+    def _latency_stats(values: List[int]) -> Dict[str, Optional[int]]:
+        values = sorted(v for v in values if v is not None)
+        return {
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1] if values else None,
+        }
+
+    @staticmethod
+    def summary(hours: int = 24, top: int = 10) -> Dict[str, Any]:
+        since = datetime.utcnow() - timedelta(hours=hours)
+        base = OpenAICall.query.filter(OpenAICall.created_at >= since)
+
+        totals = base.with_entities(
+            func.count(OpenAICall.id),
+            func.sum(OpenAICall.input_tokens),
+            func.sum(OpenAICall.output_tokens),
+            func.sum(OpenAICall.cached_tokens),
+            func.sum(OpenAICall.cost_usd),
+        ).one()
+        errors = base.filter((OpenAICall.http_status >= 400) | (OpenAICall.status.in_(('error', 'failed', 'circuit_open')))).count()
+
+        # Latenzen je Endpoint / Modell (Perzentile in Python, Fenster ist begrenzt)
+        by_endpoint: Dict[str, Dict[str, Any]] = {}
+        by_model: Dict[str, Dict[str, Any]] = {}
+        rows = base.with_entities(
+            OpenAICall.endpoint, OpenAICall.model, OpenAICall.latency_ms, OpenAICall.attempts,
+            OpenAICall.status, OpenAICall.http_status, OpenAICall.input_tokens, OpenAICall.output_tokens,
+            OpenAICall.cached_tokens, OpenAICall.cost_usd, OpenAICall.queue_ms, OpenAICall.run_ms,
+        ).all()
+        queue_vals: List[int] = []
+        run_vals: List[int] = []
+        for r in rows:
+            ep = by_endpoint.setdefault(r.endpoint, {'calls': 0, 'errors': 0, 'retries': 0, 'lat': []})
+            ep['calls'] += 1
+            ep['retries'] += max(0, (r.attempts or 1) - 1)
+            if (r.http_status or 0) >= 400 or r.status in ('error', 'failed', 'circuit_open'):
+                ep['errors'] += 1
+            ep['lat'].append(r.latency_ms)
+            if r.model:
+                m = by_model.setdefault(r.model, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cost_usd': 0.0, 'lat': []})
+                m['calls'] += 1
+                m['input_tokens'] += r.input_tokens or 0
+                m['output_tokens'] += r.output_tokens or 0
+                m['cached_tokens'] += r.cached_tokens or 0
+                m['cost_usd'] += r.cost_usd or 0.0
+                m['lat'].append(r.latency_ms)
+            if r.queue_ms is not None:
+                queue_vals.append(r.queue_ms)
+            if r.run_ms is not None:
+                run_vals.append(r.run_ms)
+        for d in list(by_endpoint.values()) + list(by_model.values()):
+            d.update(OpenAICallService._latency_stats(d.pop('lat')))
+
+        return {
+            'hours': hours,
+            'calls': totals[0] or 0,
+            'errors': errors,
+            'input_tokens': totals[1] or 0,
+            'output_tokens': totals[2] or 0,
+            'cached_tokens': totals[3] or 0,
+            'cost_usd': round(totals[4] or 0.0, 4),
+            'endpoints': sorted(by_endpoint.items(), key=lambda kv: -kv[1]['calls']),
+            'models': sorted(by_model.items(), key=lambda kv: -kv[1]['cost_usd']),
+            'runs': {
+                'queue': OpenAICallService._latency_stats(queue_vals),
+                'run': OpenAICallService._latency_stats(run_vals),
+                'count': len(run_vals),
+            },
+            'top_chats': OpenAICallService._top(base, OpenAICall.chat_id, Chat, 'title', top),
+            'top_workers': OpenAICallService._top(base, OpenAICall.worker_id, Worker, 'name', top),
+            'top_projects': OpenAICallService._top(base, OpenAICall.project_id, Project, 'name', top),
+            'roles': OpenAICallService.prompt_cache_by_role(hours),
+        }
+
+    @staticmethod
+    def prompt_cache_by_role(hours: int = 24) -> List[Dict[str, Any]]:
+        """Input Tokens und davon vom Provider gecachte Tokens je Chat Rolle (Prompt Caching)."""
+        since = datetime.utcnow() - timedelta(hours=hours)
+        rows = (
+            OpenAICall.query
+            .filter(OpenAICall.created_at >= since, OpenAICall.chat_role_id.isnot(None), OpenAICall.input_tokens.isnot(None))
+            .with_entities(
+                OpenAICall.chat_role_id,
+                func.count(OpenAICall.id),
+                func.sum(OpenAICall.input_tokens),
+                func.sum(OpenAICall.cached_tokens),
+            )
+            .group_by(OpenAICall.chat_role_id)
+            .all()
+        )
+        names = {}
+        if rows:
+            names = {r.id: r.name for r in ChatRole.query.filter(ChatRole.id.in_([row[0] for row in rows])).all()}
+        result = [
+            {
+                'id': r[0],
+                'name': names.get(r[0], f'#{r[0]} (gelöscht)'),
+                'calls': r[1],
+                'input_tokens': r[2] or 0,
+                'cached_tokens': r[3] or 0,
+                'cached_share': round((r[3] or 0) / r[2], 3) if r[2] else None,
+            }
+            for r in rows
+        ]
+        return sorted(result, key=lambda d: -d['input_tokens'])
+
+    @staticmethod
+    def _top(base, column, model, label_attr: str, limit: int) -> List[Dict[str, Any]]:
+        rows = (
+            base.filter(column.isnot(None))
+            .with_entities(
+                column,
+                func.count(OpenAICall.id),
+                func.sum(OpenAICall.latency_ms),
+                func.sum(OpenAICall.input_tokens),
+                func.sum(OpenAICall.output_tokens),
+                func.sum(OpenAICall.cost_usd),
+            )
+            .group_by(column)
+            .order_by(func.coalesce(func.sum(OpenAICall.cost_usd), 0).desc(), func.sum(OpenAICall.latency_ms).desc())
+            .limit(limit)
+            .all()
+        )
+        ids = [r[0] for r in rows]
+        names = {}
+        if ids:
+            names = {o.id: getattr(o, label_attr) for o in model.query.filter(model.id.in_(ids)).all()}
+        return [
+            {
+                'id': r[0],
+                'name': names.get(r[0], f'#{r[0]} (gelöscht)'),
+                'calls': r[1],
+                'latency_sec': round((r[2] or 0) / 1000, 1),
+                'input_tokens': r[3] or 0,
+                'output_tokens': r[4] or 0,
+                'cost_usd': round(r[5] or 0.0, 4),
+            }
+            for r in rows
+        ]
@@ -1,20 +1,63 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from openai import OpenAI
 import openai as openai_pkg  # für Versionsinfo
+import atexit
+import httpx
+import mimetypes
 import os
+import threading
 import time
+from .poller import AdaptivePoller, status_attr
+from .resilience import ResilientTransport
+from .call_ledger import ledger, timed_call
+from .prompt_builder import build_prompt
+
+
+# Kompakte Felder für List-Endpunkte (statt to_dict/dir() je Item)
+FILE_FIELDS = ('id', 'filename', 'purpose', 'bytes', 'created_at', 'status')
+VECTOR_STORE_FIELDS = ('id', 'name', 'status', 'usage_bytes', 'created_at')
+VECTOR_STORE_FILE_FIELDS = ('id', 'vector_store_id', 'status', 'usage_bytes', 'created_at')
+# Vector Store Endpunkte erlauben max. 100 Items pro Seite
+_VECTOR_STORE_PAGE_MAX = 100
+# Uploads API: max. 64 MB je Part
+_UPLOAD_PART_MAX = 64 * 1024 * 1024
+
+
+def compact_item(item: Any, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """SDK Objekt oder dict auf die angegebenen Felder reduzieren."""
+    if isinstance(item, dict):
+        return {f: item.get(f) for f in fields}
+    return {f: getattr(item, f, None) for f in fields}
+
+
+def client_credentials(config) -> Tuple[str, Optional[str]]:
+    """(api_key, base_url); gegen einen lokalen Stand-in (OPENAI_BASE_URL) genügt ein Platzhalter-Key."""
+    base_url = config.get('OPENAI_BASE_URL') or None
+    api_key = config.get('OPENAI_API_KEY', '') or ('sk-local' if base_url else '')
+    return api_key, base_url
 
 
 class OpenAIClientWrapper:
     """Wrapper kapselt OpenAI Aufrufe (Responses, Threads, Assistants)."""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY fehlt (nicht in .env gesetzt)")
         try:
             timeout = current_app.config.get('OPENAI_REQUEST_TIMEOUT', 60)
-            self._client = OpenAI(api_key=api_key, timeout=timeout)
+            # Eigener httpx Client: Keep-Alive Pool wird über alle Aufrufe des Prozesses geteilt
+            limits = httpx.Limits(
+                max_connections=current_app.config.get('OPENAI_MAX_CONNECTIONS', 20),
+                max_keepalive_connections=current_app.config.get('OPENAI_KEEPALIVE', 10),
+                keepalive_expiry=current_app.config.get('OPENAI_KEEPALIVE_EXPIRY', 30.0),
+            )
+            # Retries/Circuit Breaker zentral im Transport (SDK-eigene Retries aus, sonst doppelte Stürme)
+            transport = ResilientTransport(httpx.HTTPTransport(limits=limits), observer=ledger.observe)
+            self._http_client = httpx.Client(timeout=timeout, transport=transport)
+            self._client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, http_client=self._http_client, max_retries=0)
+            self._pid = os.getpid()
         except TypeError as e:
             # Workaround für seltenen proxies Param Fehler durch Versions-Mismatch
             if 'proxies' in str(e):
@@ -27,8 +70,35 @@ class OpenAIClientWrapper:
     def raw(self) -> OpenAI:
         return self._client
 
+    def close(self) -> None:
+        """Schließt den HTTP Pool (nur im erzeugenden Prozess, Sockets nach fork nicht anfassen)."""
+        if self._pid != os.getpid():
+            return
+        try:
+            self._client.close()
+        except Exception:  # noqa: BLE001
+            pass
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Momentaufnahme des Connection Pools (für Health Checks)."""
+        stats: Dict[str, Any] = {'pid': self._pid}
+        try:
+            pool = self._http_client._transport._inner._pool  # type: ignore[attr-defined]
+            conns = list(pool.connections)
+            stats.update({
+                'connections': len(conns),
+                'idle': sum(1 for c in conns if c.is_idle()),
+                'active': sum(1 for c in conns if not c.is_idle() and not c.is_closed()),
+                'max_connections': pool._max_connections,
+                'max_keepalive': pool._max_keepalive_connections,
+                'keepalive_expiry': pool._keepalive_expiry,
+            })
+        except Exception as e:  # noqa: BLE001
+            stats['error'] = str(e)
+        return stats
+
     # ---------------------- Chat (Responses API) ----------------------
-    def create_chat_response(
+    def _build_response_kwargs(
         self,
         instructions: str,
         model: str,
@@ -36,14 +106,13 @@ class OpenAIClientWrapper:
         max_output_tokens: int = 1024,
         vector_store_ids: Optional[List[str]] = None,
         file_ids: Optional[List[str]] = None,
+        previous_response_id: Optional[str] = None,
     ) -> Dict[str, Any]:
-        # Tools: Nur file_search einbinden, wenn Vector Stores vorhanden (Struktur laut Vorgabe)
-        tools: List[Dict[str, Any]] = []
-        if vector_store_ids:
-            tools.append({
-                "type": "file_search",
-                "vector_store_ids": vector_store_ids,
-            })
+        """Gemeinsamer Request-Aufbau für responses.create (blockierend und Streaming)."""
+        # Kanonische Reihenfolge (stabiler Präfix für Prompt Caching); file_search nur mit Vector Stores
+        prompt = build_prompt(instructions, messages, vector_store_ids, file_ids)
+        tools = prompt["tools"]
+        vector_store_ids, file_ids = prompt["vector_store_ids"], prompt["file_ids"]
         current_app.logger.info(
             "[OpenAI] responses.create model=%s tokens=%s vectors=%s files=%s tools=%s",
             model,
@@ -52,26 +121,19 @@ class OpenAIClientWrapper:
             file_ids,
             len(tools),
         )
-        # Prompt-Anreicherung als Übergangslösung
-        if vector_store_ids or file_ids:
-            resource_note = "\n\n[Kontext Ressourcen]\n" + \
-                (f"VectorStores: {', '.join(vector_store_ids)}\n" if vector_store_ids else "") + \
-                (f"Files: {', '.join(file_ids)}\n" if file_ids else "")
-            instructions = (instructions + resource_note) if instructions else resource_note
-
         kwargs: Dict[str, Any] = dict(
             model=model,
-            instructions=instructions or "",
+            instructions=prompt["instructions"],
             max_output_tokens=max_output_tokens,
             parallel_tool_calls=True if tools else False,
-            input=[
-                {"role": m.get("role", "user"), "content": m.get("content")}
-                for m in messages
-            ],
+            input=prompt["input"],
         )
         if tools:
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
+        if previous_response_id:
+            # Verlauf liegt serverseitig, input enthält nur die neuen Turns
+            kwargs["previous_response_id"] = previous_response_id
         # Detail Logging Payload (ohne evtl. große Inhalte abschneiden)
         try:
             preview_messages = [m.copy() for m in kwargs["input"]]
@@ -89,29 +151,38 @@ class OpenAIClientWrapper:
                 "tool_choice": kwargs.get("tool_choice"),
                 "vector_store_ids": vector_store_ids,
                 "file_ids": file_ids,
+                "previous_response_id": previous_response_id,
             }
             current_app.logger.debug("[OpenAI] request_payload=%s", log_payload)
         except Exception as e:  # noqa: BLE001
             current_app.logger.warning("[OpenAI] request logging failed: %s", e)
+        return kwargs
+
+    def create_chat_response(
+        self,
+        instructions: str,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_output_tokens: int = 1024,
+        vector_store_ids: Optional[List[str]] = None,
+        file_ids: Optional[List[str]] = None,
+        previous_response_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        kwargs = self._build_response_kwargs(
+            instructions, model, messages, max_output_tokens, vector_store_ids, file_ids, previous_response_id
+        )
         timeout = current_app.config.get('OPENAI_REQUEST_TIMEOUT', 60)
         response = self._client.responses.create(timeout=timeout, **kwargs)
-        # Polling bis status == 'completed' oder Timeout
-        poll_interval = current_app.config.get('OPENAI_POLL_INTERVAL', 1.0)
-        poll_timeout = current_app.config.get('OPENAI_POLL_TIMEOUT', 120)
+        # Adaptives Polling bis terminaler Status oder Deadline
         start_ts = time.time()
         rid = getattr(response, 'id', None) or (response.get('id') if isinstance(response, dict) else None)
-        status = getattr(response, 'status', None) or (response.get('status') if isinstance(response, dict) else None)
-        while rid and status and status not in ('completed', 'failed', 'cancelled') and (time.time() - start_ts) < poll_timeout:
-            time.sleep(poll_interval)
+        if rid and status_attr(response):
+            poller = AdaptivePoller.from_config('responses.retrieve')
             try:
-                polled = self._client.responses.retrieve(rid)
-                status = getattr(polled, 'status', None) or (polled.get('status') if isinstance(polled, dict) else None)
-                if status:
-                    current_app.logger.debug('[OpenAI] poll response id=%s status=%s', rid, status)
-                response = polled
+                response = poller.run(lambda: self._client.responses.retrieve(rid), status_attr, initial=response)
             except Exception as e:  # noqa: BLE001
                 current_app.logger.warning('[OpenAI] polling error id=%s err=%s', rid, e)
-                break
+                response = poller.last
         # Abschluss-Logging
         try:
             rdict = response.to_dict() if hasattr(response, 'to_dict') else response  # type: ignore
@@ -127,6 +198,68 @@ class OpenAIClientWrapper:
             current_app.logger.warning('[OpenAI] final response logging failed: %s', e)
         return response.to_dict() if hasattr(response, 'to_dict') else response  # type: ignore
 
+    def stream_chat_response(
+        self,
+        instructions: str,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_output_tokens: int = 1024,
+        vector_store_ids: Optional[List[str]] = None,
+        file_ids: Optional[List[str]] = None,
+        previous_response_id: Optional[str] = None,
+    ) -> Iterator[Tuple[str, Any]]:
+        """Streaming Variante von create_chat_response (stream=True, kein Polling).
+
+        Liefert Tupel (event, payload):
+        - ('delta', str)      Text-Fragment sobald es eintrifft
+        - ('completed', dict) finale Response (wie create_chat_response)
+        - ('error', str)      Abbruch durch API Fehler
+        """
+        kwargs = self._build_response_kwargs(
+            instructions, model, messages, max_output_tokens, vector_store_ids, file_ids, previous_response_id
+        )
+        timeout = current_app.config.get('OPENAI_REQUEST_TIMEOUT', 60)
+        start_ts = time.time()
+        # SSE Body sieht der Transport nicht -> Ledger-Eintrag hier mit finaler Response
+        with timed_call('POST /responses (stream)') as call:
+            yield from self._iter_stream(kwargs, timeout, start_ts, call)
+
+    def _iter_stream(self, kwargs: Dict[str, Any], timeout: float, start_ts: float,
+                     call: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        first_delta_ts: Optional[float] = None
+        stream = self._client.responses.create(timeout=timeout, stream=True, **kwargs)
+        try:
+            for event in stream:
+                etype = getattr(event, 'type', None)
+                if etype == 'response.output_text.delta':
+                    if first_delta_ts is None:
+                        first_delta_ts = time.time()
+                        current_app.logger.debug('[OpenAI] stream first_token_sec=%s', round(first_delta_ts - start_ts, 2))
+                    yield 'delta', getattr(event, 'delta', '') or ''
+                elif etype in ('response.completed', 'response.failed', 'response.incomplete'):
+                    response = getattr(event, 'response', None)
+                    rdict = response.to_dict() if hasattr(response, 'to_dict') else (response or {})
+                    current_app.logger.debug(
+                        '[OpenAI] stream final id=%s status=%s duration_sec=%s',
+                        rdict.get('id'), rdict.get('status'), round(time.time() - start_ts, 2),
+                    )
+                    call['body'] = rdict
+                    call['status'] = str(rdict.get('status') or 'ok')
+                    yield 'completed', rdict
+                    return
+                elif etype == 'error':
+                    msg = getattr(event, 'message', None) or 'Stream Fehler'
+                    current_app.logger.warning('[OpenAI] stream error %s', msg)
+                    call['status'] = 'error'
+                    call['error'] = msg
+                    yield 'error', msg
+                    return
+        finally:
+            try:
+                stream.close()
+            except Exception:  # noqa: BLE001
+                pass
+
     def list_models(self) -> List[str]:
         current_app.logger.info("[OpenAI] models.list aufgerufen (python sdk version=%s)", getattr(openai_pkg, '__version__', 'unknown'))
         models = self._client.models.list()
@@ -134,23 +267,44 @@ class OpenAIClientWrapper:
         ids = [getattr(m, 'id', None) for m in data if getattr(m, 'id', None)]
         return ids
 
+    # ---------------------- Pagination ----------------------
+    def _paginate(self, label: str, list_fn, page_size: int, fields: Tuple[str, ...], **params) -> Iterator[Dict[str, Any]]:
+        """Generator über alle Seiten eines Cursor-Endpunkts (``after`` = letzte ID der Seite).
+
+        Es liegt immer nur eine Seite im Speicher; Fehler treten erst beim Iterieren auf.
+        """
+        after: Optional[str] = None
+        pages = 0
+        items = 0
+        while True:
+            kwargs = dict(params, limit=page_size)
+            if after:
+                kwargs['after'] = after
+            page = list_fn(**kwargs)
+            data = getattr(page, 'data', None) or []
+            pages += 1
+            items += len(data)
+            for item in data:
+                yield compact_item(item, fields)
+            last_id = getattr(data[-1], 'id', None) if data else None
+            if not data or not getattr(page, 'has_more', False) or not last_id or last_id == after:
+                break
+            after = last_id
+        current_app.logger.info("[OpenAI] %s pages=%s items=%s", label, pages, items)
+
     # ---------------------- Vector Stores ----------------------
     def create_vector_store(self, name: str) -> Dict[str, Any]:
         current_app.logger.info("[OpenAI] vector_stores.create name=%s", name)
         vs = self._client.vector_stores.create(name=name)
         return vs.to_dict() if hasattr(vs, 'to_dict') else vs
 
+    def iter_vector_stores(self, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Alle Vector Stores seitenweise (Cursor) als kompakte dicts."""
+        size = min(page_size or current_app.config.get('OPENAI_LIST_PAGE_SIZE', 100), _VECTOR_STORE_PAGE_MAX)
+        return self._paginate('vector_stores.list', self._client.vector_stores.list, size, VECTOR_STORE_FIELDS)
+
     def list_vector_stores(self, limit: int = 100) -> List[Dict[str, Any]]:
-        current_app.logger.info("[OpenAI] vector_stores.list limit=%s", limit)
-        res = self._client.vector_stores.list(limit=limit)
-        data = getattr(res, 'data', [])
-        out: List[Dict[str, Any]] = []
-        for item in data:
-            if hasattr(item, 'to_dict'):
-                out.append(item.to_dict())
-            else:
-                out.append({k: getattr(item, k) for k in dir(item) if not k.startswith('_')})
-        return out
+        return list(self.iter_vector_stores(page_size=limit))
 
     def delete_vector_store(self, openai_id: str) -> bool:
         current_app.logger.info("[OpenAI] vector_stores.delete id=%s", openai_id)
@@ -163,20 +317,85 @@ class OpenAIClientWrapper:
         return True
 
     # ---------------------- Files ----------------------
-    def upload_file(self, filepath: str, purpose: str = "assistants") -> Dict[str, Any]:
+    def upload_file(self, filepath: str, purpose: str = "assistants",
+                    progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Datei hochladen; ab OPENAI_UPLOAD_MULTIPART_THRESHOLD über die Uploads API in Parts."""
+        size = os.path.getsize(filepath)
+        cfg = current_app.config
+        if size >= cfg.get('OPENAI_UPLOAD_MULTIPART_THRESHOLD', 32 * 1024 * 1024):
+            return self.upload_file_multipart(
+                filepath,
+                purpose=purpose,
+                part_size=cfg.get('OPENAI_UPLOAD_PART_SIZE', 16 * 1024 * 1024),
+                concurrency=cfg.get('OPENAI_UPLOAD_PART_CONCURRENCY', 4),
+                progress=progress,
+            )
         current_app.logger.info("[OpenAI] files.upload %s purpose=%s", filepath, purpose)
         with open(filepath, 'rb') as f:
             res = self._client.files.create(file=f, purpose=purpose)
+        if progress:
+            progress(size, size)
         return res.to_dict() if hasattr(res, 'to_dict') else res
 
+    def upload_file_multipart(self, filepath: str, purpose: str = "assistants", part_size: int = 16 * 1024 * 1024,
+                              concurrency: int = 4, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Große Datei über die Uploads API: Parts parallel senden, danach abschließen.
+
+        Jeder Part ist ein eigener Request (eigenes Timeout, Retry über den Transport);
+        im Speicher liegen höchstens ``concurrency`` Parts. Bei Fehlern wird das Upload abgebrochen.
+        """
+        size = os.path.getsize(filepath)
+        filename = os.path.basename(filepath)
+        part_size = max(1024 * 1024, min(part_size, _UPLOAD_PART_MAX))
+        mime_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        logger = current_app.logger
+        upload = self._client.uploads.create(bytes=size, filename=filename, mime_type=mime_type, purpose=purpose)
+        offsets = list(range(0, size, part_size)) or [0]
+        logger.info("[OpenAI] uploads.create %s id=%s size=%s parts=%s", filename, upload.id, size, len(offsets))
+        sent = [0]
+        sent_lock = threading.Lock()
+
+        def _send_part(offset: int) -> str:
+            with open(filepath, 'rb') as f:
+                f.seek(offset)
+                data = f.read(part_size)
+            part = self._client.uploads.parts.create(upload_id=upload.id, data=data)
+            with sent_lock:
+                sent[0] += len(data)
+                done = sent[0]
+            if progress:
+                progress(done, size)
+            return part.id
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(offsets))), thread_name_prefix='orquestrix-upload')
+        try:
+            futures = [pool.submit(_send_part, off) for off in offsets]
+            # Reihenfolge der part_ids = Reihenfolge in der Datei
+            part_ids = [fut.result() for fut in futures]
+            completed = self._client.uploads.complete(upload_id=upload.id, part_ids=part_ids)
+        except Exception:
+            pool.shutdown(wait=False, cancel_futures=True)
+            try:
+                self._client.uploads.cancel(upload.id)
+            except Exception as e:  # noqa: BLE001
+                logger.warning("[OpenAI] uploads.cancel %s fehlgeschlagen: %s", upload.id, e)
+            raise
+        finally:
+            pool.shutdown(wait=True)
+        file_obj = getattr(completed, 'file', None)
+        if file_obj is None:
+            raise RuntimeError(f"Upload {upload.id} ohne File abgeschlossen (status={getattr(completed, 'status', None)})")
+        logger.info("[OpenAI] uploads.complete id=%s file=%s", upload.id, file_obj.id)
+        return file_obj.to_dict() if hasattr(file_obj, 'to_dict') else file_obj
+
+    def iter_files(self, purpose: Optional[str] = None, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Alle Files (optional je purpose) seitenweise (Cursor) als kompakte dicts."""
+        size = page_size or current_app.config.get('OPENAI_LIST_PAGE_SIZE', 100)
+        params = {'purpose': purpose} if purpose else {}
+        return self._paginate('files.list', self._client.files.list, size, FILE_FIELDS, **params)
+
     def list_files(self, purpose: Optional[str] = None) -> List[Dict[str, Any]]:
-        current_app.logger.info("[OpenAI] files.list purpose=%s", purpose)
-        res = self._client.files.list(purpose=purpose) if purpose else self._client.files.list()
-        data = getattr(res, 'data', [])
-        out: List[Dict[str, Any]] = []
-        for item in data:
-            out.append(item.to_dict() if hasattr(item, 'to_dict') else {k: getattr(item, k) for k in dir(item) if not k.startswith('_')})
-        return out
+        return list(self.iter_files(purpose=purpose))
 
     def delete_file(self, file_id: str) -> bool:
         current_app.logger.info("[OpenAI] files.delete id=%s", file_id)
@@ -215,6 +434,28 @@ class OpenAIClientWrapper:
             current_app.logger.error('[OpenAI] file content retrieval failed id=%s err=%s', file_id, e)
             raise
 
+    # ---------------- Batch API ----------------
+    def response_request_body(self, instructions: str, model: str, messages: List[Dict[str, Any]],
+                              max_output_tokens: int = 1024, vector_store_ids: Optional[List[str]] = None,
+                              file_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Body eines responses.create Requests (z.B. für Batch JSONL Zeilen)."""
+        return self._build_response_kwargs(instructions, model, messages, max_output_tokens,
+                                           vector_store_ids, file_ids)
+
+    def create_batch(self, input_file_id: str, endpoint: str = "/v1/responses",
+                     metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        current_app.logger.info("[OpenAI] batches.create input=%s endpoint=%s", input_file_id, endpoint)
+        batch = self._client.batches.create(input_file_id=input_file_id, endpoint=endpoint,  # type: ignore[arg-type]
+                                            completion_window="24h", metadata=metadata)
+        return batch.to_dict()
+
+    def retrieve_batch(self, batch_id: str) -> Dict[str, Any]:
+        return self._client.batches.retrieve(batch_id).to_dict()
+
+    def cancel_batch(self, batch_id: str) -> Dict[str, Any]:
+        current_app.logger.info("[OpenAI] batches.cancel id=%s", batch_id)
+        return self._client.batches.cancel(batch_id).to_dict()
+
     # Vector Store File Ingestion (Anhängen von Files an VectorStore mit Chunking)
     def add_file_to_vector_store(self, vector_store_id: str, file_id: str) -> Dict[str, Any]:
         current_app.logger.info("[OpenAI] vector_stores.files.create vs=%s file=%s", vector_store_id, file_id)
@@ -232,14 +473,16 @@ class OpenAIClientWrapper:
         )
         return res.to_dict() if hasattr(res, 'to_dict') else res
 
+    def iter_vector_store_files(self, vector_store_id: str, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Alle Files eines Vector Stores seitenweise (Cursor) als kompakte dicts."""
+        size = min(page_size or current_app.config.get('OPENAI_LIST_PAGE_SIZE', 100), _VECTOR_STORE_PAGE_MAX)
+        return self._paginate(
+            f'vector_stores.files.list vs={vector_store_id}', self._client.vector_stores.files.list, size,
+            VECTOR_STORE_FILE_FIELDS, vector_store_id=vector_store_id,
+        )
+
     def list_vector_store_files(self, vector_store_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        current_app.logger.info("[OpenAI] vector_stores.files.list vs=%s", vector_store_id)
-        res = self._client.vector_stores.files.list(vector_store_id=vector_store_id, limit=limit)
-        data = getattr(res, 'data', [])
-        out: List[Dict[str, Any]] = []
-        for item in data:
-            out.append(item.to_dict() if hasattr(item, 'to_dict') else {k: getattr(item, k) for k in dir(item) if not k.startswith('_')})
-        return out
+        return list(self.iter_vector_store_files(vector_store_id, page_size=limit))
 
     def delete_vector_store_file(self, vector_store_id: str, file_id: str) -> bool:
         current_app.logger.info("[OpenAI] vector_stores.files.delete vs=%s file=%s", vector_store_id, file_id)
@@ -251,6 +494,46 @@ class OpenAIClientWrapper:
         return True
 
 
+# Prozessweiter Client: lazy erzeugt, nach fork (gunicorn) im Kindprozess neu aufgebaut
+_shared_client: Optional[OpenAIClientWrapper] = None
+_shared_key: Optional[str] = None
+_shared_lock = threading.Lock()
+
+
 def get_openai_client() -> OpenAIClientWrapper:
-    api_key = current_app.config.get("OPENAI_API_KEY", "")
-    return OpenAIClientWrapper(api_key=api_key)
+    global _shared_client, _shared_key
+    api_key, base_url = client_credentials(current_app.config)
+    key = f'{api_key}@{base_url or ""}'
+    client = _shared_client
+    if client is not None and client._pid == os.getpid() and _shared_key == key:
+        return client
+    with _shared_lock:
+        client = _shared_client
+        if client is None or client._pid != os.getpid() or _shared_key != key:
+            if client is not None and client._pid == os.getpid():
+                client.close()  # Key/Base URL gewechselt -> alten Pool schließen
+            client = OpenAIClientWrapper(api_key=api_key, base_url=base_url)
+            _shared_client = client
+            _shared_key = key
+            current_app.logger.info("[OpenAI] shared client erstellt pid=%s base_url=%s", client._pid, base_url or 'default')
+        return client
+
+
+def close_openai_client() -> None:
+    """Schließt den prozessweiten Client (atexit / Worker Shutdown)."""
+    global _shared_client, _shared_key
+    with _shared_lock:
+        if _shared_client is not None:
+            _shared_client.close()
+        _shared_client = None
+        _shared_key = None
+
+
+def openai_pool_stats() -> Dict[str, Any]:
+    client = _shared_client
+    if client is None or client._pid != os.getpid():
+        return {'pid': os.getpid(), 'initialized': False}
+    return {'initialized': True, **client.pool_stats()}
+
+
+atexit.register(close_openai_client)
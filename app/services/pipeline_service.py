@@ -0,0 +1,197 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models import File as OrxFile, Project, ProjectRun, Worker, WorkerLog, WorkerPipeline, WorkerPipelineStage
+from .worker_service import WorkerService
+
+# Stufen-Logs ohne weiteren Fortschritt
+_FINISHED = ('done', 'failed')
+
+
+class PipelineServiceError(Exception):
+    pass
+
+
+class PipelineService:
+    """Worker Pipelines: Stufen als DAG, Output Files der Vorstufen als code_interpreter Inputs.
+
+    Ausführung als ProjectRun mit ``pipeline_id``: ``advance`` legt für jede Stufe, deren
+    Vorstufen fertig sind, ein WorkerLog an (queued oder bei unveränderten Eingaben direkt
+    übersprungen). Unabhängige Zweige laufen parallel über die worker_run Jobs.
+    """
+
+    # ---------------- Definition ----------------
+    @staticmethod
+    def create(project: Project, name: str) -> WorkerPipeline:
+        pipeline = WorkerPipeline(project_id=project.id, name=name or 'Pipeline')
+        db.session.add(pipeline)
+        db.session.commit()
+        return pipeline
+
+    @staticmethod
+    def add_stage(pipeline: WorkerPipeline, worker: Worker, prompt: str,
+                  upstream_ids: Optional[Iterable[int]] = None) -> WorkerPipelineStage:
+        if worker.project_id != pipeline.project_id:
+            raise PipelineServiceError("Worker gehört nicht zum Projekt der Pipeline")
+        if not (prompt and prompt.strip()):
+            raise PipelineServiceError("Prompt fehlt")
+        if any(st.worker_id == worker.id for st in pipeline.stages):
+            raise PipelineServiceError(f"Worker {worker.name} ist bereits eine Stufe der Pipeline")
+        by_id = {st.id: st for st in pipeline.stages}
+        upstream = [by_id[i] for i in dict.fromkeys(upstream_ids or ()) if i in by_id]
+        stage = WorkerPipelineStage(pipeline=pipeline, worker=worker, prompt=prompt.strip(), upstream=upstream)
+        db.session.add(stage)
+        db.session.commit()
+        return stage
+
+    @staticmethod
+    def set_upstream(stage: WorkerPipelineStage, upstream_ids: Iterable[int]) -> None:
+        """Vorstufen ersetzen; Zyklen werden abgewiesen."""
+        by_id = {st.id: st for st in stage.pipeline.stages if st.id != stage.id}
+        stage.upstream = [by_id[i] for i in dict.fromkeys(upstream_ids) if i in by_id]
+        try:
+            PipelineService.order(stage.pipeline)
+        except PipelineServiceError:
+            db.session.rollback()
+            raise
+        db.session.commit()
+
+    @staticmethod
+    def delete_stage(stage: WorkerPipelineStage) -> None:
+        stage.downstream = []
+        db.session.delete(stage)
+        db.session.commit()
+
+    @staticmethod
+    def order(pipeline: WorkerPipeline) -> List[WorkerPipelineStage]:
+        """Stufen topologisch sortiert (Kahn); PipelineServiceError bei Zyklus."""
+        stages = list(pipeline.stages)
+        pending = {st.id: {u.id for u in st.upstream} for st in stages}
+        ordered: List[WorkerPipelineStage] = []
+        while pending:
+            ready = [st for st in stages if st.id in pending and not pending[st.id]]
+            if not ready:
+                raise PipelineServiceError("Pipeline enthält einen Zyklus")
+            for st in ready:
+                ordered.append(st)
+                del pending[st.id]
+            for deps in pending.values():
+                deps.difference_update(st.id for st in ready)
+        return ordered
+
+    # ---------------- Ausführung ----------------
+    @staticmethod
+    def start(pipeline: WorkerPipeline, concurrency: Optional[int] = None) -> ProjectRun:
+        """ProjectRun für die Pipeline anlegen; die Stufen startet ``advance`` (Job pipeline_advance)."""
+        if not pipeline.stages:
+            raise PipelineServiceError("Pipeline hat keine Stufen")
+        PipelineService.order(pipeline)
+        missing = [st.worker.name for st in pipeline.stages
+                   if not (st.worker.assistant and st.worker.assistant.openai_assistant_id)]
+        if missing:
+            raise PipelineServiceError("Assistant ID fehlt für Worker: " + ', '.join(missing))
+        run = ProjectRun(
+            project_id=pipeline.project_id, pipeline_id=pipeline.id,
+            concurrency=max(1, concurrency or current_app.config.get('PROJECT_RUN_CONCURRENCY', 4)),
+        )
+        db.session.add(run)
+        db.session.commit()
+        return run
+
+    @staticmethod
+    def input_hash(stage: WorkerPipelineStage, input_file_ids: List[str]) -> str:
+        """Hash über alles, was das Ergebnis einer Stufe bestimmt (Prompt, Assistant, Modell, Dateien)."""
+        worker = stage.worker
+        file_ids, vector_store_id = WorkerService._tool_resources(worker)
+        payload = {
+            'prompt': stage.prompt,
+            'assistant': worker.assistant.openai_assistant_id if worker.assistant else None,
+            'model': worker.model,
+            'files': sorted(file_ids),
+            'vector_store': vector_store_id,
+            'inputs': sorted(input_file_ids),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _outputs(log: WorkerLog) -> List[str]:
+        try:
+            ids = json.loads(log.output_file_ids) if log.output_file_ids else []
+        except ValueError:
+            ids = []
+        return [i for i in ids if isinstance(i, str) and i]
+
+    @staticmethod
+    def _prompt(stage: WorkerPipelineStage, input_file_ids: List[str]) -> str:
+        if not input_file_ids:
+            return stage.prompt
+        names = {f.openai_file_id: f.filename for f in OrxFile.query.filter(OrxFile.openai_file_id.in_(input_file_ids))}
+        lines = [f"- {names.get(fid) or fid} ({fid})" for fid in input_file_ids]
+        return stage.prompt + "\n\n[Eingabedateien aus Vorstufen]\n" + "\n".join(lines)
+
+    @staticmethod
+    def advance(run: ProjectRun) -> List[WorkerLog]:
+        """Bereite Stufen anlegen; Rückgabe: neu eingereihte Logs (für worker_run Jobs).
+
+        Eine Stufe ist bereit, wenn alle Vorstufen ein fertiges Log haben. Fehlgeschlagene
+        Vorstufen markieren sie als failed; stimmt der Eingabe-Hash mit dem letzten erfolgreichen
+        Lauf desselben Workers überein, wird das Ergebnis übernommen (run_status skipped).
+        Parallel laufende Aufrufe scheitern am Unique Constraint (Run, Stufe) und lesen neu.
+        """
+        for _ in range(3):
+            try:
+                return PipelineService._advance(run)
+            except IntegrityError:
+                db.session.rollback()
+                db.session.expire_all()
+        return []
+
+    @staticmethod
+    def _advance(run: ProjectRun) -> List[WorkerLog]:
+        stages = PipelineService.order(run.pipeline)
+        logs: Dict[int, WorkerLog] = {l.pipeline_stage_id: l for l in run.logs if l.pipeline_stage_id}
+        queued: List[WorkerLog] = []
+        now = datetime.utcnow()
+        changed = True
+        while changed:
+            changed = False
+            for stage in stages:
+                if stage.id in logs:
+                    continue
+                ups = [logs.get(u.id) for u in stage.upstream]
+                if any(u is None or u.state not in _FINISHED for u in ups):
+                    continue
+                base = dict(worker_id=stage.worker_id, project_run_id=run.id, pipeline_stage_id=stage.id)
+                failed = [u.worker.name for u in stage.upstream if logs[u.id].state == 'failed']
+                if failed:
+                    log = WorkerLog(input_text=stage.prompt, state='failed', finished_at=now,
+                                    error='Vorstufe fehlgeschlagen: ' + ', '.join(failed), **base)
+                else:
+                    inputs = list(dict.fromkeys(fid for u in ups for fid in PipelineService._outputs(u)))
+                    digest = PipelineService.input_hash(stage, inputs)
+                    previous = (WorkerLog.query
+                                .filter(WorkerLog.worker_id == stage.worker_id, WorkerLog.input_hash == digest,
+                                        WorkerLog.state == 'done', WorkerLog.run_status.in_(('completed', 'skipped')))
+                                .order_by(WorkerLog.id.desc()).first())
+                    log = WorkerLog(input_text=PipelineService._prompt(stage, inputs), input_hash=digest,
+                                    input_file_ids=json.dumps(inputs) if inputs else None, **base)
+                    if previous is not None:
+                        # Eingaben unverändert -> Ergebnis des letzten Laufs übernehmen
+                        log.state, log.run_status, log.finished_at = 'done', 'skipped', now
+                        log.output_text, log.output_file_ids = previous.output_text, previous.output_file_ids
+                        log.openai_run_id = previous.openai_run_id
+                    else:
+                        log.state = 'queued'
+                        queued.append(log)
+                db.session.add(log)
+                logs[stage.id] = log
+                changed = True
+        db.session.commit()
+        if queued:
+            current_app.logger.info('[Pipeline] run=%s Stufen eingereiht logs=%s', run.id, [l.id for l in queued])
+        return queued
@@ -0,0 +1,216 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+from flask import current_app
+import asyncio
+import random
+import threading
+import time
+
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled', 'expired', 'incomplete')
+
+
+@dataclass
+class PollStats:
+    label: str
+    polls: int = 0
+    slept_sec: float = 0.0
+    elapsed_sec: float = 0.0
+    # Letztes Intervall = obere Schranke der verschenkten Wartezeit nach Statuswechsel
+    last_interval: float = 0.0
+    timed_out: bool = False
+    final_status: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            'label': self.label,
+            'polls': self.polls,
+            'slept_sec': round(self.slept_sec, 3),
+            'elapsed_sec': round(self.elapsed_sec, 3),
+            'wasted_max_sec': round(self.last_interval, 3),
+            'timed_out': self.timed_out,
+            'final_status': self.final_status,
+        }
+
+
+class AdaptivePoller:
+    """Polling mit exponentiellem Backoff, Jitter, Floor/Ceiling und Deadline.
+
+    Kurze Runs werden früh erkannt (Floor), lange Runs erzeugen wenige Requests (Ceiling).
+    Bei Statuswechsel (z.B. queued -> in_progress) beginnt der Backoff wieder beim Floor.
+    """
+
+    def __init__(
+        self,
+        label: str = 'poll',
+        floor: float = 0.25,
+        ceiling: float = 5.0,
+        factor: float = 1.6,
+        jitter: float = 0.2,
+        timeout: float = 120.0,
+        on_poll: Optional[Callable[[PollStats, Any], None]] = None,
+        on_done: Optional[Callable[[PollStats], None]] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.label = label
+        self.floor = max(0.0, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.factor = max(1.0, factor)
+        self.jitter = max(0.0, jitter)
+        self.timeout = timeout
+        self.on_poll = on_poll
+        self.on_done = on_done
+        self._sleep = sleep
+        self._clock = clock
+        self.stats = PollStats(label=label)
+        self.last: Any = None
+
+    @classmethod
+    def from_config(cls, label: str, timeout: Optional[float] = None, **overrides) -> 'AdaptivePoller':
+        cfg = current_app.config
+        params = dict(
+            floor=cfg.get('OPENAI_POLL_FLOOR', 0.25),
+            ceiling=cfg.get('OPENAI_POLL_CEILING', 5.0),
+            factor=cfg.get('OPENAI_POLL_BACKOFF', 1.6),
+            jitter=cfg.get('OPENAI_POLL_JITTER', 0.2),
+            timeout=timeout if timeout is not None else cfg.get('OPENAI_POLL_TIMEOUT', 120),
+            on_done=_log_poll_stats,
+        )
+        params.update(overrides)
+        return cls(label=label, **params)
+
+    def _next_interval(self, current: float) -> float:
+        base = min(self.ceiling, current * self.factor) if current else self.floor
+        if self.jitter:
+            base *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(self.floor, min(self.ceiling, base))
+
+    def run(
+        self,
+        fetch: Callable[[], Any],
+        status_of: Callable[[Any], Optional[str]],
+        is_done: Optional[Callable[[Any], bool]] = None,
+        initial: Any = None,
+    ) -> Any:
+        """Pollt ``fetch`` bis ``is_done`` (Default: terminaler Status) oder Deadline.
+
+        ``initial`` ist ein bereits vorliegendes Ergebnis (z.B. aus create); ist es schon
+        terminal, erfolgt kein einziger Poll. Ohne ``initial`` wird sofort einmal abgerufen.
+        Exceptions aus ``fetch`` werden weitergereicht, das letzte gültige Ergebnis bleibt
+        in ``self.last`` erhalten.
+        """
+        done = is_done or (lambda obj: status_of(obj) in TERMINAL_STATUSES)
+        start = self._clock()
+        deadline = start + self.timeout if self.timeout else None
+        self.last = initial
+        interval = 0.0
+        try:
+            if self.last is None:
+                # Kein Ausgangszustand bekannt -> sofort einmal abrufen
+                self.last = fetch()
+                self.stats.polls += 1
+                if self.on_poll:
+                    self.on_poll(self.stats, self.last)
+            prev_status = status_of(self.last) if self.last is not None else None
+            while self.last is None or not done(self.last):
+                interval = self._next_interval(interval)
+                if deadline is not None:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self.stats.timed_out = True
+                        break
+                    interval = min(interval, remaining)
+                self._sleep(interval)
+                self.stats.slept_sec += interval
+                self.stats.last_interval = interval
+                self.last = fetch()
+                self.stats.polls += 1
+                status = status_of(self.last)
+                if self.on_poll:
+                    self.on_poll(self.stats, self.last)
+                if status != prev_status:
+                    interval = 0.0  # Fortschritt -> wieder schnell pollen
+                    prev_status = status
+        finally:
+            self.stats.elapsed_sec = self._clock() - start
+            self.stats.final_status = status_of(self.last) if self.last is not None else None
+            if self.on_done:
+                self.on_done(self.stats)
+        return self.last
+
+    async def arun(
+        self,
+        fetch: Callable[[], Awaitable[Any]],
+        status_of: Callable[[Any], Optional[str]],
+        is_done: Optional[Callable[[Any], bool]] = None,
+        initial: Any = None,
+    ) -> Any:
+        """Asyncio Variante von ``run`` (gleiche Backoff-Regeln, ``asyncio.sleep`` statt Blockieren)."""
+        done = is_done or (lambda obj: status_of(obj) in TERMINAL_STATUSES)
+        start = self._clock()
+        deadline = start + self.timeout if self.timeout else None
+        self.last = initial
+        interval = 0.0
+        try:
+            if self.last is None:
+                self.last = await fetch()
+                self.stats.polls += 1
+                if self.on_poll:
+                    self.on_poll(self.stats, self.last)
+            prev_status = status_of(self.last) if self.last is not None else None
+            while self.last is None or not done(self.last):
+                interval = self._next_interval(interval)
+                if deadline is not None:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self.stats.timed_out = True
+                        break
+                    interval = min(interval, remaining)
+                await asyncio.sleep(interval)
+                self.stats.slept_sec += interval
+                self.stats.last_interval = interval
+                self.last = await fetch()
+                self.stats.polls += 1
+                status = status_of(self.last)
+                if self.on_poll:
+                    self.on_poll(self.stats, self.last)
+                if status != prev_status:
+                    interval = 0.0
+                    prev_status = status
+        finally:
+            self.stats.elapsed_sec = self._clock() - start
+            self.stats.final_status = status_of(self.last) if self.last is not None else None
+            if self.on_done:
+                self.on_done(self.stats)
+        return self.last
+
+
+# Prozessweite Summen je Label (Poll-Anzahl, Wartezeit, verschenkte Wartezeit)
+_totals: dict[str, dict] = {}
+_totals_lock = threading.Lock()
+
+
+def _log_poll_stats(stats: PollStats) -> None:
+    with _totals_lock:
+        t = _totals.setdefault(stats.label, {'runs': 0, 'polls': 0, 'slept_sec': 0.0, 'wasted_max_sec': 0.0, 'timeouts': 0})
+        t['runs'] += 1
+        t['polls'] += stats.polls
+        t['slept_sec'] += stats.slept_sec
+        t['wasted_max_sec'] += stats.last_interval
+        t['timeouts'] += 1 if stats.timed_out else 0
+    try:
+        current_app.logger.debug('[Poller] %s', stats.as_dict())
+    except Exception:  # noqa: BLE001
+        pass
+
+
+def poll_totals() -> dict:
+    with _totals_lock:
+        return {k: {kk: (round(vv, 3) if isinstance(vv, float) else vv) for kk, vv in v.items()} for k, v in _totals.items()}
+
+
+def status_attr(obj: Any) -> Optional[str]:
+    """Status aus SDK Objekt oder dict lesen."""
+    return getattr(obj, 'status', None) or (obj.get('status') if isinstance(obj, dict) else None)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def canonical_ids(ids: Optional[Iterable[str]]) -> List[str]:
+    """IDs sortiert und ohne Duplikate (Reihenfolge der Relationen darf den Prompt nicht ändern)."""
+    return sorted({i for i in ids or () if i})
+
+
+def resource_block(vector_store_ids: List[str], file_ids: List[str]) -> str:
+    if not vector_store_ids and not file_ids:
+        return ''
+    return "[Kontext Ressourcen]\n" + \
+        (f"VectorStores: {', '.join(vector_store_ids)}\n" if vector_store_ids else "") + \
+        (f"Files: {', '.join(file_ids)}\n" if file_ids else "")
+
+
+def build_prompt(instructions: Optional[str], messages: List[Dict[str, Any]],
+                 vector_store_ids: Optional[Iterable[str]] = None,
+                 file_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Prompt in kanonischer Reihenfolge für das Prompt Caching des Providers.
+
+    Stabiler Präfix: Rollen-Instructions, danach der sortierte Ressourcen-Block (Instructions)
+    und das file_search Tool mit sortierten IDs; variabel ist nur ``input`` (Verlauf, neuer Turn)
+    am Ende. Gleiche Rolle + gleiche Ressourcen ergeben so byte-identische Präfixe.
+    """
+    vector_store_ids = canonical_ids(vector_store_ids)
+    file_ids = canonical_ids(file_ids)
+    note = resource_block(vector_store_ids, file_ids)
+    instructions = instructions or ""
+    if note:
+        instructions = (instructions + "\n\n" + note) if instructions else "\n\n" + note
+    tools: List[Dict[str, Any]] = []
+    if vector_store_ids:
+        tools.append({"type": "file_search", "vector_store_ids": vector_store_ids})
+    return {
+        "instructions": instructions,
+        "tools": tools,
+        "input": [{"role": m.get("role", "user"), "content": m.get("content")} for m in messages],
+        "vector_store_ids": vector_store_ids,
+        "file_ids": file_ids,
+    }
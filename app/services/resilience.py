@@ -0,0 +1,409 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+import httpx
+
+
+logger = logging.getLogger('orquestrix.openai.resilience')
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'DELETE', 'OPTIONS'}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# POSTs, deren Wiederholung unschädlich ist: ein erneut gesendeter Upload-Part erzeugt nur einen
+# weiteren Part, in uploads.complete landet ausschließlich die ID des erfolgreichen Versuchs
+REPLAY_SAFE_ENDPOINTS = {'POST /uploads/{id}/parts'}
+# Segment-Präfixe von OpenAI IDs -> im Endpoint-Key durch {id} ersetzen
+_ID_SEGMENT = re.compile(r'^(resp|run|thread|msg|file|file-|vs|vsfb|asst|step|batch|upload|part|ftjob|chatcmpl)[_-][A-Za-z0-9_-]+$')
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def endpoint_key(method: str, path: str) -> str:
+    parts = [p for p in path.split('/') if p]
+    if parts and parts[0] == 'v1':
+        parts = parts[1:]
+    norm = ['{id}' if _ID_SEGMENT.match(p) else p for p in parts]
+    return f"{method.upper()} /{'/'.join(norm)}"
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """'1s', '6m0s', '20ms', '1.5s' -> Sekunden (x-ratelimit-reset-* Format)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    found = False
+    for num, unit in _DURATION.findall(value):
+        found = True
+        n = float(num)
+        total += n / 1000 if unit == 'ms' else n * {'s': 1, 'm': 60, 'h': 3600}[unit]
+    return total if found else None
+
+
+def retry_after_seconds(headers: httpx.Headers) -> Optional[float]:
+    """Wartezeit aus retry-after(-ms) bzw. erschöpftem x-ratelimit Bucket."""
+    ms = headers.get('retry-after-ms')
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    ra = headers.get('retry-after')
+    if ra:
+        try:
+            return float(ra)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(ra).timestamp() - time.time())
+            except Exception:  # noqa: BLE001
+                pass
+    waits = []
+    for bucket in ('requests', 'tokens'):
+        if headers.get(f'x-ratelimit-remaining-{bucket}') == '0':
+            w = parse_duration(headers.get(f'x-ratelimit-reset-{bucket}'))
+            if w is not None:
+                waits.append(w)
+    return max(waits) if waits else None
+
+
+@dataclass
+class _Circuit:
+    state: str = 'closed'  # closed / open / half_open
+    failures: int = 0
+    opened_at: float = 0.0
+    cooldown_until: float = 0.0  # Rate-Limit Sperre (retry-after) für alle Threads
+    trial_in_flight: bool = False
+    calls: int = 0
+    retries: int = 0
+    rejected: int = 0
+    last_error: Optional[str] = None
+    ratelimit: Dict[str, str] = field(default_factory=dict)
+
+
+class ResiliencePolicy:
+    """Prozessweite Retry- und Circuit-Breaker Regeln je Endpoint.
+
+    - 429/5xx/Verbindungsfehler: Retry mit Full-Jitter Backoff, retry-after hat Vorrang
+    - Nicht idempotente POSTs: nur Retry bei 429 oder wenn der Request nie gesendet wurde
+    - N aufeinanderfolgende Fehler (5xx/Netz) öffnen den Breaker für ``cooldown`` Sekunden,
+      danach lässt half_open genau einen Probe-Request durch
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+                 failure_threshold: int = 5, cooldown: float = 30.0):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs: Any) -> None:
+        for k, v in kwargs.items():
+            if v is not None and hasattr(self, k):
+                setattr(self, k, v)
+
+    def _circuit(self, key: str) -> _Circuit:
+        c = self._circuits.get(key)
+        if c is None:
+            c = self._circuits.setdefault(key, _Circuit())
+        return c
+
+    # ---------------------- Entscheidungen ----------------------
+    def admit(self, key: str) -> tuple[bool, float]:
+        """(zugelassen, vorher zu wartende Sekunden)."""
+        now = time.monotonic()
+        with self._lock:
+            c = self._circuit(key)
+            c.calls += 1
+            if c.state == 'open':
+                if now - c.opened_at < self.cooldown:
+                    c.rejected += 1
+                    return False, 0.0
+                c.state = 'half_open'
+                c.trial_in_flight = False
+            if c.state == 'half_open':
+                if c.trial_in_flight:
+                    c.rejected += 1
+                    return False, 0.0
+                c.trial_in_flight = True
+            return True, max(0.0, c.cooldown_until - now)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def on_response(self, key: str, response: httpx.Response, attempt: int, idempotent: bool) -> Optional[float]:
+        """Ergebnis verbuchen; liefert Wartezeit für einen Retry oder None."""
+        status = response.status_code
+        wait = retry_after_seconds(response.headers) if status in RETRY_STATUS else None
+        with self._lock:
+            c = self._circuit(key)
+            rl = {k: v for k, v in response.headers.items() if k.startswith('x-ratelimit-')}
+            if rl:
+                c.ratelimit = rl
+            if status == 429:
+                # Rate Limit sagt nichts über die Gesundheit des Endpoints: Fehlerzähler und
+                # Zustand bleiben unverändert, nur ein Half-Open Probe gibt seinen Platz frei
+                c.trial_in_flight = False
+                if wait:
+                    # Alle Threads dieses Endpoints warten gemeinsam statt einzeln zu hämmern
+                    c.cooldown_until = max(c.cooldown_until, time.monotonic() + wait)
+            elif status >= 500:
+                self._record_failure(c, f'HTTP {status}')
+            else:
+                self._record_success(c)
+            retry = (
+                status in RETRY_STATUS
+                and attempt < self.max_retries
+                and (idempotent or status == 429)
+                and c.state != 'open'
+            )
+            if retry:
+                c.retries += 1
+        if not retry:
+            return None
+        if wait is not None:
+            return min(self.max_delay, wait) * (1 + random.uniform(0, 0.1))
+        return self.backoff(attempt)
+
+    def on_error(self, key: str, exc: Exception, attempt: int, idempotent: bool) -> Optional[float]:
+        # ConnectError: Request hat den Server nie erreicht -> auch POST wiederholbar
+        never_sent = isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+        with self._lock:
+            c = self._circuit(key)
+            if not isinstance(exc, httpx.PoolTimeout):
+                self._record_failure(c, f'{type(exc).__name__}: {exc}')
+            retry = attempt < self.max_retries and (idempotent or never_sent) and c.state != 'open'
+            if retry:
+                c.retries += 1
+        return self.backoff(attempt) if retry else None
+
+    def _record_failure(self, c: _Circuit, err: str) -> None:
+        c.failures += 1
+        c.last_error = err
+        c.trial_in_flight = False
+        if c.state == 'half_open' or c.failures >= self.failure_threshold:
+            if c.state != 'open':
+                logger.warning('[OpenAI] circuit open after %s failures (%s)', c.failures, err)
+            c.state = 'open'
+            c.opened_at = time.monotonic()
+
+    @staticmethod
+    def _record_success(c: _Circuit) -> None:
+        c.failures = 0
+        c.trial_in_flight = False
+        c.state = 'closed'
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            out = {}
+            for key, c in self._circuits.items():
+                state = c.state
+                if state == 'open' and now - c.opened_at >= self.cooldown:
+                    state = 'half_open'
+                out[key] = {
+                    'state': state,
+                    'failures': c.failures,
+                    'calls': c.calls,
+                    'retries': c.retries,
+                    'rejected': c.rejected,
+                    'cooldown_remaining_sec': round(max(0.0, c.cooldown_until - now), 2),
+                    'last_error': c.last_error,
+                    'ratelimit': c.ratelimit,
+                }
+            return out
+
+    def degraded(self) -> bool:
+        return any(v['state'] != 'closed' for v in self.snapshot().values())
+
+
+# Eine Policy pro Prozess (sync + async Client teilen Breaker und Rate-Limit Sperren)
+policy = ResiliencePolicy()
+
+
+def _circuit_open_response(request: httpx.Request, key: str) -> httpx.Response:
+    body = {'error': {'message': f'Circuit offen für {key} (Upstream gestört)', 'type': 'circuit_open', 'code': 'circuit_open'}}
+    return httpx.Response(503, headers={'x-orquestrix-circuit': 'open', 'x-should-retry': 'false'},
+                          content=json.dumps(body).encode(), request=request)
+
+
+def _replayable(request: httpx.Request, key: str) -> bool:
+    # JSON Bodies sind gepuffert; Multipart/Streams (Uploads) nicht erneut senden.
+    # Ausnahme Upload-Parts: Part-Daten liegen als bytes im Speicher und sind erneut lesbar.
+    return (
+        request.method in IDEMPOTENT_METHODS
+        or isinstance(request.stream, httpx.ByteStream)
+        or key in REPLAY_SAFE_ENDPOINTS
+    )
+
+
+_MAX_OBSERVED_BODY = 5 * 1024 * 1024
+
+
+def _observable_json(response: httpx.Response) -> bool:
+    # Nur JSON Bodies auswerten (keine SSE Streams / Datei-Downloads)
+    if 'application/json' not in response.headers.get('content-type', ''):
+        return False
+    length = response.headers.get('content-length')
+    return not (length and length.isdigit() and int(length) > _MAX_OBSERVED_BODY)
+
+
+def _parse_body(content: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        body = json.loads(content)
+    except Exception:  # noqa: BLE001
+        return None
+    return body if isinstance(body, dict) else None
+
+
+# observer(request, response|None, error|None, latency_sec, attempts, body|None)
+Observer = Callable[[httpx.Request, Optional[httpx.Response], Optional[BaseException], float, int, Optional[Dict[str, Any]]], None]
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """httpx Transport mit Retry/Breaker; deckt auch direkte ``raw`` SDK Aufrufe ab."""
+
+    def __init__(self, inner: httpx.BaseTransport, policy_: ResiliencePolicy = policy, observer: Optional[Observer] = None):
+        self._inner = inner
+        self._policy = policy_
+        self._observer = observer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        attempts = [0]
+        try:
+            response = self._send(request, attempts)
+        except Exception as e:
+            self._observe(request, None, e, start, attempts[0])
+            raise
+        self._observe(request, response, None, start, attempts[0])
+        return response
+
+    def _observe(self, request, response, error, start, attempts) -> None:
+        if self._observer is None:
+            return
+        try:
+            body = None
+            if response is not None and _observable_json(response):
+                body = _parse_body(response.read())
+            self._observer(request, response, error, time.monotonic() - start, attempts, body)
+        except Exception as e:  # noqa: BLE001
+            logger.debug('[OpenAI] observer Fehler %s', e)
+
+    def _send(self, request: httpx.Request, attempts: list) -> httpx.Response:
+        key = endpoint_key(request.method, request.url.path)
+        idempotent = request.method in IDEMPOTENT_METHODS or key in REPLAY_SAFE_ENDPOINTS
+        replayable = _replayable(request, key)
+        attempt = 0
+        while True:
+            attempts[0] = attempt + 1
+            admitted, wait = self._policy.admit(key)
+            if not admitted:
+                return _circuit_open_response(request, key)
+            if wait:
+                time.sleep(wait)
+            try:
+                response = self._inner.handle_request(request)
+            except httpx.TransportError as e:
+                delay = self._policy.on_error(key, e, attempt if replayable else self._policy.max_retries, idempotent)
+                if delay is None:
+                    raise
+                logger.info('[OpenAI] retry %s attempt=%s in %.2fs err=%s', key, attempt + 1, delay, e)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            # Nicht wiederholbare Bodies: nur verbuchen (attempt=max -> kein Retry)
+            delay = self._policy.on_response(key, response, attempt if replayable else self._policy.max_retries, idempotent)
+            if delay is None:
+                return response
+            response.close()
+            logger.info('[OpenAI] retry %s attempt=%s in %.2fs status=%s', key, attempt + 1, delay, response.status_code)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    """Asyncio Variante von ResilientTransport (gleiche Policy)."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, policy_: ResiliencePolicy = policy, observer: Optional[Observer] = None):
+        self._inner = inner
+        self._policy = policy_
+        self._observer = observer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        attempts = [0]
+        try:
+            response = await self._send(request, attempts)
+        except Exception as e:
+            await self._observe(request, None, e, start, attempts[0])
+            raise
+        await self._observe(request, response, None, start, attempts[0])
+        return response
+
+    async def _observe(self, request, response, error, start, attempts) -> None:
+        if self._observer is None:
+            return
+        try:
+            body = None
+            if response is not None and _observable_json(response):
+                body = _parse_body(await response.aread())
+            self._observer(request, response, error, time.monotonic() - start, attempts, body)
+        except Exception as e:  # noqa: BLE001
+            logger.debug('[OpenAI] observer Fehler %s', e)
+
+    async def _send(self, request: httpx.Request, attempts: list) -> httpx.Response:
+        key = endpoint_key(request.method, request.url.path)
+        idempotent = request.method in IDEMPOTENT_METHODS or key in REPLAY_SAFE_ENDPOINTS
+        replayable = _replayable(request, key)
+        attempt = 0
+        while True:
+            attempts[0] = attempt + 1
+            admitted, wait = self._policy.admit(key)
+            if not admitted:
+                return _circuit_open_response(request, key)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self._inner.handle_async_request(request)
+            except httpx.TransportError as e:
+                delay = self._policy.on_error(key, e, attempt if replayable else self._policy.max_retries, idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            # Nicht wiederholbare Bodies: nur verbuchen (attempt=max -> kein Retry)
+            delay = self._policy.on_response(key, response, attempt if replayable else self._policy.max_retries, idempotent)
+            if delay is None:
+                return response
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def configure_from_app(config: Any) -> None:
+    policy.configure(
+        max_retries=config.get('OPENAI_RETRY_MAX', 3),
+        base_delay=config.get('OPENAI_RETRY_BASE_DELAY', 0.5),
+        max_delay=config.get('OPENAI_RETRY_MAX_DELAY', 30.0),
+        failure_threshold=config.get('OPENAI_BREAKER_THRESHOLD', 5),
+        cooldown=config.get('OPENAI_BREAKER_COOLDOWN', 30.0),
+    )
@@ -0,0 +1,103 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def cache_key(request: Dict[str, Any]) -> str:
+    """Stabiler Hash über alle Parameter, die die Antwort bestimmen."""
+    material = {
+        'instructions': request.get('instructions') or '',
+        'model': request.get('model') or '',
+        'messages': [[m.get('role'), m.get('content')] for m in request.get('messages') or []],
+        'vector_store_ids': sorted(request.get('vector_store_ids') or []),
+        'file_ids': sorted(request.get('file_ids') or []),
+        'max_output_tokens': request.get('max_output_tokens'),
+        # Verkettete Requests: die Response ID steht für den kompletten Vorverlauf
+        'previous_response_id': request.get('previous_response_id'),
+    }
+    raw = json.dumps(material, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def cacheable(response: Dict[str, Any]) -> bool:
+    # Nur vollständige Antworten ohne Fehler wiederverwenden
+    return bool(response) and response.get('status', 'completed') == 'completed' and not response.get('error')
+
+
+@dataclass
+class _Entry:
+    response: Dict[str, Any]
+    expires_at: float
+    latency_sec: float
+
+
+class ResponseCache:
+    """LRU Cache (prozesslokal) für Chat Antworten mit TTL je Eintrag und Größenlimit."""
+
+    def __init__(self, max_entries: int = 256, default_ttl: float = 86400.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._data: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0, 'saved_sec': 0.0}
+
+    def init_app(self, app) -> None:
+        self.max_entries = max(1, app.config.get('OPENAI_RESPONSE_CACHE_SIZE', 256))
+        self.default_ttl = app.config.get('OPENAI_RESPONSE_CACHE_TTL', 86400)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._data[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            self._stats['saved_sec'] += entry.latency_sec
+            return entry.response
+
+    def put(self, key: str, response: Dict[str, Any], ttl: Optional[float] = None, latency_sec: float = 0.0) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = _Entry(response, self._clock() + ttl, latency_sec)
+            self._data.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            return n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                saved_sec=round(self._stats['saved_sec'], 1),
+                size=len(self._data),
+                max_entries=self.max_entries,
+                hit_rate=round(self._stats['hits'] / lookups, 3) if lookups else None,
+                # Cache und Zähler gelten nur für diesen Prozess (gunicorn Worker, run-jobs)
+                pid=os.getpid(),
+            )
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class ExtractedResponse:
+    """Text, Quellen und Usage einer Responses API Antwort (typisierter Fast Path)."""
+    text: str
+    citations: List[Dict[str, Any]] = field(default_factory=list)
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    reasoning_tokens: Optional[int] = None
+
+
+def _citation(annotation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    atype = annotation.get('type')
+    if atype in ('file_citation', 'container_file_citation'):
+        return {'type': atype, 'file_id': annotation.get('file_id'), 'filename': annotation.get('filename')}
+    if atype == 'url_citation':
+        return {'type': atype, 'url': annotation.get('url'), 'title': annotation.get('title')}
+    if atype == 'file_path':
+        return {'type': atype, 'file_id': annotation.get('file_id')}
+    return None
+
+
+def extract_usage(response: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    usage = response.get('usage') or {}
+    input_details = usage.get('input_tokens_details') or {}
+    output_details = usage.get('output_tokens_details') or {}
+    return {
+        'input_tokens': usage.get('input_tokens'),
+        'output_tokens': usage.get('output_tokens'),
+        'cached_tokens': input_details.get('cached_tokens'),
+        'reasoning_tokens': output_details.get('reasoning_tokens'),
+    }
+
+
+def extract_response(response: Dict[str, Any]) -> Optional[ExtractedResponse]:
+    """Liest nur ``message`` -> ``output_text`` Parts samt Annotations.
+
+    Tool-Ausgaben (z.B. file_search Treffer) werden nicht angefasst. None, wenn die Antwort
+    kein output_text enthält (dann greift der generische Walker).
+    """
+    output = response.get('output')
+    if not isinstance(output, list):
+        return None
+    texts: List[str] = []
+    citations: List[Dict[str, Any]] = []
+    seen = set()
+    for item in output:
+        if not isinstance(item, dict) or item.get('type') != 'message':
+            continue
+        for part in item.get('content') or ():
+            if not isinstance(part, dict) or part.get('type') != 'output_text':
+                continue
+            text = part.get('text')
+            if isinstance(text, str) and text.strip():
+                texts.append(text.strip())
+            for annotation in part.get('annotations') or ():
+                cite = _citation(annotation) if isinstance(annotation, dict) else None
+                if cite is None:
+                    continue
+                key = (cite['type'], cite.get('file_id') or cite.get('url'))
+                if key not in seen:
+                    seen.add(key)
+                    citations.append(cite)
+    if not texts:
+        return None
+    return ExtractedResponse(text='\n'.join(texts), citations=citations, **extract_usage(response))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def _as_dict(obj: Any) -> Dict[str, Any]:
+    if isinstance(obj, dict):
+        return obj
+    if hasattr(obj, 'to_dict'):
+        try:
+            return obj.to_dict()  # type: ignore[no-any-return]
+        except Exception:  # noqa: BLE001
+            return {}
+    return {}
+
+
+@dataclass
+class RunOutput:
+    """Text und Output Files eines Assistants Runs.
+
+    Wird aus den Stream Events (``runs.create(stream=True)``) fortlaufend aufgebaut; nach einem
+    Resume ohne Stream aus genau einem ``messages.list(run_id=...)`` und einem ``steps.list``.
+    Gelesen werden nur die bekannten Felder (Text, file_path Annotations, image_file,
+    Attachments, code_interpreter Images) statt einer rekursiven Suche über ganze Objekte.
+    """
+    run: Optional[Dict[str, Any]] = None
+    # message_id -> Text je content index (Deltas werden angehängt)
+    messages: Dict[str, Dict[int, str]] = field(default_factory=dict)
+    file_ids: List[str] = field(default_factory=list)
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def status(self) -> Optional[str]:
+        return (self.run or {}).get('status')
+
+    @property
+    def text(self) -> str:
+        """Text der letzten Assistant Message mit Inhalt (wie bisher: finale Antwort des Runs)."""
+        for parts in reversed(list(self.messages.values())):
+            txt = '\n'.join(v for _, v in sorted(parts.items()) if v)
+            if txt:
+                return txt
+        return ''
+
+    def add_file(self, file_id: Any) -> None:
+        if isinstance(file_id, str) and file_id and file_id not in self.file_ids:
+            self.file_ids.append(file_id)
+
+    # ---------------------- Messages ----------------------
+    def _content_part(self, message_id: str, part: Dict[str, Any], index: int, delta: bool) -> None:
+        ptype = part.get('type')
+        if ptype == 'text':
+            text = part.get('text') or {}
+            value = text.get('value') or ''
+            parts = self.messages.setdefault(message_id, {})
+            parts[index] = (parts.get(index, '') + value) if delta else value
+            for ann in text.get('annotations') or ():
+                if ann.get('type') == 'file_path':
+                    self.add_file((ann.get('file_path') or {}).get('file_id'))
+        elif ptype == 'image_file':
+            self.add_file((part.get('image_file') or {}).get('file_id'))
+
+    def add_message(self, message: Any) -> None:
+        m = _as_dict(message)
+        if m.get('role') != 'assistant' or not m.get('id'):
+            return
+        self.messages[m['id']] = {}
+        for idx, part in enumerate(m.get('content') or ()):
+            self._content_part(m['id'], part, idx, delta=False)
+        for att in m.get('attachments') or ():
+            self.add_file(att.get('file_id'))
+
+    def add_message_delta(self, delta: Any) -> None:
+        d = _as_dict(delta)
+        mid = d.get('id')
+        if not mid:
+            return
+        for part in (d.get('delta') or {}).get('content') or ():
+            self._content_part(mid, part, part.get('index', 0), delta=True)
+
+    # ---------------------- Steps ----------------------
+    def _tool_calls(self, details: Dict[str, Any]) -> None:
+        for call in details.get('tool_calls') or ():
+            if call.get('type') != 'code_interpreter':
+                continue
+            for out in (call.get('code_interpreter') or {}).get('outputs') or ():
+                if out.get('type') == 'image':
+                    self.add_file((out.get('image') or {}).get('file_id'))
+
+    def add_step(self, step: Any) -> None:
+        s = _as_dict(step)
+        details = s.get('step_details') or {}
+        self._tool_calls(details)
+        self.steps.append({'id': s.get('id'), 'status': s.get('status'), 'type': details.get('type')})
+
+    def add_step_delta(self, delta: Any) -> None:
+        self._tool_calls(((_as_dict(delta).get('delta') or {}).get('step_details')) or {})
+
+    # ---------------------- Events ----------------------
+    def apply(self, event: str, data: Any) -> None:
+        """Ein Assistants Stream Event (``thread.*``) übernehmen."""
+        if event.startswith('thread.run.step.'):
+            if event == 'thread.run.step.delta':
+                self.add_step_delta(data)
+            elif event == 'thread.run.step.completed':
+                self.add_step(data)
+        elif event.startswith('thread.run.'):
+            self.run = _as_dict(data)
+        elif event == 'thread.message.delta':
+            self.add_message_delta(data)
+        elif event == 'thread.message.created':
+            m = _as_dict(data)
+            if m.get('role') == 'assistant' and m.get('id'):
+                self.messages.setdefault(m['id'], {})
+        elif event == 'thread.message.completed':
+            self.add_message(data)
+
+    @classmethod
+    def from_lists(cls, run: Any, messages: Iterable[Any], steps: Iterable[Any]) -> 'RunOutput':
+        out = cls(run=_as_dict(run) or None)
+        # messages chronologisch (order='asc'), die letzte Antwort gewinnt in ``text``
+        for m in messages:
+            out.add_message(m)
+        for s in steps:
+            out.add_step(s)
+        return out
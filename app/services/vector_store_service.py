@@ -3,6 +3,8 @@ from flask import current_app
 from ..extensions import db
 from ..models import VectorStore, Chat, File
 from .openai_client import get_openai_client
+from .chat_service import ChatService
+from .async_openai_client import get_async_openai_client, run_async
 
 
 class VectorStoreSyncError(Exception):
@@ -31,66 +33,35 @@ class VectorStoreService:
     @staticmethod
     def pull_remote(limit: int = 100) -> Tuple[int, int]:
         client = get_openai_client()
+        existing_by_rid = {vs.openai_vector_store_id: vs for vs in VectorStore.query.filter(VectorStore.openai_vector_store_id.isnot(None)).all()}
+        added = 0
+        updated = 0
         try:
-            remote_list = client.list_vector_stores(limit=limit)
+            # Alle Seiten (Cursor) inkrementell verarbeiten
+            for item in client.iter_vector_stores(page_size=limit):
+                rid = item.get('id')
+                if not rid:
+                    continue
+                existing = existing_by_rid.get(rid)
+                if existing:
+                    # update name if changed
+                    new_name = item.get('name') or existing.name
+                    if existing.name != new_name:
+                        existing.name = new_name
+                        updated += 1
+                else:
+                    new_vs = VectorStore(openai_vector_store_id=rid, name=item.get('name') or 'Unnamed')
+                    db.session.add(new_vs)
+                    existing_by_rid[rid] = new_vs
+                    added += 1
         except Exception as e:  # noqa: BLE001
+            db.session.rollback()
             raise VectorStoreSyncError(f"Remote List Fehler: {e}") from e
-        added = 0
-        updated = 0
-        for item in remote_list:
-            rid = item.get('id')
-            if not rid:
-                continue
-            existing = VectorStore.query.filter_by(openai_vector_store_id=rid).first()
-            if existing:
-                # update name if changed
-                new_name = item.get('name') or existing.name
-                if existing.name != new_name:
-                    existing.name = new_name
-                    updated += 1
-            else:
-                new_vs = VectorStore(openai_vector_store_id=rid, name=item.get('name') or 'Unnamed')
-                db.session.add(new_vs)
-                added += 1
         db.session.commit()
 
         # Nach Commit: Files je Vector Store abgleichen (Mapping aktualisiert)
-        sync_errors: list[str] = []
         all_vectors = VectorStore.query.filter(VectorStore.openai_vector_store_id.isnot(None)).all()
-        # Vorbereitung: Map FileID->Set VectorStore OpenAI IDs
-        file_vs_map: dict[str, set[str]] = {}
-        for vs in all_vectors:
-            try:
-                remote_files = client.list_vector_store_files(vs.openai_vector_store_id, limit=100)
-            except Exception as e:  # noqa: BLE001
-                sync_errors.append(f"VS {vs.id} list files Fehler: {e}")
-                continue
-            remote_file_ids = {rf.get('file_id') or rf.get('id') for rf in remote_files if rf.get('file_id') or rf.get('id')}
-            # Lokale Files mit openai_file_id Index
-            local_files_map = {f.openai_file_id: f for f in File.query.filter(File.openai_file_id.in_(remote_file_ids)).all() if f.openai_file_id}
-            # Entfernen nicht mehr vorhandener Zuordnungen
-            to_remove = [f for f in vs.files if f.openai_file_id and f.openai_file_id not in remote_file_ids]
-            for f in to_remove:
-                vs.files.remove(f)
-            # Hinzufügen fehlender Zuordnungen
-            for fid in remote_file_ids:
-                lf = local_files_map.get(fid)
-                if lf and lf not in vs.files:
-                    vs.files.append(lf)
-                if lf and lf.openai_file_id:
-                    file_vs_map.setdefault(lf.openai_file_id, set()).add(vs.openai_vector_store_id or '')
-        # Cache-Felder der Files aktualisieren
-        import json as _json
-        all_files = File.query.filter(File.openai_file_id.isnot(None)).all()
-        for f in all_files:
-            fid = f.openai_file_id
-            vs_ids = file_vs_map.get(fid, set())
-            f.in_vector_store = bool(vs_ids)
-            f.vector_store_ids_cache = _json.dumps(sorted([vid for vid in vs_ids if vid])) if vs_ids else None
-        if sync_errors:
-            from flask import current_app
-            for msg in sync_errors:
-                current_app.logger.warning('[VectorStoreSync] %s', msg)
+        VectorStoreService._sync_relations(all_vectors)
         db.session.commit()
         return added, updated
 
@@ -101,42 +72,72 @@ class VectorStoreService:
         Returns:
             (updated_relations, total_vectors_processed)
         """
-        client = get_openai_client()
-        from flask import current_app
-        from ..models import File  # lokal um Zyklen zu vermeiden
         vectors = VectorStore.query.filter(VectorStore.openai_vector_store_id.isnot(None)).all()
-        updated_rel = 0
+        updated_rel = VectorStoreService._sync_relations(vectors)
+        db.session.commit()
+        return updated_rel, len(vectors)
+
+    @staticmethod
+    def _sync_relations(vectors: list[VectorStore]) -> int:
+        """File-Zuordnungen und Cache-Felder der Files an den Remote-Stand angleichen.
+
+        Returns: Anzahl geänderter Zuordnungen (ohne Commit)
+        """
+        # Lokale Files einmal laden statt IN-Query mit (evtl. zehntausenden) Remote IDs je Store
+        local_files = File.query.filter(File.openai_file_id.isnot(None)).all()
+        local_by_fid = {f.openai_file_id: f for f in local_files}
         file_vs_map: dict[str, set[str]] = {}
+        updated_rel = 0
+        remote_by_vs = VectorStoreService._fetch_remote_file_ids(vectors)
         for vs in vectors:
-            try:
-                remote_files = client.list_vector_store_files(vs.openai_vector_store_id, limit=200)
-            except Exception as e:  # noqa: BLE001
-                current_app.logger.warning('[VectorStoreSync] files_only list Fehler vs=%s err=%s', vs.id, e)
+            remote_file_ids = remote_by_vs.get(vs.openai_vector_store_id)
+            if isinstance(remote_file_ids, BaseException) or remote_file_ids is None:
+                current_app.logger.warning('[VectorStoreSync] list files Fehler vs=%s err=%s', vs.id, remote_file_ids)
+                # Bestehende Zuordnungen beibehalten, damit der Cache nicht fälschlich geleert wird
+                for f in vs.files:
+                    if f.openai_file_id:
+                        file_vs_map.setdefault(f.openai_file_id, set()).add(vs.openai_vector_store_id or '')
                 continue
-            remote_file_ids = {rf.get('file_id') or rf.get('id') for rf in remote_files if rf.get('file_id') or rf.get('id')}
-            local_files_map = {f.openai_file_id: f for f in File.query.filter(File.openai_file_id.in_(remote_file_ids)).all() if f.openai_file_id}
-            # Entfernen nicht mehr existenter
+            # Entfernen nicht mehr vorhandener Zuordnungen
             for f in list(vs.files):
                 if f.openai_file_id and f.openai_file_id not in remote_file_ids:
                     vs.files.remove(f)
                     updated_rel += 1
-            # Hinzufügen neuer
+            # Hinzufügen fehlender Zuordnungen
+            current = set(vs.files)
             for fid in remote_file_ids:
-                lf = local_files_map.get(fid)
-                if lf and lf not in vs.files:
+                lf = local_by_fid.get(fid)
+                if lf is None:
+                    continue
+                if lf not in current:
                     vs.files.append(lf)
+                    current.add(lf)
                     updated_rel += 1
-                if lf and lf.openai_file_id:
-                    file_vs_map.setdefault(lf.openai_file_id, set()).add(vs.openai_vector_store_id or '')
-        # Cache aktualisieren
+                file_vs_map.setdefault(fid, set()).add(vs.openai_vector_store_id or '')
+        # Cache-Felder der Files aktualisieren
         import json as _json
-        all_files = File.query.filter(File.openai_file_id.isnot(None)).all()
-        for f in all_files:
+        for f in local_files:
             vs_ids = file_vs_map.get(f.openai_file_id, set())
             f.in_vector_store = bool(vs_ids)
             f.vector_store_ids_cache = _json.dumps(sorted([vid for vid in vs_ids if vid])) if vs_ids else None
-        db.session.commit()
-        return updated_rel, len(vectors)
+        if updated_rel:
+            ChatService.invalidate_resources()
+        return updated_rel
+
+    @staticmethod
+    def _fetch_remote_file_ids(vectors: list[VectorStore]) -> dict:
+        """Remote File IDs aller Vector Stores laden: Stores parallel, alle Seiten je Store.
+
+        Returns: openai_vector_store_id -> Set der File IDs oder Exception
+        """
+        ids = [vs.openai_vector_store_id for vs in vectors if vs.openai_vector_store_id]
+        if not ids:
+            return {}
+        aclient = get_async_openai_client()
+        try:
+            return run_async(aclient.vector_store_file_ids_many(ids, page_size=current_app.config.get('OPENAI_LIST_PAGE_SIZE', 100)))
+        except Exception as e:  # noqa: BLE001
+            return {vid: e for vid in ids}
 
     @staticmethod
     def delete_remote_and_local(vs: VectorStore) -> None:
@@ -147,6 +148,7 @@ class VectorStoreService:
             except Exception as e:  # noqa: BLE001
                 raise VectorStoreSyncError(f"Remote Delete Fehler: {e}") from e
         db.session.delete(vs)
+        ChatService.invalidate_resources()
         db.session.commit()
 
     @staticmethod
@@ -157,4 +159,5 @@ class VectorStoreService:
             stores = VectorStore.query.filter(VectorStore.id.in_(vector_ids)).all()
             for s in stores:
                 chat.vector_stores.append(s)
+        ChatService.invalidate_resources(chat_id=chat.id)
         db.session.commit()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+from flask import current_app
+from sqlalchemy import func, insert, update
+from ..extensions import db
+from ..models import Worker, WorkerBatch, WorkerLog
+from .batch_service import BatchService, BatchServiceError
+
+_ACTIVE = ('queued', 'running')
+_FINISHED = ('done', 'failed')
+
+
+class WorkerBatchServiceError(Exception):
+    pass
+
+
+class WorkerBatchService:
+    """Viele Prompts für einen Worker: je Prompt ein WorkerLog mit eigenem, kurzlebigem Thread.
+
+    Statt alle Prompts nacheinander auf dem Worker Thread auszuführen (jeder Run liest den
+    ganzen, wachsenden Verlauf mit) läuft jeder Eintrag isoliert. Einträge warten als pending;
+    ``dispatch`` reiht höchstens ``concurrency`` gleichzeitig als worker_run Jobs ein und wird
+    nach jedem abgeschlossenen Eintrag erneut aufgerufen.
+    """
+
+    # ---------------- Eingabe ----------------
+    @staticmethod
+    def parse_prompts(filename: str, data: bytes) -> List[Tuple[str, str]]:
+        """(id, prompt) aus CSV oder JSONL, Format wie bei den Batch API Fragebögen."""
+        try:
+            prompts = BatchService.parse_prompts(filename, data)
+        except BatchServiceError as e:
+            raise WorkerBatchServiceError(str(e)) from e
+        limit = current_app.config.get('WORKER_BATCH_MAX_PROMPTS', 1000)
+        if len(prompts) > limit:
+            raise WorkerBatchServiceError(f"Zu viele Prompts ({len(prompts)} > {limit})")
+        return prompts
+
+    @staticmethod
+    def create(worker: Worker, name: str, prompts: List[Tuple[str, str]],
+               concurrency: Optional[int] = None) -> WorkerBatch:
+        """Batch samt Einträgen (pending) anlegen; gestartet wird über ``dispatch``."""
+        if not prompts:
+            raise WorkerBatchServiceError("Keine Prompts gefunden")
+        if not (worker.assistant and worker.assistant.openai_assistant_id):
+            raise WorkerBatchServiceError('Assistant ID fehlt für Worker')
+        batch = WorkerBatch(
+            worker_id=worker.id, name=name or 'Batch',
+            concurrency=max(1, concurrency or current_app.config.get('WORKER_BATCH_CONCURRENCY', 4)),
+        )
+        db.session.add(batch)
+        db.session.flush()
+        db.session.execute(insert(WorkerLog), [
+            {'worker_id': worker.id, 'worker_batch_id': batch.id, 'batch_key': key, 'input_text': prompt,
+             'state': 'pending'}
+            for key, prompt in prompts
+        ])
+        db.session.commit()
+        return batch
+
+    # ---------------- Ausführung ----------------
+    @staticmethod
+    def dispatch(batch: WorkerBatch) -> List[WorkerLog]:
+        """Freie Plätze mit wartenden Einträgen füllen (pending -> queued); Rückgabe für worker_run Jobs.
+
+        Parallele Aufrufe (mehrere Einträge enden gleichzeitig) übernehmen einen Eintrag nur per
+        bedingtem UPDATE; ``created_at`` wird neu gesetzt, damit WORKER_RUN_TIMEOUT ab dem Start zählt.
+        """
+        active = batch.logs.filter(WorkerLog.state.in_(_ACTIVE)).count()
+        free = batch.concurrency - active
+        if free <= 0:
+            return []
+        ids = [i for (i,) in db.session.query(WorkerLog.id)
+               .filter(WorkerLog.worker_batch_id == batch.id, WorkerLog.state == 'pending')
+               .order_by(WorkerLog.id.asc()).limit(free)]
+        now = datetime.utcnow()
+        claimed = []
+        for log_id in ids:
+            rows = db.session.execute(
+                update(WorkerLog).where(WorkerLog.id == log_id, WorkerLog.state == 'pending')
+                .values(state='queued', created_at=now).execution_options(synchronize_session=False)
+            ).rowcount
+            if rows:
+                claimed.append(log_id)
+        db.session.commit()
+        return WorkerLog.query.filter(WorkerLog.id.in_(claimed)).all() if claimed else []
+
+    @staticmethod
+    def resume(batch: WorkerBatch) -> int:
+        """Fehlgeschlagene Einträge zurücksetzen (neuer Thread, neuer Run); Anzahl der Einträge.
+
+        Erfolgreiche Einträge bleiben unverändert, ein teilweise fehlgeschlagener Batch
+        wird so ohne erneute Kosten für die bereits beantworteten Prompts fortgesetzt.
+        """
+        count = db.session.execute(
+            update(WorkerLog).where(WorkerLog.worker_batch_id == batch.id, WorkerLog.state == 'failed')
+            .values(state='pending', error=None, run_status=None, output_text=None, output_file_ids=None,
+                    openai_thread_id=None, openai_message_id=None, openai_run_id=None, finished_at=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return count
+
+    # ---------------- Status / Ergebnis ----------------
+    @staticmethod
+    def progress(batch: WorkerBatch) -> Dict[str, Any]:
+        """Zähler je Zustand (eine GROUP BY Abfrage) für die Fortschrittsanzeige."""
+        counts = {state: 0 for state in ('pending', 'queued', 'running', 'done', 'failed')}
+        rows = (db.session.query(WorkerLog.state, func.count(WorkerLog.id))
+                .filter(WorkerLog.worker_batch_id == batch.id).group_by(WorkerLog.state))
+        for state, n in rows:
+            counts[state] = n
+        total = sum(counts.values())
+        finished = sum(counts[s] for s in _FINISHED)
+        return {'id': batch.id, 'name': batch.name, 'total': total, 'finished': finished, 'counts': counts,
+                'percent': int(100 * finished / total) if total else 100, 'active': finished < total}
+
+    @staticmethod
+    def results_csv(batch: WorkerBatch) -> Iterator[str]:
+        """Ergebnis-CSV (Semikolon, Excel-tauglich) je Eintrag in Eingabe-Reihenfolge, seitenweise aus der DB."""
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter=';')
+
+        def flush() -> str:
+            value = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            return value
+
+        writer.writerow(['id', 'prompt', 'answer', 'output_file_ids', 'state', 'run_status', 'error'])
+        yield '\ufeff' + flush()
+        for log in batch.logs.yield_per(500):
+            try:
+                file_ids = json.loads(log.output_file_ids) if log.output_file_ids else []
+            except ValueError:
+                file_ids = []
+            answer = log.output_text if log.state == 'done' else ''
+            writer.writerow([log.batch_key, log.input_text, answer or '', ' '.join(file_ids), log.state,
+                             log.run_status or '', log.error or ''])
+            yield flush()
@@ -1,10 +1,23 @@
 from __future__ import annotations
-from typing import Optional
-from flask import current_app
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import json
 import time
+import httpx
+import openai
+from openai import NOT_GIVEN
+from flask import current_app
+from sqlalchemy import exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 from ..extensions import db
-from ..models import Worker, WorkerLog, Assistant
+from ..models import Worker, WorkerLog, Assistant, Project, ProjectRun
 from .openai_client import get_openai_client
+from .call_ledger import attribute, timed_call
+from .resilience import endpoint_key
+from .run_events import RunOutput
+from .poller import AdaptivePoller, TERMINAL_STATUSES, status_attr
+from .async_openai_client import get_async_openai_client, run_async
 from ..models import File as OrxFile
 
 
@@ -20,26 +33,144 @@ class WorkerService:
         db.session.commit()
         return w
 
+    @staticmethod
+    def queue_run(worker: Worker, prompt: str) -> WorkerLog:
+        """WorkerLog im Zustand queued anlegen; ausgeführt wird über ``execute`` (Job oder synchron)."""
+        if not prompt:
+            raise WorkerServiceError("Prompt fehlt")
+        if not (worker.assistant and worker.assistant.openai_assistant_id):
+            raise WorkerServiceError('Assistant ID fehlt für Worker')
+        log = WorkerLog(worker_id=worker.id, input_text=prompt, state='queued')
+        db.session.add(log)
+        db.session.commit()
+        return log
+
+    @staticmethod
+    def queue_project_run(project: Project, prompt: Optional[str], prompts: Optional[Dict[int, str]] = None,
+                          concurrency: Optional[int] = None) -> Tuple[ProjectRun, List[str]]:
+        """Alle Worker eines Projekts mit gemeinsamem Prompt (oder Einzel-Prompt je Worker) einreihen.
+
+        Legt nur Run + queued Logs an; die worker_run Jobs starten höchstens ``concurrency`` Runs
+        gleichzeitig (siehe ``acquire``). Rückgabe: (ProjectRun, Namen übersprungener Worker).
+        """
+        prompts = {wid: p for wid, p in (prompts or {}).items() if p and p.strip()}
+        if not (prompt and prompt.strip()) and not prompts:
+            raise WorkerServiceError("Prompt fehlt")
+        concurrency = concurrency or current_app.config.get('PROJECT_RUN_CONCURRENCY', 4)
+        run = ProjectRun(project_id=project.id, prompt=prompt or None, concurrency=max(1, concurrency))
+        db.session.add(run)
+        db.session.flush()
+        skipped = []
+        for worker in project.workers.order_by(Worker.id.asc()):
+            text = prompts.get(worker.id) or prompt
+            if not text or not (worker.assistant and worker.assistant.openai_assistant_id):
+                skipped.append(worker.name)
+                continue
+            db.session.add(WorkerLog(worker_id=worker.id, input_text=text, state='queued', project_run_id=run.id))
+        db.session.flush()
+        if not run.logs:
+            db.session.rollback()
+            raise WorkerServiceError("Kein Worker mit Assistant und Prompt im Projekt")
+        db.session.commit()
+        return run, skipped
+
+    @staticmethod
+    def acquire(log: WorkerLog) -> bool:
+        """queued -> running, falls frei: ein aktiver Run je Worker Thread und max. ``concurrency`` je Projekt-Run.
+
+        Batch Einträge haben eigene Threads: für sie gilt nur das Limit des Batches.
+        Bedingtes UPDATE (Compare-and-Set) statt Zählen + Setzen, damit parallele Job Threads
+        nicht beide denselben letzten Platz belegen. Laufende Logs älter als WORKER_RUN_TIMEOUT
+        (z.B. abgebrochene synchrone Runs) blockieren nicht.
+        """
+        if log.state != 'queued':
+            return True
+        other = aliased(WorkerLog)
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('WORKER_RUN_TIMEOUT', 1800))
+        active = [other.state == 'running', other.created_at >= cutoff, other.id != log.id]
+        cond = [WorkerLog.id == log.id, WorkerLog.state == 'queued']
+        if log.worker_batch_id:
+            running = select(func.count(other.id)).where(other.worker_batch_id == log.worker_batch_id, *active)
+            cond.append(running.scalar_subquery() < log.worker_batch.concurrency)
+        else:
+            cond.append(~exists().where(other.worker_id == log.worker_id, other.worker_batch_id.is_(None), *active))
+        if log.project_run_id:
+            running = select(func.count(other.id)).where(other.project_run_id == log.project_run_id, *active)
+            cond.append(running.scalar_subquery() < log.project_run.concurrency)
+        claimed = db.session.execute(
+            update(WorkerLog).where(*cond).values(state='running').execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        db.session.refresh(log)
+        return bool(claimed)
+
+    @staticmethod
+    def project_run_progress(run: ProjectRun) -> Dict[str, Any]:
+        """Zähler je Zustand + Zeilen je Worker für die Fortschrittsanzeige."""
+        counts = {state: 0 for state in ('pending', 'queued', 'running', 'done', 'failed')}
+        rows = []
+        for log in run.logs:
+            counts[log.state] = counts.get(log.state, 0) + 1
+            rows.append({'log_id': log.id, 'worker_id': log.worker_id, 'worker': log.worker.name, 'state': log.state,
+                         'run_status': log.run_status, 'error': log.error})
+        if run.pipeline is not None:
+            # Pipeline: Stufen ohne Log warten noch auf ihre Vorstufen
+            started = {log.pipeline_stage_id for log in run.logs}
+            for stage in run.pipeline.stages:
+                if stage.id not in started:
+                    counts['pending'] += 1
+                    rows.append({'log_id': None, 'worker_id': stage.worker_id, 'worker': stage.worker.name,
+                                 'state': 'pending', 'run_status': None, 'error': None})
+        total = len(rows)
+        finished = counts['done'] + counts['failed']
+        return {'id': run.id, 'label': run.pipeline.name if run.pipeline else None, 'total': total,
+                'finished': finished, 'counts': counts, 'logs': rows,
+                'percent': int(100 * finished / total) if total else 100, 'active': finished < total}
+
     @staticmethod
     def run_once(worker: Worker, prompt: str) -> WorkerLog:
-        """Ausführen eines einzelnen Thread-Runs gemäß README (Threads API).
+        """Ausführen eines einzelnen Thread-Runs gemäß README (Threads API), synchron im Aufrufer.
 
         Schritte:
         1. Thread anlegen falls noch keiner existiert.
         2. Message (user) in Thread posten.
         3. Run starten mit assistant + tool_resources (1 VectorStore, n Files).
-        4. Polling bis status terminal (completed/failed/cancelled) oder Timeout.
-        5. Messages abrufen und letzten Assistant-Output extrahieren.
+        4. Run Events streamen bis status terminal (Fallback: Polling) oder Timeout.
+        5. Letzten Assistant-Output und Output Files aus den Events übernehmen.
         6. Log persistieren inkl. Status & erzeugte File IDs (Code Interpreter Outputs).
         """
-        if not prompt:
-            raise WorkerServiceError("Prompt fehlt")
-        client_wrapper = get_openai_client()
-        client = client_wrapper.raw
-        poll_interval = current_app.config.get('OPENAI_POLL_INTERVAL', 1.0)
-        poll_timeout = current_app.config.get('OPENAI_POLL_TIMEOUT', 180)
+        log = WorkerService.queue_run(worker, prompt)
+        try:
+            WorkerService.execute(log, final=True)
+        except Exception as e:  # noqa: BLE001
+            # Kein Retry im Request: Log nicht in running stehen lassen (sperrt sonst den Worker Thread)
+            db.session.rollback()
+            WorkerService.fail(log, str(e) or type(e).__name__)
+            raise
+        return log
+
+    @staticmethod
+    def execute(log: WorkerLog, poll_timeout: Optional[float] = None, final: bool = False) -> bool:
+        """Run eines WorkerLogs starten oder fortsetzen; True sobald das Log abgeschlossen ist.
+
+        Thread, User Message und Run ID werden sofort gespeichert: nach Absturz oder Timeout
+        pollt der nächste Aufruf den vorhandenen Run weiter, statt einen neuen zu starten.
+        Ohne ``final`` bleibt ein nach ``poll_timeout`` noch laufender Run im Zustand running.
+        """
+        worker = log.worker
+        with attribute(worker_id=worker.id, project_id=worker.project_id):
+            return WorkerService._execute(worker, log, poll_timeout, final)
+
+    @staticmethod
+    def fail(log: WorkerLog, error: str) -> None:
+        log.state = 'failed'
+        log.error = error[:2000]
+        log.finished_at = datetime.utcnow()
+        db.session.commit()
 
-        # 1. Thread sicherstellen / tool_resources aufbauen
+    @staticmethod
+    def _tool_resources(worker: Worker) -> Tuple[List[str], Optional[str]]:
+        """(Input File IDs für code_interpreter, optional ein VectorStore) des Workers."""
         # Projekt-Dateien (nicht in VectorStores) + Worker-Dateien kombinieren
         project_file_ids = []
         if worker.project:
@@ -47,290 +178,331 @@ class WorkerService:
                 if not pf.vector_stores and pf.openai_file_id:
                     project_file_ids.append(pf.openai_file_id)
         worker_file_ids = [f.openai_file_id for f in worker.files if f.openai_file_id]
-        combined = []
-        seen = set()
-        for fid in worker_file_ids + project_file_ids:
-            if fid and fid not in seen:
-                combined.append(fid)
-                seen.add(fid)
-        file_ids = combined[:20]
+        file_ids = list(dict.fromkeys(fid for fid in worker_file_ids + project_file_ids if fid))[:20]
 
         # Genau ein VectorStore optional (nur wenn Worker selber einen hat)
-        vector_store_id = None
-        for vs in worker.vector_stores:
-            if vs.openai_vector_store_id:
-                vector_store_id = vs.openai_vector_store_id
-                break
-
-        tool_resources = {}
-        if file_ids:
-            tool_resources['code_interpreter'] = {'file_ids': file_ids}
-        if vector_store_id:
-            tool_resources['file_search'] = {'vector_store_ids': [vector_store_id]}
-
-        if not worker.openai_thread_id:
-            current_app.logger.info('[WorkerService] thread.create worker=%s tool_resources=%s', worker.id, tool_resources)
-            thr = client.beta.threads.create(tool_resources=tool_resources if tool_resources else None)
-            worker.openai_thread_id = getattr(thr, 'id', None)
-            db.session.commit()
+        vector_store_id = next((vs.openai_vector_store_id for vs in worker.vector_stores if vs.openai_vector_store_id), None)
+        return file_ids, vector_store_id
+
+    @staticmethod
+    def _execute(worker: Worker, log: WorkerLog, poll_timeout: Optional[float], final: bool) -> bool:
+        client = get_openai_client().raw
+        file_ids, vector_store_id = WorkerService._tool_resources(worker)
+        output: Optional[RunOutput] = None
+        # Zeitscheibe gilt für Stream und anschließendes Polling zusammen
+        budget = poll_timeout if poll_timeout is not None else current_app.config.get('OPENAI_POLL_TIMEOUT', 120)
+        started = time.monotonic()
+        log.state = 'running'
+        db.session.commit()
+
+        run = None
+        if not log.openai_run_id:
+            # 1. Thread sicherstellen / tool_resources aufbauen
+            tool_resources = {}
+            if file_ids:
+                tool_resources['code_interpreter'] = {'file_ids': file_ids}
+            if vector_store_id:
+                tool_resources['file_search'] = {'vector_store_ids': [vector_store_id]}
+
+            if log.worker_batch_id:
+                # Batch: eigener kurzlebiger Thread je Eintrag statt des (wachsenden) Worker Threads
+                if not log.openai_thread_id:
+                    current_app.logger.info('[WorkerService] thread.create batch=%s log=%s', log.worker_batch_id, log.id)
+                    thr = client.beta.threads.create(tool_resources=tool_resources if tool_resources else None)
+                    log.openai_thread_id = getattr(thr, 'id', None)
+                    db.session.commit()
+                thread_id = log.openai_thread_id
+            else:
+                if not worker.openai_thread_id:
+                    current_app.logger.info('[WorkerService] thread.create worker=%s tool_resources=%s', worker.id, tool_resources)
+                    thr = client.beta.threads.create(tool_resources=tool_resources if tool_resources else None)
+                    worker.openai_thread_id = getattr(thr, 'id', None)
+                    db.session.commit()
+                else:
+                    # Bei vorhandenem Thread: Anhängen der user message geschieht später; Files können nicht direkt am Thread verändert werden ohne neuen Run.
+                    current_app.logger.debug('[WorkerService] reuse thread=%s worker=%s', worker.openai_thread_id, worker.id)
+                thread_id = worker.openai_thread_id
+
+            if not thread_id:
+                raise WorkerServiceError('Thread Erstellung fehlgeschlagen')
+
+            # 2. User Message hinzufügen (einmalig, auch wenn der Job wiederholt wird)
+            if not log.openai_message_id or log.openai_thread_id != thread_id:
+                current_app.logger.info('[WorkerService] threads.messages.create thread=%s', thread_id)
+                # Pipeline: Outputs der Vorstufen als code_interpreter Inputs dieser Message
+                extra_ids = json.loads(log.input_file_ids) if log.input_file_ids else []
+                attachments = [{'file_id': fid, 'tools': [{'type': 'code_interpreter'}]} for fid in extra_ids]
+                msg = client.beta.threads.messages.create(thread_id=thread_id, role='user', content=log.input_text,
+                                                          attachments=attachments or NOT_GIVEN)
+                log.openai_thread_id = thread_id
+                log.openai_message_id = getattr(msg, 'id', None)
+                db.session.commit()
+
+            # 3. Run starten (Stream: Events liefern Text und Files, kein Nachlisten)
+            assistant_id = worker.assistant.openai_assistant_id if worker.assistant and worker.assistant.openai_assistant_id else None
+            if not assistant_id:
+                raise WorkerServiceError('Assistant ID fehlt für Worker')
+            current_app.logger.info('[WorkerService] threads.runs.create thread=%s assistant=%s', thread_id, assistant_id)
+            model = worker.model or worker.assistant.model
+            if current_app.config.get('WORKER_RUN_STREAMING', True):
+                output = WorkerService._stream_run(client, log, thread_id, assistant_id, model, budget)
+                run = output.run
+            else:
+                run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, model=model)
+                log.openai_run_id = getattr(run, 'id', None)
+                log.run_status = status_attr(run)
+                db.session.commit()
+            if not log.openai_run_id:
+                raise WorkerServiceError('Run konnte nicht gestartet werden')
         else:
-            # Bei vorhandenem Thread: Anhängen der user message geschieht später; Files können nicht direkt am Thread verändert werden ohne neuen Run.
-            current_app.logger.debug('[WorkerService] reuse thread=%s worker=%s', worker.openai_thread_id, worker.id)
+            current_app.logger.info('[WorkerService] resume run=%s thread=%s log=%s', log.openai_run_id, log.openai_thread_id, log.id)
+        thread_id, run_id = log.openai_thread_id, log.openai_run_id
 
-        thread_id = worker.openai_thread_id
-        if not thread_id:
-            raise WorkerServiceError('Thread Erstellung fehlgeschlagen')
+        # 4. Polling Run Status (adaptiver Backoff), nur falls der Stream abgerissen ist oder
+        # ein Run wiederaufgenommen wird; Statuswechsel sofort im Log sichtbar
+        if output is None or output.status not in TERMINAL_STATUSES:
+            output = None  # Teilergebnis aus dem Stream verwerfen, nach Abschluss gezielt nachlesen
 
-        # 2. User Message hinzufügen
-        current_app.logger.info('[WorkerService] threads.messages.create thread=%s', thread_id)
-        client.beta.threads.messages.create(thread_id=thread_id, role='user', content=prompt)
+            def _on_poll(_stats, obj) -> None:
+                st = status_attr(obj)
+                if st and st != log.run_status:
+                    log.run_status = st
+                    db.session.commit()
 
-        # Snapshot assistants_output Files vor dem Run (Heuristik für Fälle ohne direkte Referenzen)
-        pre_output_file_ids: set[str] = set()
-        try:
-            pre_files = client_wrapper.list_files(purpose='assistants_output')  # type: ignore[attr-defined]
-            for it in pre_files:
-                rid = it.get('id') if isinstance(it, dict) else None
-                if rid:
-                    pre_output_file_ids.add(rid)
-        except Exception:
-            pass
-
-        # 3. Run starten
-        assistant_id = worker.assistant.openai_assistant_id if worker.assistant and worker.assistant.openai_assistant_id else None
-        if not assistant_id:
-            raise WorkerServiceError('Assistant ID fehlt für Worker')
-        current_app.logger.info('[WorkerService] threads.runs.create thread=%s assistant=%s', thread_id, assistant_id)
-        run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, model=worker.model or worker.assistant.model)
-        run_id = getattr(run, 'id', None)
-        status = getattr(run, 'status', None)
-        start_ts = time.time()
-        # 4. Polling Run Status
-        while status not in ('completed', 'failed', 'cancelled') and (time.time() - start_ts) < poll_timeout:
-            time.sleep(poll_interval)
-            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-            status = getattr(run, 'status', None)
-            current_app.logger.debug('[WorkerService] run poll thread=%s run=%s status=%s', thread_id, run_id, status)
-
-        # Optional nach Abschluss: Steps bis alle completed (kleines Zusatzfenster)
-        if status == 'completed':
-            steps_poll_timeout = current_app.config.get('OPENAI_STEPS_POLL_TIMEOUT', 15)
-            steps_poll_interval = min(poll_interval, 2.0)
-            steps_start = time.time()
-            def _all_steps_terminal(steps_obj) -> bool:
-                data = getattr(steps_obj, 'data', [])
-                for s in data:
-                    st_status = getattr(s, 'status', None)
-                    if st_status not in ('completed', 'failed', 'cancelled'):
-                        return False
-                return True if data else True
+            remaining = max(0.001, budget - (time.monotonic() - started))
+            run = AdaptivePoller.from_config('runs.retrieve', timeout=remaining, on_poll=_on_poll).run(
+                lambda: client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id),
+                status_attr,
+                initial=run,
+            )
+        status = status_attr(run)
+        current_app.logger.debug('[WorkerService] run final thread=%s run=%s status=%s', thread_id, run_id, status)
+        if status not in TERMINAL_STATUSES and not final:
+            deadline = log.created_at + timedelta(seconds=current_app.config.get('WORKER_RUN_TIMEOUT', 1800))
+            if datetime.utcnow() < deadline:
+                log.run_status = status
+                db.session.commit()
+                return False
+            # Gesamt-Timeout: Run abbrechen statt ihn verwaist weiterlaufen zu lassen
             try:
-                while (time.time() - steps_start) < steps_poll_timeout:
-                    steps_obj = client.beta.threads.runs.steps.list(thread_id=thread_id, run_id=run_id, limit=50)
-                    if _all_steps_terminal(steps_obj):
-                        break
-                    time.sleep(steps_poll_interval)
+                client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
             except Exception as e:  # noqa: BLE001
-                current_app.logger.debug('[WorkerService] steps terminal polling skipped err=%s', e)
+                current_app.logger.warning('[WorkerService] runs.cancel fehlgeschlagen run=%s err=%s', run_id, e)
+            log.run_status = status
+            WorkerService.fail(log, 'Timeout: Run nach WORKER_RUN_TIMEOUT abgebrochen')
+            WorkerService._discard_thread(client, log)
+            return True
+        if output is None:
+            output = WorkerService._list_output(thread_id, run_id, run)
+        WorkerService._finalize(worker, log, run, output, file_ids, vector_store_id)
+        WorkerService._discard_thread(client, log)
+        return True
 
-        # 5. Messages lesen
-        output_text = ''
-        output_file_ids: list[str] = []
+    @staticmethod
+    def _discard_thread(client, log: WorkerLog) -> None:
+        """Batch: Thread des Eintrags nach Abschluss löschen (Ergebnis steht im Log)."""
+        if not (log.worker_batch_id and log.openai_thread_id) or not current_app.config.get('WORKER_BATCH_DELETE_THREADS', True):
+            return
         try:
-            msgs = client.beta.threads.messages.list(thread_id=thread_id, order='desc', limit=50)
-            data = getattr(msgs, 'data', [])
-            for m in data:
-                role = getattr(m, 'role', None)
-                if role == 'assistant':
-                    # Attachments (Experiment / Debug) ausgeben und nach File-IDs durchsuchen
-                    try:
-                        attachments = getattr(m, 'attachments', None)
-                        if attachments:
-                            current_app.logger.info('[WorkerService] message.id=%s attachments count=%s', getattr(m, 'id', None), len(attachments))
-                            for idx, att in enumerate(attachments):
-                                # In Dict umwandeln für Logging
-                                if hasattr(att, 'to_dict'):
-                                    try:
-                                        att_dict = att.to_dict()  # type: ignore
-                                    except Exception:  # noqa: BLE001
-                                        att_dict = {}
-                                elif isinstance(att, dict):
-                                    att_dict = att
-                                else:
-                                    # generischer Fallback
-                                    att_dict = {k: getattr(att, k) for k in dir(att) if not k.startswith('_') and k not in ('__class__',)}
-                                current_app.logger.info('[WorkerService] attachment %s: %s', idx, att_dict)
-                                # Mögliche File-ID Keys sammeln
-                                for key in ('file_id', 'id', 'openai_file_id'):
-                                    fid_candidate = att_dict.get(key)
-                                    if isinstance(fid_candidate, str) and fid_candidate and fid_candidate not in output_file_ids:
-                                        output_file_ids.append(fid_candidate)
-                    except Exception as _e:  # noqa: BLE001
-                        current_app.logger.debug('[WorkerService] attachments logging error %s', _e)
-                    # content kann Liste sein
-                    content_list = getattr(m, 'content', [])
-                    parts = []
-                    for c in content_list:
-                        ctype = getattr(c, 'type', None)
-                        if ctype == 'output_text':
-                            txt = getattr(c, 'text', None)
-                            if txt and getattr(txt, 'value', None):
-                                parts.append(txt.value)
-                        elif ctype == 'text':  # fallback older
-                            txt_obj = getattr(c, 'text', None)
-                            if txt_obj and getattr(txt_obj, 'value', None):
-                                parts.append(txt_obj.value)
-                        elif ctype == 'file_path':
-                            fp = getattr(c, 'file_path', None)
-                            if fp and getattr(fp, 'file_id', None):
-                                output_file_ids.append(fp.file_id)
-                    if parts and not output_text:
-                        output_text = '\n'.join(parts)
+            client.beta.threads.delete(log.openai_thread_id)
         except Exception as e:  # noqa: BLE001
-            current_app.logger.warning('[WorkerService] messages parsing error thread=%s err=%s', thread_id, e)
+            current_app.logger.warning('[WorkerService] threads.delete fehlgeschlagen thread=%s err=%s', log.openai_thread_id, e)
 
-        if not output_text:
-            output_text = '(Keine Antwort erhalten)'
+    @staticmethod
+    def _stream_run(client, log: WorkerLog, thread_id: str, assistant_id: str, model: Optional[str],
+                    slice_sec: float) -> RunOutput:
+        """Run mit ``stream=True`` starten und die Events bis zum Ende (oder Zeitscheibe) lesen.
 
-        # Run Steps durchsuchen (immer – kann zusätzliche Files liefern)
-        try:
-            steps = client.beta.threads.runs.steps.list(thread_id=thread_id, run_id=run_id, limit=50)
-            sdata = getattr(steps, 'data', [])
-            extracted: set[str] = set(output_file_ids)
-
-            def _collect(obj):  # rekursive Suche nach Keys 'file_id'
-                if obj is None:
-                    return
-                # Objekt mit Attributen
-                if hasattr(obj, 'file_id'):
-                    fidv = getattr(obj, 'file_id', None)
-                    if isinstance(fidv, str) and fidv:
-                        extracted.add(fidv)
-                # to_dict -> dict
-                if hasattr(obj, 'to_dict'):
-                    try:
-                        d = obj.to_dict()  # type: ignore
-                        _collect(d)
-                    except Exception:  # noqa: BLE001
-                        pass
-                elif isinstance(obj, dict):
-                    for k, v in list(obj.items()):
-                        if k == 'file_id' and isinstance(v, str) and v:
-                            extracted.add(v)
-                        else:
-                            _collect(v)
-                elif isinstance(obj, (list, tuple, set)):
-                    for it in obj:
-                        _collect(it)
-                else:
-                    # Generischer Attribute-Scan (flach)
-                    for attr in ('image', 'output', 'outputs', 'code_interpreter', 'step_details', 'tool_calls', 'content', 'data', 'parts'):
-                        if hasattr(obj, attr):
-                            _collect(getattr(obj, attr))
+        Run ID und Status landen mit dem ersten Event im Log, der Text laufend (gedrosselt)
+        in ``output_text``. Reißt der Stream ab oder läuft die Zeitscheibe aus, ist der Run
+        nicht terminal und ``_execute`` pollt ihn wie einen wiederaufgenommenen Run weiter.
+        """
+        output = RunOutput()
+        deadline = time.monotonic() + slice_sec
+        flush_every = current_app.config.get('WORKER_RUN_FLUSH_INTERVAL', 1.0)
+        last_flush = time.monotonic()
+        endpoint = endpoint_key('POST', f'/v1/threads/{thread_id}/runs') + ' (stream)'
+        # SSE Body sieht der Transport nicht -> Ledger-Eintrag hier mit finalem Run (Usage)
+        with timed_call(endpoint) as call:
+            try:
+                stream = client.beta.threads.runs.create(
+                    thread_id=thread_id, assistant_id=assistant_id, model=model, stream=True,
+                    timeout=httpx.Timeout(current_app.config.get('OPENAI_REQUEST_TIMEOUT', 60), read=slice_sec),
+                )
+            except (httpx.HTTPError, openai.APIConnectionError) as e:
+                # Request kann angekommen sein: serverseitig angelegten Run übernehmen statt verwaisen lassen
+                if not WorkerService._adopt_active_run(client, log, thread_id):
+                    raise
+                call['status'] = 'error'
+                call['error'] = f'{type(e).__name__}: {e}'
+                return output
+            try:
+                for ev in stream:
+                    name = getattr(ev, 'event', '') or ''
+                    output.apply(name, getattr(ev, 'data', None))
+                    if name.startswith('thread.run.') and not name.startswith('thread.run.step.'):
+                        if not log.openai_run_id:
+                            log.openai_run_id = output.run.get('id')
+                        log.run_status = output.status
+                        db.session.commit()
+                    elif name == 'thread.message.delta' and time.monotonic() - last_flush >= flush_every:
+                        log.output_text = output.text
+                        db.session.commit()
+                        last_flush = time.monotonic()
+                    elif name == 'error':
+                        call['status'] = 'error'
+                        call['error'] = str(getattr(getattr(ev, 'data', None), 'message', None) or 'Stream Fehler')
+                        break
+                    if output.status in TERMINAL_STATUSES or time.monotonic() >= deadline:
+                        break
+            except (httpx.TimeoutException, openai.APITimeoutError) as e:
+                # Keine Events innerhalb der Zeitscheibe: Run läuft serverseitig weiter
+                current_app.logger.info('[WorkerService] run stream timeout run=%s err=%s', log.openai_run_id, e)
+            except (httpx.HTTPError, openai.APIConnectionError) as e:
+                if not WorkerService._adopt_active_run(client, log, thread_id):
+                    raise
+                current_app.logger.warning('[WorkerService] run stream abgerissen run=%s err=%s', log.openai_run_id, e)
+            finally:
+                try:
+                    stream.close()
+                except Exception:  # noqa: BLE001
+                    pass
+            if not log.openai_run_id:
+                # Abbruch vor dem ersten Run Event: sonst blockiert der unbekannte Run den Thread
+                WorkerService._adopt_active_run(client, log, thread_id)
+            call['body'] = output.run
+            if output.status and call['status'] == 'ok':
+                call['status'] = output.status
+        if output.text:
+            log.output_text = output.text
+            db.session.commit()
+        return output
 
-            for st in sdata:
-                _collect(st)
+    @staticmethod
+    def _adopt_active_run(client, log: WorkerLog, thread_id: str) -> bool:
+        """Noch aktiven Run des Threads (neuester) ins Log übernehmen; True wenn das Log eine Run ID hat.
 
-            if extracted and set(output_file_ids) != extracted:
-                output_file_ids = list(extracted)
-                current_app.logger.info('[WorkerService] Output File IDs erweitert run=%s ids=%s', run_id, output_file_ids)
+        Der Thread gehört während des Runs exklusiv diesem Log (``acquire``), ein aktiver Run
+        ist also der gerade gestartete. ``_execute`` pollt ihn anschließend wie einen
+        wiederaufgenommenen Run.
+        """
+        if log.openai_run_id:
+            return True
+        try:
+            page = client.beta.threads.runs.list(thread_id=thread_id, limit=1)
         except Exception as e:  # noqa: BLE001
-            current_app.logger.debug('[WorkerService] steps parsing error run=%s err=%s', run_id, e)
+            current_app.logger.warning('[WorkerService] runs.list fehlgeschlagen thread=%s err=%s', thread_id, e)
+            return False
+        run = next(iter(page.data or []), None)
+        if run is None or status_attr(run) in TERMINAL_STATUSES:
+            return False
+        log.openai_run_id = getattr(run, 'id', None)
+        log.run_status = status_attr(run)
+        db.session.commit()
+        current_app.logger.info('[WorkerService] aktiven Run übernommen run=%s thread=%s log=%s',
+                                log.openai_run_id, thread_id, log.id)
+        return bool(log.openai_run_id)
 
-        # Ressourcen-Protokoll anhängen (VectorStore + Input Files + Output Files)
+    @staticmethod
+    def _list_output(thread_id: str, run_id: str, run) -> RunOutput:
+        """Ergebnis eines nicht gestreamten (wiederaufgenommenen) Runs: Messages und Steps dieses Runs parallel."""
         try:
-            res_lines = ["", "---", "Verwendete Ressourcen:"]
-            if vector_store_id:
-                res_lines.append(f"VectorStore: {vector_store_id}")
-            else:
-                res_lines.append("VectorStore: -")
-            if file_ids:
-                res_lines.append(f"Input Files: {', '.join(file_ids)}")
-            else:
-                res_lines.append("Input Files: -")
-            if output_file_ids:
-                res_lines.append(f"Output Files: {', '.join(output_file_ids)}")
-            else:
-                res_lines.append("Output Files: -")
-            output_text = output_text.rstrip() + "\n" + "\n".join(res_lines)
-        except Exception as _e:  # noqa: BLE001
-            current_app.logger.debug('[WorkerService] Ressourcen-Anhang Fehler %s', _e)
+            messages, steps = run_async(get_async_openai_client().run_output_lists(thread_id, run_id))
+        except Exception as e:  # noqa: BLE001
+            messages = steps = e
+        if isinstance(messages, BaseException):
+            current_app.logger.warning('[WorkerService] messages.list fehlgeschlagen thread=%s err=%s', thread_id, messages)
+            messages = []
+        if isinstance(steps, BaseException):
+            current_app.logger.debug('[WorkerService] steps.list fehlgeschlagen run=%s err=%s', run_id, steps)
+            steps = []
+        return RunOutput.from_lists(run, messages, steps)
 
-        # Debug Logging der Run Steps (konfigurierbar)
+    @staticmethod
+    def _finalize(worker: Worker, log: WorkerLog, run, output: RunOutput, file_ids: List[str],
+                  vector_store_id: Optional[str]) -> None:
+        """Ergebnis eines beendeten Runs (Text, Output Files) ins Log schreiben."""
+        run_id = log.openai_run_id
+        status = status_attr(run)
+        output_text = output.text or '(Keine Antwort erhalten)'
+        output_file_ids: list[str] = list(output.file_ids)
+        if output_file_ids:
+            current_app.logger.info('[WorkerService] Output File IDs run=%s ids=%s', run_id, output_file_ids)
         if current_app.config.get('OPENAI_WORKER_DEBUG_STEPS', False):
-            try:
-                steps_dbg = client.beta.threads.runs.steps.list(thread_id=thread_id, run_id=run_id, limit=20)
-                dbg_data = getattr(steps_dbg, 'data', [])
-                preview = []
-                for st in dbg_data[:5]:
-                    preview.append({
-                        'id': getattr(st, 'id', None),
-                        'status': getattr(st, 'status', None),
-                        'type': getattr(getattr(st, 'step_details', None), 'type', None),
-                    })
-                current_app.logger.debug('[WorkerService] steps_debug run=%s preview=%s total=%s', run_id, preview, len(dbg_data))
-            except Exception as e:  # noqa: BLE001
-                current_app.logger.debug('[WorkerService] steps debug logging failed run=%s err=%s', run_id, e)
+            current_app.logger.debug('[WorkerService] steps_debug run=%s preview=%s total=%s', run_id, output.steps[:5], len(output.steps))
 
-        # Heuristik: Falls weiterhin keine Output Files gefunden -> diff assistants_output
-        if not output_file_ids:
+        # Ressourcen-Protokoll anhängen (VectorStore + Input Files + Output Files);
+        # Batch: nur die Antwort, die Ressourcen sind für alle Einträge gleich (Ergebnis-CSV)
+        if not log.worker_batch_id:
             try:
-                post_files = client_wrapper.list_files(purpose='assistants_output')  # type: ignore[attr-defined]
-                new_ids = []
-                for it in post_files:
-                    rid = it.get('id') if isinstance(it, dict) else None
-                    if rid and rid not in pre_output_file_ids:
-                        # ausschließen falls identisch zu input file ids
-                        if rid not in file_ids:
-                            new_ids.append(rid)
-                if new_ids:
-                    output_file_ids = new_ids
-                    current_app.logger.info('[WorkerService] Output Files via diff identifiziert run=%s ids=%s', run_id, output_file_ids)
-            except Exception as e:  # noqa: BLE001
-                current_app.logger.debug('[WorkerService] diff heuristic failed run=%s err=%s', run_id, e)
+                res_lines = ["", "---", "Verwendete Ressourcen:"]
+                if vector_store_id:
+                    res_lines.append(f"VectorStore: {vector_store_id}")
+                else:
+                    res_lines.append("VectorStore: -")
+                if file_ids:
+                    res_lines.append(f"Input Files: {', '.join(file_ids)}")
+                else:
+                    res_lines.append("Input Files: -")
+                if output_file_ids:
+                    res_lines.append(f"Output Files: {', '.join(output_file_ids)}")
+                else:
+                    res_lines.append("Output Files: -")
+                output_text = output_text.rstrip() + "\n" + "\n".join(res_lines)
+            except Exception as _e:  # noqa: BLE001
+                current_app.logger.debug('[WorkerService] Ressourcen-Anhang Fehler %s', _e)
 
         # 6. Log speichern
-        import json as _json
-        log = WorkerLog(
-            worker_id=worker.id,
-            input_text=prompt,
-            output_text=output_text,
-            openai_run_id=run_id,
-            run_status=status,
-            output_file_ids=_json.dumps(output_file_ids) if output_file_ids else None,
-        )
-        db.session.add(log)
-        # Output Files lokal persistieren (falls neu)
-        if output_file_ids:
-            existing_map = {
-                f.openai_file_id: f.id for f in OrxFile.query.filter(OrxFile.openai_file_id.in_(output_file_ids)).all()  # type: ignore[arg-type]
-            }
-            for fid in output_file_ids:
-                if not fid or fid in existing_map:
-                    continue
-                # Metadaten abrufen
-                try:
-                    meta = client.files.retrieve(fid) if hasattr(client, 'files') else None  # type: ignore[attr-defined]
-                    filename = None
-                    size_bytes = None
-                    if meta is not None:
-                        # meta evtl. Objekt mit Attributen
-                        if hasattr(meta, 'to_dict'):
-                            mdict = meta.to_dict()  # type: ignore
-                        elif isinstance(meta, dict):
-                            mdict = meta
-                        else:
-                            mdict = {k: getattr(meta, k) for k in dir(meta) if not k.startswith('_')}
-                        filename = mdict.get('filename') or mdict.get('name') or f'output_{fid[:8]}.txt'
-                        size_bytes = mdict.get('bytes') or mdict.get('size')
-                    nf = OrxFile(
-                        openai_file_id=fid,
-                        filename=filename or f'output_{fid[:8]}.txt',
-                        purpose='assistants',
-                        size_bytes=size_bytes,
-                    )
-                    db.session.add(nf)
-                except Exception as _e:  # noqa: BLE001
-                    current_app.logger.warning('[WorkerService] Output File Persist Fehler id=%s err=%s', fid, _e)
+        log.output_text = output_text
+        log.run_status = status
+        log.output_file_ids = json.dumps(output_file_ids) if output_file_ids else None
+        log.state = 'done' if status == 'completed' else 'failed'
+        if status != 'completed':
+            last_error = (run.get('last_error') if isinstance(run, dict) else getattr(run, 'last_error', None)) or {}
+            log.error = (last_error.get('message') if isinstance(last_error, dict) else getattr(last_error, 'message', None)) \
+                or f'Run Status: {status}'
+        log.finished_at = datetime.utcnow()
         db.session.commit()
-        return log
+        if output_file_ids:
+            WorkerService._persist_output_files(output_file_ids)
+
+    @staticmethod
+    def _persist_output_files(output_file_ids: List[str]) -> None:
+        """Neue Output Files lokal anlegen: Metadaten parallel abrufen, ein Bulk Insert."""
+        ids = list(dict.fromkeys(fid for fid in output_file_ids if fid))
+        existing = {fid for (fid,) in db.session.query(OrxFile.openai_file_id).filter(OrxFile.openai_file_id.in_(ids))}
+        missing = [fid for fid in ids if fid not in existing]
+        if not missing:
+            return
+        try:
+            metas = run_async(get_async_openai_client().retrieve_files(missing))
+        except Exception as _e:  # noqa: BLE001
+            metas = {fid: _e for fid in missing}
+        rows = []
+        for fid in missing:
+            mdict = metas.get(fid) or {}
+            if isinstance(mdict, BaseException):
+                current_app.logger.warning('[WorkerService] Output File Persist Fehler id=%s err=%s', fid, mdict)
+                continue
+            rows.append({
+                'openai_file_id': fid,
+                'filename': mdict.get('filename') or mdict.get('name') or f'output_{fid[:8]}.txt',
+                'purpose': 'assistants',
+                'size_bytes': mdict.get('bytes') or mdict.get('size'),
+            })
+        for _ in range(3):
+            if not rows:
+                return
+            try:
+                db.session.execute(insert(OrxFile), rows)
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Parallel laufender Run hat einzelne Dateien schon angelegt -> nur die übrigen erneut
+                db.session.rollback()
+                existing = {fid for (fid,) in db.session.query(OrxFile.openai_file_id)
+                            .filter(OrxFile.openai_file_id.in_([r['openai_file_id'] for r in rows]))}
+                current_app.logger.info('[WorkerService] Output Files bereits vorhanden ids=%s', sorted(existing))
+                rows = [r for r in rows if r['openai_file_id'] not in existing]
+        current_app.logger.warning('[WorkerService] Output Files nicht gespeichert ids=%s',
+                                   [r['openai_file_id'] for r in rows])
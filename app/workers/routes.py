@@ -1,6 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, Response, current_app, jsonify, render_template, request, redirect, url_for, flash, stream_with_context
+import httpx
+import openai
 from ..extensions import db
-from ..models import Worker, Project, Assistant, WorkerLog, File
+from ..models import Worker, Project, Assistant, WorkerBatch, WorkerLog, File
+from ..services.job_service import JobService, dispatch_worker_batch
+from ..services.worker_batch_service import WorkerBatchService, WorkerBatchServiceError
 from ..services.worker_service import WorkerService, WorkerServiceError
 
 bp = Blueprint("workers", __name__)
@@ -32,7 +36,10 @@ def create():
 @bp.route("/<int:worker_id>")
 def view(worker_id: int):
     worker = Worker.query.get_or_404(worker_id)
-    logs = WorkerLog.query.filter_by(worker_id=worker.id).order_by(WorkerLog.created_at.desc()).limit(25).all()
+    # Batch Einträge erscheinen nur gesammelt im Batch (Ergebnis-CSV)
+    logs = (WorkerLog.query.filter(WorkerLog.worker_id == worker.id, WorkerLog.worker_batch_id.is_(None))
+            .order_by(WorkerLog.created_at.desc()).limit(25).all())
+    batches = [WorkerBatchService.progress(b) for b in worker.batches.order_by(WorkerBatch.id.desc()).limit(10)]
     projects = Project.query.order_by(Project.name.asc()).all()
     assistants = Assistant.query.order_by(Assistant.name.asc()).all()
     # Output Files für alle Logs auflösen (Batch Query)
@@ -81,6 +88,7 @@ def view(worker_id: int):
         projects=projects,
         assistants=assistants,
         aggregated_output_files=aggregated_output_files,
+        batches=batches,
     )
 
 
@@ -89,13 +97,83 @@ def run(worker_id: int):
     worker = Worker.query.get_or_404(worker_id)
     prompt = request.form.get('prompt')
     try:
-        WorkerService.run_once(worker, prompt)
-        flash('Run abgeschlossen', 'success')
+        if current_app.config.get('WORKER_RUN_JOBS'):
+            # Run läuft in `manage.py run-jobs` (übersteht Request-Timeouts und Neustarts)
+            log = WorkerService.queue_run(worker, prompt)
+            JobService.enqueue('worker_run', {'log_id': log.id})
+            flash('Run eingereiht', 'info')
+        else:
+            WorkerService.run_once(worker, prompt)
+            flash('Run abgeschlossen', 'success')
     except WorkerServiceError as e:
         flash(str(e), 'danger')
+    except (openai.OpenAIError, httpx.HTTPError) as e:
+        # Log ist bereits als failed markiert (run_once)
+        flash(f'Run fehlgeschlagen: {e}', 'danger')
     return redirect(url_for('workers.view', worker_id=worker.id))
 
 
+@bp.route("/<int:worker_id>/logs/status")
+def logs_status(worker_id: int):
+    """Zustand offener Runs (Polling der Worker Seite)."""
+    ids = [int(x) for x in request.args.get('ids', '').split(',') if x.isdigit()]
+    logs = WorkerLog.query.filter(WorkerLog.worker_id == worker_id, WorkerLog.id.in_(ids)).all() if ids else []
+    return jsonify({'logs': [
+        {'id': l.id, 'state': l.state, 'run_status': l.run_status, 'error': l.error, 'output_text': l.output_text}
+        for l in logs
+    ]})
+
+
+@bp.route("/<int:worker_id>/batches", methods=["POST"])
+def batch_create(worker_id: int):
+    """Prompts aus CSV/JSONL je in eigenem Thread ausführen (über manage.py run-jobs)."""
+    worker = Worker.query.get_or_404(worker_id)
+    up = request.files.get('file')
+    if not up or not up.filename:
+        flash('Datei fehlt', 'danger')
+        return redirect(url_for('workers.view', worker_id=worker.id))
+    try:
+        prompts = WorkerBatchService.parse_prompts(up.filename, up.read())
+        batch = WorkerBatchService.create(
+            worker,
+            name=(request.form.get('name') or '').strip() or up.filename,
+            prompts=prompts,
+            concurrency=request.form.get('concurrency', type=int),
+        )
+    except WorkerBatchServiceError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('workers.view', worker_id=worker.id))
+    dispatch_worker_batch(batch)
+    flash(f'Batch mit {len(prompts)} Prompts eingereiht', 'info')
+    return redirect(url_for('workers.view', worker_id=worker.id))
+
+
+@bp.route("/<int:worker_id>/batches/<int:batch_id>/status")
+def batch_status(worker_id: int, batch_id: int):
+    batch = WorkerBatch.query.filter_by(id=batch_id, worker_id=worker_id).first_or_404()
+    return jsonify(WorkerBatchService.progress(batch))
+
+
+@bp.route("/<int:worker_id>/batches/<int:batch_id>/resume", methods=["POST"])
+def batch_resume(worker_id: int, batch_id: int):
+    """Fehlgeschlagene Einträge erneut ausführen; erledigte bleiben erhalten."""
+    batch = WorkerBatch.query.filter_by(id=batch_id, worker_id=worker_id).first_or_404()
+    count = WorkerBatchService.resume(batch)
+    dispatch_worker_batch(batch)
+    flash(f'{count} Einträge erneut eingereiht' if count else 'Keine fehlgeschlagenen Einträge', 'info')
+    return redirect(url_for('workers.view', worker_id=worker_id))
+
+
+@bp.route("/<int:worker_id>/batches/<int:batch_id>/results.csv")
+def batch_results(worker_id: int, batch_id: int):
+    batch = WorkerBatch.query.filter_by(id=batch_id, worker_id=worker_id).first_or_404()
+    return Response(
+        stream_with_context(WorkerBatchService.results_csv(batch)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=worker_batch_{batch.id}_ergebnisse.csv"},
+    )
+
+
 @bp.route('/<int:worker_id>/delete', methods=['POST'])
 def delete(worker_id: int):
     worker = Worker.query.get_or_404(worker_id)
@@ -26,6 +26,119 @@ def seed():
             print("Admin User existiert bereits")
 
 
+def fake_openai(args):
+    from app.fake_openai import FaultSettings, Latency, create_fake_app
+    settings = FaultSettings(
+        latency=Latency.parse(args.latency),
+        stream_delay=Latency.parse(args.stream_delay),
+        run_queue=Latency.parse(args.run_queue),
+        run_time=Latency.parse(args.run_time),
+        rpm=args.rpm,
+        error_rate=args.error_rate,
+        run_fail_rate=args.run_fail_rate,
+        output_file_rate=args.output_file_rate,
+        reply_words=args.reply_words,
+        seed=args.seed,
+    )
+    print(f"Fake OpenAI auf http://{args.host}:{args.port}/v1 (OPENAI_BASE_URL setzen) – {settings.as_dict()}")
+    create_fake_app(settings).run(host=args.host, port=args.port, threaded=True)
+
+
+def run_jobs(args):
+    import signal
+    import threading
+    from app.services.job_service import JobService
+    app = create_app()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    concurrency = args.concurrency or app.config.get("JOB_CONCURRENCY", 4)
+    print(f"Job Worker gestartet (Threads={concurrency}, once={args.once})")
+    JobService.work(app, concurrency=concurrency, poll_interval=args.poll or app.config.get("JOB_POLL_INTERVAL", 1.0),
+                    once=args.once, stop=stop)
+
+
+def run_pipeline(args):
+    from app.models import WorkerPipeline
+    from app.services.job_service import JobService
+    from app.services.pipeline_service import PipelineService, PipelineServiceError
+    app = create_app()
+    with app.app_context():
+        pipeline = WorkerPipeline.query.get(args.pipeline_id)
+        if pipeline is None:
+            raise SystemExit(f"Pipeline {args.pipeline_id} nicht gefunden")
+        try:
+            run = PipelineService.start(pipeline, args.concurrency)
+        except PipelineServiceError as e:
+            raise SystemExit(str(e))
+        JobService.enqueue("pipeline_advance", {"project_run_id": run.id})
+        print(f"Pipeline {pipeline.name} eingereiht (Projekt-Run {run.id}, max. {run.concurrency} parallel)")
+
+
+def run_batch(args):
+    from app.models import Worker
+    from app.services.job_service import dispatch_worker_batch
+    from app.services.worker_batch_service import WorkerBatchService, WorkerBatchServiceError
+    app = create_app()
+    with app.app_context():
+        worker = Worker.query.get(args.worker_id)
+        if worker is None:
+            raise SystemExit(f"Worker {args.worker_id} nicht gefunden")
+        with open(args.file, "rb") as fh:
+            data = fh.read()
+        try:
+            prompts = WorkerBatchService.parse_prompts(args.file, data)
+            batch = WorkerBatchService.create(worker, args.name or os.path.basename(args.file), prompts, args.concurrency)
+        except WorkerBatchServiceError as e:
+            raise SystemExit(str(e))
+        dispatch_worker_batch(batch)
+        print(f"Batch {batch.id} mit {len(prompts)} Prompts eingereiht (max. {batch.concurrency} parallel)")
+
+
+def _sample_response(results: int) -> dict:
+    """Große Responses API Antwort wie bei file_search: viele Treffer-Chunks plus zitierende Nachricht."""
+    chunk = "Abschnitt mit Vertragsdetails, Fristen und Beträgen. " * 15
+    hits = [{"file_id": f"file-{i % 40}", "filename": f"dokument_{i % 40}.pdf", "score": 0.9 - i / 1000,
+             "text": f"{i}: {chunk}", "attributes": {}} for i in range(results)]
+    annotations = [{"type": "file_citation", "index": i * 20, "file_id": f"file-{i % 40}",
+                    "filename": f"dokument_{i % 40}.pdf"} for i in range(min(results, 60))]
+    return {
+        "id": "resp_bench", "object": "response", "status": "completed", "model": "gpt-4.1", "error": None,
+        "output": [
+            {"id": "fs_1", "type": "file_search_call", "status": "completed", "queries": ["Fristen"], "results": hits},
+            {"id": "msg_1", "type": "message", "role": "assistant", "status": "completed",
+             "content": [{"type": "output_text", "text": "Zusammenfassung der Fristen. " * 40, "annotations": annotations}]},
+        ],
+        "usage": {"input_tokens": 12000, "input_tokens_details": {"cached_tokens": 4096},
+                  "output_tokens": 900, "output_tokens_details": {"reasoning_tokens": 0}, "total_tokens": 12900},
+    }
+
+
+def bench_extract(args):
+    import json
+    import timeit
+    from app.services.chat_service import ChatService
+    from app.services.response_extract import extract_response
+    if args.file:
+        responses = []
+        for path in args.file:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            responses.extend(data if isinstance(data, list) else [data])
+    else:
+        responses = [_sample_response(args.results)]
+    size_kb = sum(len(json.dumps(r)) for r in responses) / 1024
+    print(f"{len(responses)} Response(s), {size_kb:.0f} KB JSON, {args.iterations} Iterationen")
+    for label, fn in (("generisch (Walker)", ChatService._extract_text_generic), ("typisiert (Fast Path)", extract_response)):
+        best = min(timeit.repeat(lambda: [fn(r) for r in responses], number=args.iterations, repeat=3))
+        per_call = best / (args.iterations * len(responses)) * 1e6
+        print(f"  {label:<24} {per_call:10.1f} µs/Response")
+    for r in responses:
+        fast = extract_response(r)
+        generic = ChatService._extract_text_generic(r)
+        if fast is not None and len(generic) > len(fast.text):
+            print(f"  Hinweis {r.get('id')}: Walker liefert {len(generic) - len(fast.text)} Zeichen Tool-Text zusätzlich")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Orquestrix Management")
     sub = parser.add_subparsers(dest="command")
@@ -33,6 +146,39 @@ def main():
     sub.add_parser("init-db", help="Erstellt DB Tabellen (create_all)")
     sub.add_parser("seed", help="Seed Daten (Admin User)")
     sub.add_parser("show-db", help="Zeigt verwendete DB Datei & Tabellenliste")
+    fake = sub.add_parser("fake-openai", help="Lokaler OpenAI Stand-in (Latenz/Rate Limit/Fehler injizierbar)")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=8099)
+    fake.add_argument("--latency", default="fixed:0", help="je Request, z.B. lognormal:0.2,0.5 | uniform:0.05,0.3 | exp:0.2")
+    fake.add_argument("--stream-delay", default="fixed:0.02", help="je Stream Delta")
+    fake.add_argument("--run-queue", default="fixed:0.5", help="Run queued -> in_progress")
+    fake.add_argument("--run-time", default="fixed:2", help="Run in_progress -> completed")
+    fake.add_argument("--rpm", type=int, default=0, help="Requests pro Minute (0 = unbegrenzt)")
+    fake.add_argument("--error-rate", type=float, default=0.0, help="Anteil 5xx Antworten (0..1)")
+    fake.add_argument("--run-fail-rate", type=float, default=0.0, help="Anteil fehlgeschlagener Runs (0..1)")
+    fake.add_argument("--output-file-rate", type=float, default=0.0, help="Anteil Runs mit Output Datei (0..1)")
+    fake.add_argument("--reply-words", type=int, default=60)
+    fake.add_argument("--seed", type=int, default=None)
+
+    jobs = sub.add_parser("run-jobs", help="Hintergrund-Jobs ausführen (Worker Runs, Pipelines, Chat Antworten bei CHAT_REPLY_JOBS=1, Batches)")
+    jobs.add_argument("--concurrency", type=int, default=None, help="parallele Jobs (Default JOB_CONCURRENCY)")
+    jobs.add_argument("--poll", type=float, default=None, help="Poll-Intervall in Sekunden (Default JOB_POLL_INTERVAL)")
+    jobs.add_argument("--once", action="store_true", help="beenden, sobald keine Jobs mehr fällig sind")
+
+    pipe = sub.add_parser("run-pipeline", help="Worker Pipeline einreihen (z.B. per cron; ausgeführt von run-jobs)")
+    pipe.add_argument("pipeline_id", type=int)
+    pipe.add_argument("--concurrency", type=int, default=None, help="max. parallele Stufen (Default PROJECT_RUN_CONCURRENCY)")
+
+    wbatch = sub.add_parser("run-batch", help="Prompts aus CSV/JSONL für einen Worker einreihen (je Prompt ein Thread)")
+    wbatch.add_argument("worker_id", type=int)
+    wbatch.add_argument("file", help="CSV (Spalte prompt, optional id) oder JSONL")
+    wbatch.add_argument("--name", default=None)
+    wbatch.add_argument("--concurrency", type=int, default=None, help="max. parallele Runs (Default WORKER_BATCH_CONCURRENCY)")
+
+    bench = sub.add_parser("bench-extract", help="Micro-Benchmark Textextraktion (Walker vs. typisierter Fast Path)")
+    bench.add_argument("--file", nargs="*", help="aufgezeichnete Response(s) als JSON (Objekt oder Liste)")
+    bench.add_argument("--results", type=int, default=200, help="file_search Treffer der synthetischen Antwort")
+    bench.add_argument("--iterations", type=int, default=200)
 
     args = parser.parse_args()
 
@@ -40,6 +186,16 @@ def main():
         init_db()
     elif args.command == "seed":
         seed()
+    elif args.command == "fake-openai":
+        fake_openai(args)
+    elif args.command == "run-jobs":
+        run_jobs(args)
+    elif args.command == "run-pipeline":
+        run_pipeline(args)
+    elif args.command == "run-batch":
+        run_batch(args)
+    elif args.command == "bench-extract":
+        bench_extract(args)
     elif args.command == "show-db":
         app = create_app()
         with app.app_context():
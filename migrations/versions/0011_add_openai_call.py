@@ -0,0 +1,50 @@
+"""add openai_call ledger table
+
+Revision ID: 0011_add_openai_call
+Revises: 0010_add_chat_role_temperature
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0011_add_openai_call'
+down_revision = '0010_add_chat_role_temperature'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'openai_call' in insp.get_table_names():
+        return
+    op.create_table(
+        'openai_call',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('endpoint', sa.String(length=120), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=True),
+        sa.Column('openai_id', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=30), nullable=False),
+        sa.Column('http_status', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('latency_ms', sa.Integer(), nullable=True),
+        sa.Column('queue_ms', sa.Integer(), nullable=True),
+        sa.Column('run_ms', sa.Integer(), nullable=True),
+        sa.Column('input_tokens', sa.Integer(), nullable=True),
+        sa.Column('output_tokens', sa.Integer(), nullable=True),
+        sa.Column('cached_tokens', sa.Integer(), nullable=True),
+        sa.Column('cost_usd', sa.Float(), nullable=True),
+        sa.Column('chat_id', sa.Integer(), nullable=True),
+        sa.Column('worker_id', sa.Integer(), nullable=True),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+    )
+    for col in ('created_at', 'endpoint', 'model', 'chat_id', 'worker_id', 'project_id'):
+        op.create_index(f'ix_openai_call_{col}', 'openai_call', [col])
+
+
+def downgrade() -> None:
+    for col in ('created_at', 'endpoint', 'model', 'chat_id', 'worker_id', 'project_id'):
+        op.drop_index(f'ix_openai_call_{col}', table_name='openai_call')
+    op.drop_table('openai_call')
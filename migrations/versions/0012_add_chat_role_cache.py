@@ -0,0 +1,30 @@
+"""add chat_role response cache columns
+
+Revision ID: 0012_add_chat_role_cache
+Revises: 0011_add_openai_call
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0012_add_chat_role_cache'
+down_revision = '0011_add_openai_call'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('chat_role')]
+    with op.batch_alter_table('chat_role') as batch_op:
+        if 'cache_enabled' not in cols:
+            batch_op.add_column(sa.Column('cache_enabled', sa.Boolean(), nullable=False, server_default=sa.false()))
+        if 'cache_ttl_sec' not in cols:
+            batch_op.add_column(sa.Column('cache_ttl_sec', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_role') as batch_op:
+        batch_op.drop_column('cache_ttl_sec')
+        batch_op.drop_column('cache_enabled')
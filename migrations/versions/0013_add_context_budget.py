@@ -0,0 +1,48 @@
+"""add token counts, chat summary and chat_role context budget
+
+Revision ID: 0013_add_context_budget
+Revises: 0012_add_chat_role_cache
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0013_add_context_budget'
+down_revision = '0012_add_chat_role_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    msg_cols = [c['name'] for c in inspector.get_columns('message')]
+    if 'token_count' not in msg_cols:
+        with op.batch_alter_table('message') as batch_op:
+            batch_op.add_column(sa.Column('token_count', sa.Integer(), nullable=True))
+    chat_cols = [c['name'] for c in inspector.get_columns('chat')]
+    with op.batch_alter_table('chat') as batch_op:
+        if 'summary' not in chat_cols:
+            batch_op.add_column(sa.Column('summary', sa.Text(), nullable=True))
+        if 'summary_message_id' not in chat_cols:
+            batch_op.add_column(sa.Column('summary_message_id', sa.Integer(), nullable=True))
+        if 'summary_token_count' not in chat_cols:
+            batch_op.add_column(sa.Column('summary_token_count', sa.Integer(), nullable=True))
+        if 'context_start_message_id' not in chat_cols:
+            batch_op.add_column(sa.Column('context_start_message_id', sa.Integer(), nullable=True))
+    role_cols = [c['name'] for c in inspector.get_columns('chat_role')]
+    if 'context_budget_tokens' not in role_cols:
+        with op.batch_alter_table('chat_role') as batch_op:
+            batch_op.add_column(sa.Column('context_budget_tokens', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_role') as batch_op:
+        batch_op.drop_column('context_budget_tokens')
+    with op.batch_alter_table('chat') as batch_op:
+        batch_op.drop_column('context_start_message_id')
+        batch_op.drop_column('summary_token_count')
+        batch_op.drop_column('summary_message_id')
+        batch_op.drop_column('summary')
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_column('token_count')
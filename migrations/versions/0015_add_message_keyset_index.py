@@ -0,0 +1,25 @@
+"""add composite message index for keyset pagination
+
+Revision ID: 0015_add_message_keyset_index
+Revises: 0014_add_job
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0015_add_message_keyset_index'
+down_revision = '0014_add_job'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    existing = {ix['name'] for ix in insp.get_indexes('message')}
+    if 'ix_message_chat_created_id' not in existing:
+        op.create_index('ix_message_chat_created_id', 'message', ['chat_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_chat_created_id', table_name='message')
@@ -0,0 +1,27 @@
+"""add chat resource_ids_cache
+
+Revision ID: 0016_add_chat_resource_cache
+Revises: 0015_add_message_keyset_index
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0016_add_chat_resource_cache'
+down_revision = '0015_add_message_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('chat')]
+    if 'resource_ids_cache' not in cols:
+        with op.batch_alter_table('chat') as batch_op:
+            batch_op.add_column(sa.Column('resource_ids_cache', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat') as batch_op:
+        batch_op.drop_column('resource_ids_cache')
@@ -0,0 +1,33 @@
+"""add usage and citations columns to message
+
+Revision ID: 0017_add_message_usage
+Revises: 0016_add_chat_resource_cache
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0017_add_message_usage'
+down_revision = '0016_add_chat_resource_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('message')]
+    with op.batch_alter_table('message') as batch_op:
+        for name in ('input_tokens', 'output_tokens', 'cached_tokens'):
+            if name not in cols:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=True))
+        if 'citations' not in cols:
+            batch_op.add_column(sa.Column('citations', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_column('citations')
+        batch_op.drop_column('cached_tokens')
+        batch_op.drop_column('output_tokens')
+        batch_op.drop_column('input_tokens')
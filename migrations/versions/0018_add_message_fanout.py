@@ -0,0 +1,35 @@
+"""add fanout_group and chat_role_id to message
+
+Revision ID: 0018_add_message_fanout
+Revises: 0017_add_message_usage
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0018_add_message_fanout'
+down_revision = '0017_add_message_usage'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('message')]
+    with op.batch_alter_table('message') as batch_op:
+        if 'fanout_group' not in cols:
+            batch_op.add_column(sa.Column('fanout_group', sa.String(length=32), nullable=True))
+            batch_op.create_index('ix_message_fanout_group', ['fanout_group'])
+        if 'chat_role_id' not in cols:
+            batch_op.add_column(sa.Column('chat_role_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_message_chat_role_id', 'chat_role', ['chat_role_id'], ['id'],
+                                        ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_constraint('fk_message_chat_role_id', type_='foreignkey')
+        batch_op.drop_column('chat_role_id')
+        batch_op.drop_index('ix_message_fanout_group')
+        batch_op.drop_column('fanout_group')
@@ -0,0 +1,65 @@
+"""add chat_batch and chat_batch_item (Batch API questionnaires)
+
+Revision ID: 0019_add_chat_batch
+Revises: 0018_add_message_fanout
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0019_add_chat_batch'
+down_revision = '0018_add_message_fanout'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    tables = insp.get_table_names()
+    if 'chat_batch' not in tables:
+        op.create_table(
+            'chat_batch',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('chat_role_id', sa.Integer(), sa.ForeignKey('chat_role.id'), nullable=False),
+            sa.Column('chat_id', sa.Integer(), sa.ForeignKey('chat.id', ondelete='SET NULL'), nullable=True),
+            sa.Column('vector_store_ids', sa.Text(), nullable=True),
+            sa.Column('file_ids', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=30), nullable=False, server_default='draft'),
+            sa.Column('openai_batch_id', sa.String(length=100), nullable=True, unique=True),
+            sa.Column('input_file_id', sa.String(length=100), nullable=True),
+            sa.Column('output_file_id', sa.String(length=100), nullable=True),
+            sa.Column('error_file_id', sa.String(length=100), nullable=True),
+            sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('completed', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('imported_at', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+    if 'chat_batch_item' not in tables:
+        op.create_table(
+            'chat_batch_item',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('batch_id', sa.Integer(), sa.ForeignKey('chat_batch.id'), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False),
+            sa.Column('custom_id', sa.String(length=64), nullable=False),
+            sa.Column('prompt', sa.Text(), nullable=False),
+            sa.Column('answer', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('openai_response_id', sa.String(length=100), nullable=True),
+            sa.Column('input_tokens', sa.Integer(), nullable=True),
+            sa.Column('output_tokens', sa.Integer(), nullable=True),
+            sa.Column('cached_tokens', sa.Integer(), nullable=True),
+            sa.UniqueConstraint('batch_id', 'custom_id', name='uq_chat_batch_item_custom_id'),
+        )
+        op.create_index('ix_chat_batch_item_batch_id', 'chat_batch_item', ['batch_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_batch_item_batch_id', table_name='chat_batch_item')
+    op.drop_table('chat_batch_item')
+    op.drop_table('chat_batch')
@@ -0,0 +1,31 @@
+"""add openai_call.chat_role_id (prompt cache share per chat role)
+
+Revision ID: 0020_add_openai_call_chat_role
+Revises: 0019_add_chat_batch
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0020_add_openai_call_chat_role'
+down_revision = '0019_add_chat_batch'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'openai_call' not in insp.get_table_names():
+        return
+    cols = {c['name'] for c in insp.get_columns('openai_call')}
+    if 'chat_role_id' not in cols:
+        with op.batch_alter_table('openai_call') as batch:
+            batch.add_column(sa.Column('chat_role_id', sa.Integer(), nullable=True))
+            batch.create_index('ix_openai_call_chat_role_id', ['chat_role_id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('openai_call') as batch:
+        batch.drop_index('ix_openai_call_chat_role_id')
+        batch.drop_column('chat_role_id')
@@ -0,0 +1,41 @@
+"""add job state columns to worker_log (durable worker runs)
+
+Revision ID: 0021_add_worker_log_state
+Revises: 0020_add_openai_call_chat_role
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0021_add_worker_log_state'
+down_revision = '0020_add_openai_call_chat_role'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('worker_log')]
+    with op.batch_alter_table('worker_log') as batch_op:
+        if 'state' not in cols:
+            # Bestehende Logs stammen aus synchronen Runs -> done
+            batch_op.add_column(sa.Column('state', sa.String(length=20), nullable=False, server_default='done'))
+            batch_op.create_index('ix_worker_log_state', ['state'])
+        for name in ('openai_thread_id', 'openai_message_id'):
+            if name not in cols:
+                batch_op.add_column(sa.Column(name, sa.String(length=100), nullable=True))
+        if 'error' not in cols:
+            batch_op.add_column(sa.Column('error', sa.Text(), nullable=True))
+        if 'finished_at' not in cols:
+            batch_op.add_column(sa.Column('finished_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('worker_log') as batch_op:
+        batch_op.drop_column('finished_at')
+        batch_op.drop_column('error')
+        batch_op.drop_column('openai_message_id')
+        batch_op.drop_column('openai_thread_id')
+        batch_op.drop_index('ix_worker_log_state')
+        batch_op.drop_column('state')
@@ -0,0 +1,45 @@
+"""add project_run and worker_log.project_run_id (run all workers of a project)
+
+Revision ID: 0022_add_project_run
+Revises: 0021_add_worker_log_state
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0022_add_project_run'
+down_revision = '0021_add_worker_log_state'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    if 'project_run' not in inspector.get_table_names():
+        op.create_table(
+            'project_run',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('project_id', sa.Integer(), sa.ForeignKey('project.id'), nullable=False),
+            sa.Column('prompt', sa.Text(), nullable=True),
+            sa.Column('concurrency', sa.Integer(), nullable=False, server_default='4'),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_project_run_project_id', 'project_run', ['project_id'])
+    cols = [c['name'] for c in inspector.get_columns('worker_log')]
+    if 'project_run_id' not in cols:
+        with op.batch_alter_table('worker_log') as batch_op:
+            batch_op.add_column(sa.Column('project_run_id', sa.Integer(), nullable=True))
+            batch_op.create_index('ix_worker_log_project_run_id', ['project_run_id'])
+            batch_op.create_foreign_key('fk_worker_log_project_run_id', 'project_run', ['project_run_id'], ['id'],
+                                        ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('worker_log') as batch_op:
+        batch_op.drop_constraint('fk_worker_log_project_run_id', type_='foreignkey')
+        batch_op.drop_index('ix_worker_log_project_run_id')
+        batch_op.drop_column('project_run_id')
+    op.drop_index('ix_project_run_project_id', table_name='project_run')
+    op.drop_table('project_run')
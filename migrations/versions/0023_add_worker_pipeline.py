@@ -0,0 +1,79 @@
+"""add worker pipelines (DAG of worker stages) and pipeline columns on worker_log / project_run
+
+Revision ID: 0023_add_worker_pipeline
+Revises: 0022_add_project_run
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0023_add_worker_pipeline'
+down_revision = '0022_add_project_run'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+    if 'worker_pipeline' not in tables:
+        op.create_table(
+            'worker_pipeline',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('project_id', sa.Integer(), sa.ForeignKey('project.id'), nullable=False),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_worker_pipeline_project_id', 'worker_pipeline', ['project_id'])
+    if 'worker_pipeline_stage' not in tables:
+        op.create_table(
+            'worker_pipeline_stage',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('pipeline_id', sa.Integer(), sa.ForeignKey('worker_pipeline.id'), nullable=False),
+            sa.Column('worker_id', sa.Integer(), sa.ForeignKey('worker.id'), nullable=False),
+            sa.Column('prompt', sa.Text(), nullable=False),
+            sa.UniqueConstraint('pipeline_id', 'worker_id', name='uq_pipeline_stage_worker'),
+        )
+        op.create_index('ix_worker_pipeline_stage_pipeline_id', 'worker_pipeline_stage', ['pipeline_id'])
+    if 'pipeline_stage_dependency' not in tables:
+        op.create_table(
+            'pipeline_stage_dependency',
+            sa.Column('stage_id', sa.Integer(), sa.ForeignKey('worker_pipeline_stage.id'), primary_key=True),
+            sa.Column('upstream_id', sa.Integer(), sa.ForeignKey('worker_pipeline_stage.id'), primary_key=True),
+        )
+    run_cols = [c['name'] for c in inspector.get_columns('project_run')]
+    if 'pipeline_id' not in run_cols:
+        with op.batch_alter_table('project_run') as batch_op:
+            batch_op.add_column(sa.Column('pipeline_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_project_run_pipeline_id', 'worker_pipeline', ['pipeline_id'], ['id'],
+                                        ondelete='SET NULL')
+    log_cols = [c['name'] for c in inspector.get_columns('worker_log')]
+    if 'pipeline_stage_id' not in log_cols:
+        with op.batch_alter_table('worker_log') as batch_op:
+            batch_op.add_column(sa.Column('pipeline_stage_id', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('input_file_ids', sa.Text(), nullable=True))
+            batch_op.add_column(sa.Column('input_hash', sa.String(length=64), nullable=True))
+            batch_op.create_index('ix_worker_log_input_hash', ['input_hash'])
+            batch_op.create_foreign_key('fk_worker_log_pipeline_stage_id', 'worker_pipeline_stage',
+                                        ['pipeline_stage_id'], ['id'], ondelete='SET NULL')
+            batch_op.create_unique_constraint('uq_worker_log_run_stage', ['project_run_id', 'pipeline_stage_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('worker_log') as batch_op:
+        batch_op.drop_constraint('uq_worker_log_run_stage', type_='unique')
+        batch_op.drop_constraint('fk_worker_log_pipeline_stage_id', type_='foreignkey')
+        batch_op.drop_index('ix_worker_log_input_hash')
+        batch_op.drop_column('input_hash')
+        batch_op.drop_column('input_file_ids')
+        batch_op.drop_column('pipeline_stage_id')
+    with op.batch_alter_table('project_run') as batch_op:
+        batch_op.drop_constraint('fk_project_run_pipeline_id', type_='foreignkey')
+        batch_op.drop_column('pipeline_id')
+    op.drop_table('pipeline_stage_dependency')
+    op.drop_index('ix_worker_pipeline_stage_pipeline_id', table_name='worker_pipeline_stage')
+    op.drop_table('worker_pipeline_stage')
+    op.drop_index('ix_worker_pipeline_project_id', table_name='worker_pipeline')
+    op.drop_table('worker_pipeline')
@@ -0,0 +1,48 @@
+"""add worker_batch and batch columns on worker_log (prompt batches with short-lived threads)
+
+Revision ID: 0024_add_worker_batch
+Revises: 0023_add_worker_pipeline
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0024_add_worker_batch'
+down_revision = '0023_add_worker_pipeline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    if 'worker_batch' not in inspector.get_table_names():
+        op.create_table(
+            'worker_batch',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('worker_id', sa.Integer(), sa.ForeignKey('worker.id'), nullable=False),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('concurrency', sa.Integer(), nullable=False, server_default='4'),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_worker_batch_worker_id', 'worker_batch', ['worker_id'])
+    cols = [c['name'] for c in inspector.get_columns('worker_log')]
+    with op.batch_alter_table('worker_log') as batch_op:
+        if 'worker_batch_id' not in cols:
+            batch_op.add_column(sa.Column('worker_batch_id', sa.Integer(), nullable=True))
+            batch_op.create_index('ix_worker_log_worker_batch_id', ['worker_batch_id'])
+            batch_op.create_foreign_key('fk_worker_log_worker_batch_id', 'worker_batch', ['worker_batch_id'], ['id'],
+                                        ondelete='SET NULL')
+        if 'batch_key' not in cols:
+            batch_op.add_column(sa.Column('batch_key', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('worker_log') as batch_op:
+        batch_op.drop_constraint('fk_worker_log_worker_batch_id', type_='foreignkey')
+        batch_op.drop_index('ix_worker_log_worker_batch_id')
+        batch_op.drop_column('batch_key')
+        batch_op.drop_column('worker_batch_id')
+    op.drop_index('ix_worker_batch_worker_id', table_name='worker_batch')
+    op.drop_table('worker_batch')
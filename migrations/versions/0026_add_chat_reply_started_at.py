@@ -0,0 +1,27 @@
+"""add chat.reply_started_at (one streamed reply per chat at a time)
+
+Revision ID: 0026_add_chat_reply_started_at
+Revises: 0024_add_worker_batch
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0026_add_chat_reply_started_at'
+down_revision = '0024_add_worker_batch'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    cols = [c['name'] for c in inspector.get_columns('chat')]
+    if 'reply_started_at' not in cols:
+        with op.batch_alter_table('chat') as batch_op:
+            batch_op.add_column(sa.Column('reply_started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat') as batch_op:
+        batch_op.drop_column('reply_started_at')